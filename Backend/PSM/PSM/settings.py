@@ -62,29 +62,101 @@ if frontend_url:
 N8N_API_KEY = os.environ.get('N8N_API_KEY')
 ADMIN_WHATSAPP = os.environ.get('ADMIN_WHATSAPP')
 
-# Cloudinary (solo si están configuradas)
+# Cloudinary (solo si están configuradas). Se aplican al importar
+# api/cloudinary_utils.py, la primera vez que se usa (no al arrancar)
 CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
 CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
 CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
 
-if all([CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET]):
-    import cloudinary
-    cloudinary.config(
-        cloud_name=CLOUDINARY_CLOUD_NAME,
-        api_key=CLOUDINARY_API_KEY,
-        api_secret=CLOUDINARY_API_SECRET,
-        secure=True
-    )
+# MongoDB/GridFS: imagenes guardadas antes de migrar a Cloudinary (requiere pymongo)
+MONGODB_CONFIG = {
+    'host': os.environ.get('MONGO_HOST', 'localhost'),
+    'port': int(os.environ.get('MONGO_PORT', '27017')),
+    'database': os.environ.get('MONGO_DB', 'psm_media'),
+    # Un solo cliente por proceso (ver api/services/mongo_cliente.py)
+    'max_pool_size': int(os.environ.get('MONGO_MAX_POOL', '20')),
+    'min_pool_size': int(os.environ.get('MONGO_MIN_POOL', '0')),
+    'server_selection_timeout_ms': int(os.environ.get('MONGO_TIMEOUT_SELECCION_MS', '5000')),
+    'connect_timeout_ms': int(os.environ.get('MONGO_TIMEOUT_CONEXION_MS', '5000')),
+    'socket_timeout_ms': int(os.environ.get('MONGO_TIMEOUT_SOCKET_MS', '20000')),
+}
+# Cache de las imagenes de GridFS en el navegador/CDN (no cambian una vez guardadas)
+GRIDFS_CACHE_MAX_AGE = int(os.environ.get('GRIDFS_CACHE_MAX_AGE', str(60 * 60 * 24 * 365)))
 
 AUTH_USER_MODEL = "api.Usuario"
 
+# Snapshot de estadisticas del dashboard (segundos)
+# Intervalo minimo entre recalculos cuando hay escrituras, y antiguedad maxima del snapshot
+ESTADISTICAS_REFRESCO_MINIMO = int(os.environ.get('ESTADISTICAS_REFRESCO_MINIMO', '60'))
+ESTADISTICAS_ANTIGUEDAD_MAXIMA = int(os.environ.get('ESTADISTICAS_ANTIGUEDAD_MAXIMA', '900'))
+# Recalcular el snapshot vencido en un hilo de cada proceso web. Poner en false si
+# lo recalcula solo el cron `python manage.py refrescar_estadisticas --si-necesario`
+ESTADISTICAS_REFRESCO_EN_PROCESO = os.environ.get('ESTADISTICAS_REFRESCO_EN_PROCESO', 'true').lower() == 'true'
+
+# Bandeja de salida de emails: entregar desde un hilo en cada proceso web.
+# Poner en false si los envia solo el worker `python manage.py procesar_correos --continuo`
+OUTBOX_WORKER_EN_PROCESO = os.environ.get('OUTBOX_WORKER_EN_PROCESO', 'true').lower() == 'true'
+
+# Cola de imagenes de eventos (imagen_url / imagen_base64 -> Cloudinary).
+# Igual que la bandeja de correos: hilo en cada proceso web y/o el comando
+# `python manage.py procesar_imagenes --continuo`
+IMAGENES_WORKER_EN_PROCESO = os.environ.get('IMAGENES_WORKER_EN_PROCESO', 'true').lower() == 'true'
+IMAGENES_WORKERS = int(os.environ.get('IMAGENES_WORKERS', '4'))  # Descargas/subidas simultaneas
+IMAGEN_TAMANO_MAXIMO = int(os.environ.get('IMAGEN_TAMANO_MAXIMO', str(10 * 1024 * 1024)))  # Bytes
+# Normalizacion antes de guardar (requiere Pillow): lado mayor en px y formato WEBP o AVIF
+IMAGEN_LADO_MAXIMO = int(os.environ.get('IMAGEN_LADO_MAXIMO', '2048'))
+IMAGEN_FORMATO = os.environ.get('IMAGEN_FORMATO', 'WEBP')
+
+# Consultas de cédula al TSE (segundos). Las cédulas encontradas se guardan
+# TSE_CACHE_TTL; las no encontradas TSE_CACHE_TTL_NEGATIVO. TSE_CACHE_BD agrega
+# la tabla ConsultaCedulaCache detrás de la cache en memoria.
+TSE_CACHE_TTL = int(os.environ.get('TSE_CACHE_TTL', str(7 * 24 * 3600)))
+TSE_CACHE_TTL_NEGATIVO = int(os.environ.get('TSE_CACHE_TTL_NEGATIVO', '3600'))
+TSE_CACHE_MAXIMO = int(os.environ.get('TSE_CACHE_MAXIMO', '5000'))
+TSE_CACHE_BD = os.environ.get('TSE_CACHE_BD', 'true').lower() == 'true'
+TSE_MAX_CONCURRENTES = int(os.environ.get('TSE_MAX_CONCURRENTES', '4'))
+# Maximo de cedulas por solicitud al endpoint de validacion por lote. Las que no
+# estan en cache van al TSE (~1 s cada una entre TSE_MAX_CONCURRENTES hilos) y la
+# respuesta tiene que terminar antes del timeout de gunicorn (30 s): con mas de
+# TSE_LOTE_MAXIMO_SIN_CACHE se pide usar el comando validar_cedulas.
+TSE_LOTE_MAXIMO = int(os.environ.get('TSE_LOTE_MAXIMO', '2000'))
+TSE_LOTE_MAXIMO_SIN_CACHE = int(os.environ.get('TSE_LOTE_MAXIMO_SIN_CACHE', '60'))
+
+# Cache de Django: Redis si se define REDIS_URL (compartido entre procesos,
+# requiere el paquete redis); si no, memoria local de cada proceso.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'psm',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'psm',
+        }
+    }
+# Datos de referencia (categorias, ubicaciones, configuracion del perfil) en cache,
+# segundos. Con memoria local cada proceso invalida solo lo suyo, asi que este TTL
+# es lo maximo que otro worker puede servir datos viejos.
+CACHE_REFERENCIA_TTL = int(os.environ.get('CACHE_REFERENCIA_TTL', '300'))
+# max-age de esas respuestas en el navegador (0: siempre revalida con ETag -> 304)
+CACHE_REFERENCIA_MAX_AGE = int(os.environ.get('CACHE_REFERENCIA_MAX_AGE', '0'))
+
 # =============================================================================
 # REST FRAMEWORK Y JWT
 # =============================================================================
 REST_FRAMEWORK = {
+    # Sin consulta del usuario por peticion: request.user sale de los claims (api/authentication.py)
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
     ),
+    # Opcional: sin ?page_size ni ?cursor los listados responden completos como antes
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CursorPaginacion',
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.AnonRateThrottle',
         'rest_framework.throttling.UserRateThrottle'
@@ -100,6 +172,9 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_USER_CLASS': 'api.authentication.UsuarioToken',
+    # Recalcula roles y demas claims en cada refresh (no se copian del refresh token)
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.CustomTokenRefreshSerializer',
 }
 
 # =============================================================================
@@ -125,6 +200,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.PresupuestoConsultasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -133,6 +209,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Presupuesto de consultas por peticion y detector de N+1 (api/middleware.py).
+# Cabeceras X-DB-* y log 'api.consultas'. Una vista puede fijar su propio
+# presupuesto con el atributo `presupuesto_consultas`. En modo estricto (tests)
+# pasarse del presupuesto lanza una excepcion.
+PRESUPUESTO_CONSULTAS_ACTIVO = os.environ.get('PRESUPUESTO_CONSULTAS_ACTIVO', str(DEBUG)).lower() == 'true'
+PRESUPUESTO_CONSULTAS = int(os.environ.get('PRESUPUESTO_CONSULTAS', '30'))
+PRESUPUESTO_REPETICIONES = int(os.environ.get('PRESUPUESTO_REPETICIONES', '5'))  # Misma consulta N veces = N+1
+PRESUPUESTO_CONSULTAS_ESTRICTO = os.environ.get('PRESUPUESTO_CONSULTAS_ESTRICTO', 'false').lower() == 'true'
+
 # =============================================================================
 # CORS
 # =============================================================================
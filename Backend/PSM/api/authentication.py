@@ -0,0 +1,80 @@
+"""
+Usuario de la peticion armado desde el JWT, sin consultar la BD.
+
+Con JWTAuthentication cada peticion autenticada hacia un SELECT del Usuario
+completo, aunque la vista solo necesite el id o saber si es admin. Ahora la
+autenticacion por defecto es JWTStatelessUserAuthentication (settings
+REST_FRAMEWORK) y el usuario de la peticion es un UsuarioToken construido con
+los claims que agrega serializers.agregar_claims (al emitir el token y en cada
+refresh):
+
+    user_id, username, roles, is_staff, debe_cambiar_password
+
+El Usuario real se carga recien cuando una vista lo necesita, con
+`request.user.usuario` o al pedir un atributo que no viene en el token
+(email, telefono, ...). En filtros y FKs usar el id:
+
+    Inscripcion.objects.filter(usuario_id=request.user.id)
+    serializer.save(usuario_id=request.user.id)
+
+Como ya no se lee su fila en cada peticion, un usuario desactivado o eliminado
+conserva el acceso hasta que vence su access token actual
+(ACCESS_TOKEN_LIFETIME), y lo mismo un cambio de grupos o de password
+pendiente. El refresh no copia los claims del refresh token:
+CustomTokenRefreshSerializer carga el Usuario, rechaza el refresh si esta
+inactivo o ya no existe, y vuelve a calcular los claims.
+"""
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+
+
+class UsuarioToken(TokenUser):
+    """TokenUser con los claims de la app y carga perezosa del Usuario."""
+
+    def __init__(self, token):
+        super().__init__(token)
+        roles = token.get('roles')
+        if isinstance(roles, (list, tuple)):
+            # permissions.roles_de_usuario() lo usa en vez de consultar los grupos
+            self._roles_cache = frozenset(roles)
+
+    @cached_property
+    def debe_cambiar_password(self):
+        if 'debe_cambiar_password' in self.token:
+            return bool(self.token['debe_cambiar_password'])
+        return self.usuario.debe_cambiar_password
+
+    @cached_property
+    def usuario(self):
+        """El Usuario completo (una consulta, solo la primera vez)."""
+        try:
+            return get_user_model().objects.get(pk=self.id)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+
+    # Sin claim de roles (tokens anteriores) los grupos salen del Usuario real
+    @property
+    def groups(self):
+        return self.usuario.groups
+
+    @property
+    def user_permissions(self):
+        return self.usuario.user_permissions
+
+    def __getattr__(self, atributo):
+        # Atributos privados (_roles_cache, _state, ...) no se buscan en el modelo
+        if atributo.startswith('_'):
+            raise AttributeError(atributo)
+        if atributo in self.token:
+            return self.token[atributo]
+        return getattr(self.usuario, atributo)
+
+    def __eq__(self, otro):
+        if isinstance(otro, get_user_model()):
+            return otro.pk == self.id
+        return super().__eq__(otro)
+
+    def __hash__(self):
+        return hash(self.id)
@@ -1,22 +1,121 @@
 """
 Utilidades para manejar archivos con Cloudinary
 Reemplaza la funcionalidad de MongoDB/GridFS
+
+Subida directa desde el navegador:
+1. El admin pide una firma con firmar_subida() (endpoint cloudinary/firma/).
+2. El navegador sube la imagen a Cloudinary con esa firma; los bytes no pasan
+   por Django.
+3. Al crear/editar el evento se envian public_id, version y signature de la
+   respuesta de Cloudinary; verificar_subida() comprueba la firma y arma la URL.
+
+Las imagenes que pasan por el servidor se normalizan antes de subirlas (EXIF
+fuera, lado maximo acotado, WebP); las subidas directas piden a Cloudinary la
+misma reduccion con una transformacion de entrada firmada.
+
+Antes de subir se busca el sha256 de los bytes en el indice de imagenes: si la
+misma imagen ya se subio se reutiliza su URL (ver services/indice_imagenes.py).
 """
+import base64
+import time
+
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cloudinary.utils
 import requests
 from io import BytesIO
 from django.conf import settings
 
+from .services.indice_imagenes import indice_imagenes
+from .services.normalizador_imagenes import normalizador_imagenes
+
+if all([settings.CLOUDINARY_CLOUD_NAME, settings.CLOUDINARY_API_KEY, settings.CLOUDINARY_API_SECRET]):
+    cloudinary.config(
+        cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+        api_key=settings.CLOUDINARY_API_KEY,
+        api_secret=settings.CLOUDINARY_API_SECRET,
+        secure=True
+    )
+
 
 class UtilidadesCloudinary:
     """Clase para manejar archivos en Cloudinary"""
     
+    # Formatos que Cloudinary acepta en las subidas firmadas
+    FORMATOS_PERMITIDOS = 'jpg,jpeg,png,webp,gif,heic,avif'
+    
     def __init__(self):
         """Inicializa la clase - la configuración ya está en settings.py"""
         pass
     
+    def esta_configurado(self):
+        """True si hay credenciales de Cloudinary (necesarias para firmar)."""
+        config = cloudinary.config()
+        return bool(config.cloud_name and config.api_key and config.api_secret)
+    
+    def firmar_subida(self, folder='eventos'):
+        """
+        Genera los parametros firmados para que el navegador suba una imagen
+        directo a Cloudinary. Cloudinary rechaza la firma pasada una hora del
+        timestamp, asi que cada firma sirve solo para subidas inmediatas.
+        """
+        config = cloudinary.config()
+        lado = normalizador_imagenes.lado_maximo
+        parametros = {
+            'timestamp': int(time.time()),
+            'folder': folder,
+            'allowed_formats': self.FORMATOS_PERMITIDOS,
+            # Transformacion de entrada: Cloudinary guarda la imagen ya reducida
+            'transformation': f'c_limit,w_{lado},h_{lado}',
+        }
+        parametros['signature'] = cloudinary.utils.api_sign_request(parametros, config.api_secret)
+        parametros['api_key'] = config.api_key
+        return {
+            'upload_url': f"https://api.cloudinary.com/v1_1/{config.cloud_name}/image/upload",
+            'parametros': parametros
+        }
+    
+    def verificar_subida(self, public_id, version, signature, folder='eventos'):
+        """
+        Verifica la firma que Cloudinary devolvio al navegador tras una subida
+        directa. Retorna la URL segura de la imagen, o None si la firma no es
+        valida o la imagen no esta en la carpeta esperada.
+        """
+        if not public_id or not version or not signature:
+            return None
+        if not str(public_id).startswith(f"{folder}/"):
+            return None
+        try:
+            if not cloudinary.utils.verify_api_response_signature(public_id, version, signature):
+                return None
+        except Exception as e:
+            print(f"Error verificando la firma de Cloudinary: {e}")
+            return None
+        url, _ = cloudinary.utils.cloudinary_url(public_id, version=version, secure=True)
+        return url
+    
+    def _normalizar(self, contenido):
+        """Normaliza los bytes de una imagen; si no se puede, sube el original."""
+        try:
+            normalizada, extension = normalizador_imagenes.normalizar(contenido)
+        except ValueError as e:
+            print(f"No se pudo normalizar la imagen, se sube el original: {e}")
+            return contenido
+        if extension:
+            print(f"Imagen normalizada a {extension}: {len(contenido)} -> {len(normalizada)} bytes")
+        return normalizada
+    
+    def _subir(self, contenido, folder, **opciones):
+        """Normaliza y sube una imagen nueva (sin pasar por el indice)."""
+        result = cloudinary.uploader.upload(
+            BytesIO(self._normalizar(contenido)),
+            folder=folder,
+            resource_type='auto',
+            **opciones
+        )
+        return result.get('secure_url')
+    
     def guardar_archivo(self, archivo, folder='eventos'):
         """
         Guarda un archivo (objeto File de Django) en Cloudinary
@@ -25,15 +124,13 @@ class UtilidadesCloudinary:
         try:
             print(f"Intentando subir archivo a Cloudinary: {archivo.name}, tamaño: {archivo.size}")
             
-            # Subir a Cloudinary
-            result = cloudinary.uploader.upload(
-                archivo,
-                folder=folder,
-                resource_type='auto',
-                public_id=f"{folder}/{archivo.name.split('.')[0]}"
+            # Subir a Cloudinary (o reutilizar si el contenido ya se subio)
+            url = indice_imagenes.obtener_o_subir(
+                archivo.read(),
+                lambda contenido: self._subir(
+                    contenido, folder, public_id=f"{folder}/{archivo.name.split('.')[0]}"
+                )
             )
-            
-            url = result.get('secure_url')
             print(f"Archivo subido exitosamente a Cloudinary: {url}")
             return url
             
@@ -55,14 +152,10 @@ class UtilidadesCloudinary:
             response = requests.get(url_imagen, timeout=10)
             response.raise_for_status()
             
-            # Subir a Cloudinary
-            result = cloudinary.uploader.upload(
-                BytesIO(response.content),
-                folder=folder,
-                resource_type='auto'
+            # Subir a Cloudinary (o reutilizar si el contenido ya se subio)
+            url = indice_imagenes.obtener_o_subir(
+                response.content, lambda contenido: self._subir(contenido, folder)
             )
-            
-            url = result.get('secure_url')
             print(f"Imagen descargada y subida a Cloudinary: {url}")
             return url
             
@@ -80,14 +173,14 @@ class UtilidadesCloudinary:
         try:
             print("Subiendo imagen base64 a Cloudinary...")
             
-            # Subir a Cloudinary directamente desde base64
-            result = cloudinary.uploader.upload(
-                f"data:image/jpeg;base64,{base64_data}",
-                folder=folder,
-                resource_type='auto'
-            )
+            # Remover prefijo data:image/...;base64, si existe
+            if ',' in base64_data:
+                base64_data = base64_data.split(',', 1)[1]
             
-            url = result.get('secure_url')
+            # Subir a Cloudinary (o reutilizar si el contenido ya se subio)
+            url = indice_imagenes.obtener_o_subir(
+                base64.b64decode(base64_data), lambda contenido: self._subir(contenido, folder)
+            )
             print(f"Imagen base64 subida exitosamente: {url}")
             return url
             
@@ -97,11 +190,27 @@ class UtilidadesCloudinary:
             traceback.print_exc()
             return None
     
+    def subir_bytes(self, contenido, folder='eventos'):
+        """
+        Sube los bytes de una imagen a Cloudinary y retorna la URL pública.
+        A diferencia de los otros métodos, deja pasar los errores para que la
+        cola de imágenes pueda reintentar (la cola normaliza y consulta el
+        índice antes de llamar).
+        """
+        result = cloudinary.uploader.upload(BytesIO(contenido), folder=folder, resource_type='image')
+        return result.get('secure_url')
+    
     def eliminar_archivo(self, public_id):
         """
-        Elimina un archivo de Cloudinary por su public_id
+        Elimina un archivo de Cloudinary por su public_id.
+        Si la imagen esta reutilizada por otros registros (ver ImagenIndice.usos)
+        solo se descuenta un uso y el archivo se conserva.
         """
         try:
+            # Que una imagen repetida no reutilice una URL que ya no existe
+            if not indice_imagenes.liberar_public_id(public_id):
+                print(f"Archivo de Cloudinary en uso, se conserva: {public_id}")
+                return {'result': 'en uso'}
             result = cloudinary.uploader.destroy(public_id)
             print(f"Archivo eliminado de Cloudinary: {public_id}")
             return result
@@ -109,6 +218,10 @@ class UtilidadesCloudinary:
             print(f"Error al eliminar archivo de Cloudinary: {e}")
             return None
     
+    def variantes(self, url):
+        """URLs de las variantes responsivas (pequena/mediana/grande) de una imagen."""
+        return normalizador_imagenes.variantes(url)
+    
     def obtener_url(self, url_completa):
         """
         Retorna la URL de la imagen (ya está guardada en la BD)
@@ -0,0 +1,115 @@
+"""
+Utilidades de cache HTTP: ETag, Last-Modified y peticiones por rango.
+
+Las respuestas condicionales (If-None-Match / If-Modified-Since -> 304) las
+resuelve django.utils.cache.get_conditional_response; aca solo se arma el
+ETag y se interpreta la cabecera Range.
+"""
+import calendar
+from datetime import timezone as dt_timezone
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class RangoInvalido(Exception):
+    """La cabecera Range pide bytes fuera del archivo (416)."""
+
+
+def etag_archivo(archivo):
+    """
+    ETag de un archivo de GridFS: el md5 si el archivo lo tiene guardado
+    (pymongo < 4 lo calculaba al subir); si no, id + tamaño, que alcanza porque
+    los archivos de GridFS no se modifican despues de guardados.
+    """
+    valor = getattr(archivo, 'md5', None) or f"{archivo._id}-{archivo.length}"
+    return quote_etag(str(valor))
+
+
+def timestamp(fecha):
+    """Segundos epoch de un datetime (los naive se toman como UTC, como los de Mongo)."""
+    if fecha is None:
+        return None
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(dt_timezone.utc)
+    return calendar.timegm(fecha.utctimetuple())
+
+
+def cabeceras_cache(respuesta, etag=None, ultima_modificacion=None, max_age=None):
+    """Agrega ETag, Last-Modified y Cache-Control a una respuesta."""
+    if etag:
+        respuesta['ETag'] = etag
+    if ultima_modificacion is not None:
+        respuesta['Last-Modified'] = http_date(ultima_modificacion)
+    if max_age is not None:
+        respuesta['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    return respuesta
+
+
+def cabeceras_publicas(respuesta, etag, max_age=0):
+    """
+    ETag para datos iguales para todos los usuarios: se pueden guardar en
+    cualquier cache, que revalida con If-None-Match cuando vence max_age.
+    """
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = f'public, max-age={max_age}, must-revalidate'
+    return respuesta
+
+
+def cabeceras_privadas(respuesta, etag):
+    """
+    ETag para datos de un usuario: el navegador puede guardarlos pero debe
+    revalidar siempre, y ningun cache compartido los reutiliza entre usuarios.
+    """
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(respuesta, ('Authorization',))
+    return respuesta
+
+
+def rango_vigente(request, etag, ultima_modificacion):
+    """
+    False si la peticion trae If-Range y ya no corresponde a la version actual
+    del archivo; en ese caso se ignora Range y se envia el archivo completo.
+    """
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return if_range == http_date(ultima_modificacion) if ultima_modificacion is not None else False
+
+
+def parsear_rango(cabecera, tamano):
+    """
+    Interpreta una cabecera `Range: bytes=...` para un archivo de `tamano`
+    bytes. Devuelve (inicio, fin) inclusivos, o None si la cabecera no aplica
+    (ausente, otra unidad o varios rangos: se responde el archivo completo).
+    Lanza RangoInvalido si el rango no se puede satisfacer.
+    """
+    if not cabecera or not cabecera.startswith('bytes='):
+        return None
+    especificacion = cabecera[len('bytes='):].strip()
+    if ',' in especificacion:
+        return None
+
+    inicio_txt, separador, fin_txt = especificacion.partition('-')
+    if not separador:
+        return None
+    try:
+        if inicio_txt == '':
+            # bytes=-N: los ultimos N bytes
+            sufijo = int(fin_txt)
+            if sufijo <= 0 or tamano == 0:
+                raise RangoInvalido(especificacion)
+            return max(0, tamano - sufijo), tamano - 1
+        inicio = int(inicio_txt)
+        fin = int(fin_txt) if fin_txt else tamano - 1
+    except ValueError:
+        return None
+
+    if inicio >= tamano:
+        raise RangoInvalido(especificacion)
+    if inicio > fin:
+        return None
+    return inicio, min(fin, tamano - 1)
@@ -0,0 +1,222 @@
+"""
+Filtros de servidor para los listados de la API.
+
+Cada función recibe un queryset y los query params de la petición y devuelve
+el queryset filtrado. Los valores inválidos se rechazan con ValidationError
+(400) en lugar de ignorarse en silencio.
+"""
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Evento, Inscripcion
+
+
+def _parsear_fecha(params, nombre):
+    """Lee un parámetro YYYY-MM-DD; devuelve None si no viene."""
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ValidationError({nombre: 'Formato de fecha inválido. Use YYYY-MM-DD.'})
+
+
+def _parsear_ids(params, nombre):
+    """Lee un parámetro con uno o varios ids separados por coma."""
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    try:
+        return [int(v) for v in valor.split(',') if v.strip()]
+    except ValueError:
+        raise ValidationError({nombre: 'Debe ser un id o una lista de ids separados por coma.'})
+
+
+def _parsear_lista(params, nombre):
+    """Lee un parámetro de texto con valores separados por coma."""
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    return [v.strip() for v in valor.split(',') if v.strip()]
+
+
+def _parsear_booleano(params, nombre):
+    """Lee un parámetro true/false; devuelve None si no viene."""
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    if valor.lower() in ('true', '1'):
+        return True
+    if valor.lower() in ('false', '0'):
+        return False
+    raise ValidationError({nombre: 'Debe ser true o false.'})
+
+
+def _filtrar_rango(queryset, params, campo):
+    """
+    ?desde= / ?hasta= (YYYY-MM-DD, ambos inclusive) sobre un DateTimeField.
+    Se compara contra el inicio del día (y no con __date) para usar el índice.
+    """
+    desde = _parsear_fecha(params, 'desde')
+    hasta = _parsear_fecha(params, 'hasta')
+    if desde and hasta and desde > hasta:
+        raise ValidationError({'hasta': 'hasta debe ser posterior a desde.'})
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': timezone.make_aware(datetime.combine(desde, time.min))})
+    if hasta:
+        siguiente = datetime.combine(hasta + timedelta(days=1), time.min)
+        queryset = queryset.filter(**{f'{campo}__lt': timezone.make_aware(siguiente)})
+    return queryset
+
+
+def filtrar_eventos(queryset, params):
+    """
+    Filtros del catálogo de eventos:
+    - estado: activo, inactivo o finalizado (acepta varios separados por coma)
+    - categoria / ubicacion: id o ids separados por coma
+    - fecha_inicio / fecha_fin: ventana de fechas; devuelve los eventos que se
+      cruzan con la ventana (terminan después de fecha_inicio y empiezan antes
+      de fecha_fin)
+    - dias_semana: uno o varios días ("lunes,miercoles"); basta con que el
+      evento se realice en alguno de ellos
+    """
+    estados = _parsear_lista(params, 'estado')
+    if estados:
+        validos = {valor for valor, _ in Evento.ESTADO_CHOICES}
+        invalidos = [e for e in estados if e not in validos]
+        if invalidos:
+            raise ValidationError({'estado': f'Estado inválido: {", ".join(invalidos)}'})
+        queryset = queryset.filter(estado__in=estados)
+
+    categorias = _parsear_ids(params, 'categoria')
+    if categorias:
+        queryset = queryset.filter(categoria_id__in=categorias)
+
+    ubicaciones = _parsear_ids(params, 'ubicacion')
+    if ubicaciones:
+        queryset = queryset.filter(ubicacion_id__in=ubicaciones)
+
+    desde = _parsear_fecha(params, 'fecha_inicio')
+    hasta = _parsear_fecha(params, 'fecha_fin')
+    if desde and hasta and desde > hasta:
+        raise ValidationError({'fecha_fin': 'fecha_fin debe ser posterior a fecha_inicio.'})
+    if desde:
+        queryset = queryset.filter(fecha_fin__gte=desde)
+    if hasta:
+        queryset = queryset.filter(fecha_inicio__lte=hasta)
+
+    dias = _parsear_lista(params, 'dias_semana')
+    if dias:
+        # El panel admin guarda los días en minúscula ("lunes", "sabado")
+        # dias_semana es un array JSON; `contains` funciona en PostgreSQL y MySQL.
+        # SQLite no lo soporta: ahi se busca el elemento entre comillas en el
+        # texto JSON (json.dumps para escapar igual que al guardar)
+        sqlite = connections[queryset.db].vendor == 'sqlite'
+        condicion = Q()
+        for dia in dias:
+            if sqlite:
+                condicion |= Q(dias_semana__icontains=json.dumps(dia.lower()))
+            else:
+                condicion |= Q(dias_semana__contains=[dia.lower()])
+        queryset = queryset.filter(condicion)
+
+    return queryset
+
+
+def filtrar_inscripciones(queryset, params):
+    """
+    Filtros del listado de inscripciones:
+    - evento / usuario: id o ids separados por coma
+    - estado: pendiente, confirmada o cancelada (acepta varios separados por coma)
+    - asistio: true o false
+    - desde / hasta: fecha de inscripción
+    """
+    eventos = _parsear_ids(params, 'evento')
+    if eventos:
+        queryset = queryset.filter(evento_id__in=eventos)
+
+    usuarios = _parsear_ids(params, 'usuario')
+    if usuarios:
+        queryset = queryset.filter(usuario_id__in=usuarios)
+
+    estados = _parsear_lista(params, 'estado')
+    if estados:
+        validos = {valor for valor, _ in Inscripcion.ESTADO_CHOICES}
+        invalidos = [e for e in estados if e not in validos]
+        if invalidos:
+            raise ValidationError({'estado': f'Estado inválido: {", ".join(invalidos)}'})
+        queryset = queryset.filter(estado__in=estados)
+
+    asistio = _parsear_booleano(params, 'asistio')
+    if asistio is not None:
+        queryset = queryset.filter(asistio=asistio)
+
+    return _filtrar_rango(queryset, params, 'fecha_inscripcion')
+
+
+def filtrar_resenas(queryset, params):
+    """
+    Filtros del listado de reseñas:
+    - evento / usuario: id o ids separados por coma
+    - calificacion: una o varias (1-5) separadas por coma
+    - desde / hasta: fecha de la reseña
+    """
+    eventos = _parsear_ids(params, 'evento')
+    if eventos:
+        queryset = queryset.filter(evento_id__in=eventos)
+
+    usuarios = _parsear_ids(params, 'usuario')
+    if usuarios:
+        queryset = queryset.filter(usuario_id__in=usuarios)
+
+    calificaciones = _parsear_ids(params, 'calificacion')
+    if calificaciones:
+        queryset = queryset.filter(calificacion__in=calificaciones)
+
+    return _filtrar_rango(queryset, params, 'fecha_resena')
+
+
+def filtrar_contactos(queryset, params):
+    """Filtros del listado de mensajes de contacto: desde / hasta (fecha de envío)."""
+    return _filtrar_rango(queryset, params, 'fecha_envio')
+
+
+def filtrar_usuarios(queryset, params):
+    """
+    Filtros del listado de usuarios:
+    - rol: nombre de grupo o varios separados por coma ("admin,cliente")
+    - email_verificado: true o false
+    - desde / hasta: fecha de registro
+    """
+    roles = _parsear_lista(params, 'rol')
+    if roles:
+        queryset = queryset.filter(groups__name__in=roles).distinct()
+
+    verificado = _parsear_booleano(params, 'email_verificado')
+    if verificado is not None:
+        queryset = queryset.filter(email_verificado=verificado)
+
+    return _filtrar_rango(queryset, params, 'date_joined')
+
+
+# ?ordenar= del catálogo: campos de orden, todos van en el cursor
+# (pagination.CursorTuplaPaginacion); el último es único para desempatar
+ORDENES_EVENTO = {
+    'id': ('id',),
+    # promedio guardado en el evento (services/contadores_service.py), con índice
+    'calificacion': ('-promedio_calificacion', '-total_resenas', 'id'),
+}
+
+
+def orden_eventos(params):
+    """Orden del catálogo según ?ordenar= (id por defecto)."""
+    orden = params.get('ordenar') or 'id'
+    if orden not in ORDENES_EVENTO:
+        raise ValidationError({'ordenar': f'Orden inválido. Opciones: {", ".join(ORDENES_EVENTO)}'})
+    return ORDENES_EVENTO[orden]
@@ -0,0 +1,80 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Librerias pesadas que los servicios cargan solo al usarse
+LIBRERIAS = ['requests', 'bs4', 'lxml', 'cloudinary', 'sib_api_v3_sdk', 'pymongo', 'gridfs', 'PIL']
+
+# Lo que hace un worker al arrancar: configurar Django y cargar las URLs (vistas)
+ARRANQUE = (
+    'import django, sys; django.setup(); import {urlconf}; {extra}'
+    'print(",".join(m for m in {librerias!r} if m in sys.modules))'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Medir el arranque en frio (django.setup() + cargar las URLs) con `python -X importtime` '
+        'en procesos nuevos, comparando los servicios perezosos (services/registro.py) contra '
+        'importarlos y construirlos todos al arrancar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help='Procesos por modo')
+
+    def _medir(self, extra):
+        """Corre un arranque en un proceso nuevo. Devuelve (ms totales, tiempos por modulo, librerias cargadas)."""
+        codigo = ARRANQUE.format(urlconf=settings.ROOT_URLCONF, extra=extra, librerias=LIBRERIAS)
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            capture_output=True, text=True, env=os.environ.copy(), cwd=settings.BASE_DIR
+        )
+        if proceso.returncode != 0:
+            raise CommandError(proceso.stderr[-2000:])
+
+        # Formato: "import time: self [us] | cumulative | nombre" (la indentacion marca el nivel)
+        modulos = {}
+        for linea in proceso.stderr.splitlines():
+            coincidencia = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)', linea)
+            if coincidencia:
+                _, acumulado, sangria, nombre = coincidencia.groups()
+                modulos[nombre] = (int(acumulado), len(sangria))
+        total = sum(acumulado for acumulado, nivel in modulos.values() if nivel == 0) / 1000
+        cargadas = [m for m in proceso.stdout.strip().split(',') if m]
+        return total, modulos, cargadas
+
+    def handle(self, *args, **options):
+        modos = {
+            'perezoso': '',
+            # Como antes: todos los servicios construidos y sus librerias importadas al arrancar
+            'todo al arrancar': (
+                'import importlib, importlib.util; from api.services.registro import cargar_todos; cargar_todos(); '
+                f'[importlib.import_module(m) for m in {LIBRERIAS!r} if importlib.util.find_spec(m)]; '
+            ),
+        }
+        resultados = {}
+        for modo, extra in modos.items():
+            mediciones = [self._medir(extra) for _ in range(options['repeticiones'])]
+            totales = [total for total, _, _ in mediciones]
+            resultados[modo] = statistics.median(totales)
+            _, modulos, cargadas = mediciones[-1]
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{modo}'))
+            self.stdout.write(
+                f'  importaciones: mediana {statistics.median(totales):.1f} ms '
+                f'(min {min(totales):.1f}, max {max(totales):.1f}, {len(totales)} procesos)'
+            )
+            self.stdout.write(f"  librerias pesadas cargadas: {', '.join(cargadas) or 'ninguna'}")
+            vistas = modulos.get(settings.ROOT_URLCONF, (0, 0))[0] / 1000
+            self.stdout.write(f'  {settings.ROOT_URLCONF} (vistas y servicios que importan): {vistas:.1f} ms')
+
+        perezoso, completo = resultados['perezoso'], resultados['todo al arrancar']
+        self.stdout.write(self.style.SUCCESS(
+            f'\nArranque perezoso: {perezoso:.1f} ms vs {completo:.1f} ms '
+            f'({completo - perezoso:.1f} ms menos, x{completo / perezoso:.1f})'
+        ))
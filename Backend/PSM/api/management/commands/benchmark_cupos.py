@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as hora
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import CategEvento, Evento, Inscripcion, Ubicacion
+from api.services.cupos_service import SinCuposDisponibles, cupos_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estres de la reserva de cupos: lanza muchas confirmaciones en paralelo '
+        'sobre un evento temporal y verifica que no se vendan mas cupos de los que hay. '
+        'Usar contra PostgreSQL/MySQL (SQLite serializa las escrituras).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cupos', type=int, default=50, help='Cupo maximo del evento de prueba')
+        parser.add_argument('--confirmaciones', type=int, default=300, help='Inscripciones que intentan confirmarse')
+        parser.add_argument('--hilos', type=int, default=20, help='Confirmaciones simultaneas')
+
+    def handle(self, *args, **options):
+        cupos = options['cupos']
+        total = options['confirmaciones']
+        hilos = options['hilos']
+        Usuario = get_user_model()
+
+        resultados = {'confirmadas': 0, 'sin_cupo': 0, 'errores': 0}
+        lock = threading.Lock()
+        arranque = threading.Event()
+
+        def confirmar(inscripcion):
+            try:
+                arranque.wait()  # Arrancar todas las confirmaciones a la vez
+                cupos_service.cambiar_estado(inscripcion, 'confirmada')
+                clave = 'confirmadas'
+            except SinCuposDisponibles:
+                clave = 'sin_cupo'
+            except Exception as e:
+                self.stderr.write(f'Error en confirmacion {inscripcion.pk}: {e}')
+                clave = 'errores'
+            finally:
+                connection.close()  # Cada hilo usa su propia conexion
+            with lock:
+                resultados[clave] += 1
+
+        categoria = ubicacion = None
+        try:
+            self.stdout.write(f'Preparando evento con {cupos} cupos y {total} inscripciones pendientes...')
+            categoria = CategEvento.objects.create(nombre='benchmark_cupos', estado=False)
+            ubicacion = Ubicacion.objects.create(recinto='benchmark_cupos', direccion='https://maps.google.com')
+            evento = Evento.objects.create(
+                nombre='benchmark_cupos', categoria=categoria, ubicacion=ubicacion,
+                fecha_inicio=date.today(), fecha_fin=date.today(),
+                hora_inicio=hora(8, 0), hora_fin=hora(9, 0),
+                cupo_maximo=cupos, cupos_disponibles=cupos, estado='inactivo'
+            )
+            Usuario.objects.bulk_create([
+                Usuario(username=f'benchmark_cupos_{i}') for i in range(total)
+            ])
+            usuarios = list(Usuario.objects.filter(username__startswith='benchmark_cupos_'))
+            Inscripcion.objects.bulk_create([Inscripcion(usuario=u, evento=evento) for u in usuarios])
+            inscripciones = list(Inscripcion.objects.filter(evento=evento))
+
+            with ThreadPoolExecutor(max_workers=hilos) as executor:
+                futuros = [executor.submit(confirmar, i) for i in inscripciones]
+                inicio = time.perf_counter()
+                arranque.set()
+                for futuro in futuros:
+                    futuro.result()
+            duracion = time.perf_counter() - inicio
+
+            evento.refresh_from_db()
+            confirmadas_bd = Inscripcion.objects.filter(evento=evento, estado='confirmada').count()
+            vendidos = cupos - evento.cupos_disponibles
+
+            self.stdout.write(f'Duracion: {duracion:.2f}s ({total / duracion:.0f} confirmaciones/s)')
+            self.stdout.write(f"Confirmadas: {resultados['confirmadas']} | Sin cupo: {resultados['sin_cupo']} | Errores: {resultados['errores']}")
+            self.stdout.write(f'Cupos vendidos: {vendidos} | Inscripciones confirmadas en BD: {confirmadas_bd} | Cupos restantes: {evento.cupos_disponibles}')
+
+            sobreventa = confirmadas_bd - cupos
+            if evento.cupos_disponibles < 0 or sobreventa > 0 or vendidos != confirmadas_bd:
+                self.stdout.write(self.style.ERROR('SOBREVENTA DETECTADA: los cupos no coinciden con las confirmaciones'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Sin sobreventa: cupos y confirmaciones coinciden'))
+        finally:
+            # Limpiar los datos de prueba aunque la preparacion haya fallado a medias
+            # (el evento arrastra sus inscripciones)
+            if categoria is not None:
+                categoria.delete()
+            if ubicacion is not None:
+                ubicacion.delete()
+            Usuario.objects.filter(username__startswith='benchmark_cupos_').delete()
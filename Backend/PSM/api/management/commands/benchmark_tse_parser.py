@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.tse_service import LXML_AVAILABLE, tse_service
+
+FIXTURES = Path(__file__).resolve().parents[2] / 'fixtures' / 'tse'
+
+
+class Command(BaseCommand):
+    help = (
+        'Comparar el parser de paginas del TSE con lxml contra el de BeautifulSoup usando '
+        'las paginas grabadas en api/fixtures/tse. Verifica que ambos den el mismo resultado '
+        'y mide tiempo y memoria por consulta.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=200, help='Repeticiones por pagina')
+
+    def _medir(self, funcion, iteraciones):
+        """Devuelve (ms por llamada, pico de memoria en KB de una llamada)."""
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            funcion()
+        ms = (time.perf_counter() - inicio) * 1000 / iteraciones
+
+        tracemalloc.start()
+        funcion()
+        pico = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        return ms, pico
+
+    def handle(self, *args, **options):
+        if not LXML_AVAILABLE:
+            raise CommandError('lxml no está instalado: no hay ruta rápida que comparar')
+        from lxml import html as lxml_html
+
+        iteraciones = options['iteraciones']
+        cedula = '109870654'
+        paginas = {
+            'formulario': (
+                lambda html: tse_service._leer_formulario_lxml(lxml_html.document_fromstring(html)),
+                lambda html: tse_service._leer_formulario_bs4(BeautifulSoup(html, 'html.parser')),
+            ),
+            'resultado': (
+                lambda html: tse_service._parsear_resultado_lxml(lxml_html.document_fromstring(html), cedula),
+                lambda html: tse_service._parsear_resultado(BeautifulSoup(html, 'html.parser'), cedula),
+            ),
+            'no_encontrada': (
+                lambda html: tse_service._parsear_resultado_lxml(lxml_html.document_fromstring(html), cedula),
+                lambda html: tse_service._parsear_resultado(BeautifulSoup(html, 'html.parser'), cedula),
+            ),
+        }
+
+        self.stdout.write(f'{"pagina":<15}{"parser":<16}{"ms/consulta":>12}{"pico KB":>10}')
+        for nombre, (rapido, bs4) in paginas.items():
+            html = (FIXTURES / f'{nombre}.html').read_text(encoding='utf-8')
+
+            esperado, obtenido = bs4(html), rapido(html)
+            if esperado != obtenido:
+                raise CommandError(f'{nombre}: los resultados no coinciden\nbs4:  {esperado}\nlxml: {obtenido}')
+
+            ms_bs4, kb_bs4 = self._medir(lambda: bs4(html), iteraciones)
+            ms_lxml, kb_lxml = self._medir(lambda: rapido(html), iteraciones)
+            self.stdout.write(f'{nombre:<15}{"BeautifulSoup":<16}{ms_bs4:>12.3f}{kb_bs4:>10.0f}')
+            self.stdout.write(f'{"":<15}{"lxml":<16}{ms_lxml:>12.3f}{kb_lxml:>10.0f}  (x{ms_bs4 / ms_lxml:.1f} mas rapido)')
+
+        self.stdout.write(self.style.SUCCESS('Ambos parsers dan el mismo resultado en todas las paginas'))
@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.brevo_service import brevo_service
+from api.services.recordatorios_service import RecordatoriosService
+
+
+class Command(BaseCommand):
+    help = (
+        'Enviar los recordatorios de eventos que vencen hoy segun la anticipacion de cada usuario. '
+        'Pensado para ejecutarse una vez al dia (cron). Nunca envia dos veces el mismo recordatorio.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=10, help='Llamadas simultaneas a Brevo (cada una es un lote)')
+        parser.add_argument('--max-intentos', type=int, default=3, help='Intentos por recordatorio en esta corrida antes de marcarlo fallido')
+        parser.add_argument(
+            '--max-intentos-totales', type=int, default=9,
+            help='Intentos sumando todas las corridas; hasta entonces un fallido se reintenta en la siguiente'
+        )
+        parser.add_argument('--fecha', type=str, help='Fecha de referencia YYYY-MM-DD (por defecto hoy)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar los recordatorios pendientes, sin enviar')
+
+    def handle(self, *args, **options):
+        try:
+            hoy = date.fromisoformat(options['fecha']) if options['fecha'] else None
+        except ValueError:
+            raise CommandError('Formato de fecha inválido. Use YYYY-MM-DD.')
+
+        servicio = RecordatoriosService(
+            max_workers=options['workers'],
+            max_intentos=options['max_intentos'],
+            max_intentos_totales=options['max_intentos_totales']
+        )
+
+        if options['dry_run']:
+            total = servicio.buscar_pendientes(hoy).count()
+            self.stdout.write(f'Recordatorios pendientes: {total}')
+            return
+
+        if not brevo_service.esta_configurado():
+            raise CommandError('Brevo no está configurado (BREVO_API_KEY / sib-api-v3-sdk)')
+
+        lote, recordatorios = servicio.tomar_lote(hoy)
+        self.stdout.write(f'Lote {lote}: {len(recordatorios)} recordatorios por enviar')
+
+        def progreso(resumen, total):
+            hechos = resumen['enviados'] + resumen['fallidos']
+            self.stdout.write(f"  {hechos}/{total} (enviados: {resumen['enviados']}, fallidos: {resumen['fallidos']})")
+
+        resumen = servicio.enviar_lote(recordatorios, progreso=progreso)
+        self.stdout.write(self.style.SUCCESS(
+            f"Recordatorios enviados: {resumen['enviados']} | fallidos: {resumen['fallidos']}"
+        ))
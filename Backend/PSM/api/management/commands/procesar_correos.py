@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.services.brevo_service import brevo_service
+from api.services.outbox_service import outbox_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Entregar los emails de la bandeja de salida (CorreoSaliente). Sin opciones procesa '
+        'lo pendiente y termina (cron); con --continuo queda corriendo como worker. '
+        'Se puede ejecutar junto con el hilo de los procesos web: nunca envia dos veces un correo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Seguir procesando indefinidamente')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay pendientes')
+        parser.add_argument('--limite', type=int, default=50, help='Correos a tomar por vuelta')
+
+    def handle(self, *args, **options):
+        if not brevo_service.esta_configurado():
+            raise CommandError('Brevo no está configurado (BREVO_API_KEY / sib-api-v3-sdk)')
+
+        total = {'enviados': 0, 'errores': 0}
+        while True:
+            resumen = outbox_service.procesar_pendientes(limite=options['limite'])
+            for clave, valor in resumen.items():
+                total[clave] += valor
+            if sum(resumen.values()):
+                self.stdout.write(f"Enviados: {resumen['enviados']} | Con error: {resumen['errores']}")
+                continue
+            if not options['continuo']:
+                break
+            close_old_connections()
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Bandeja procesada. Enviados: {total['enviados']} | Con error: {total['errores']}"
+        ))
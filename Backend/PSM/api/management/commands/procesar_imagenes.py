@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.services.imagenes_service import imagenes_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesar la cola de imagenes de eventos (ImagenPendiente): descargar/decodificar, validar, '
+        'subir a Cloudinary y actualizar el evento. Sin opciones procesa lo pendiente y termina; '
+        'con --continuo queda corriendo como worker. --fallidas lista la cola de descarte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Seguir procesando indefinidamente')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos de espera cuando no hay pendientes')
+        parser.add_argument('--limite', type=int, default=20, help='Imagenes a tomar por vuelta')
+        parser.add_argument('--fallidas', action='store_true', help='Listar las imagenes fallidas y terminar')
+        parser.add_argument(
+            '--reintentar-fallidas', nargs='*', type=int, metavar='ID',
+            help='Volver a encolar las imagenes fallidas (todas, o solo los ids indicados)'
+        )
+
+    def handle(self, *args, **options):
+        if options['fallidas']:
+            fallidas = imagenes_service.fallidas()
+            for imagen in fallidas:
+                origen = imagen.url or f'base64 ({len(imagen.contenido_base64)} caracteres)'
+                self.stdout.write(
+                    f'#{imagen.pk} evento {imagen.evento_id} "{imagen.evento.nombre}" - {origen}\n'
+                    f'    {imagen.intentos} intentos: {imagen.error}'
+                )
+            self.stdout.write(f'Imagenes fallidas: {len(fallidas)}')
+            return
+
+        if options['reintentar_fallidas'] is not None:
+            cantidad = imagenes_service.reintentar_fallidas(options['reintentar_fallidas'])
+            self.stdout.write(f'Imagenes fallidas encoladas de nuevo: {cantidad}')
+
+        total = {'listas': 0, 'errores': 0}
+        while True:
+            resumen = imagenes_service.procesar_pendientes(limite=options['limite'])
+            for clave, valor in resumen.items():
+                total[clave] += valor
+            if sum(resumen.values()):
+                self.stdout.write(f"Listas: {resumen['listas']} | Con error: {resumen['errores']}")
+                continue
+            if not options['continuo']:
+                break
+            close_old_connections()
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cola procesada. Listas: {total['listas']} | Con error: {total['errores']}"
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api.services.contadores_service import contadores_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcular los contadores desnormalizados (eventos e inscripciones por categoria, '
+        'inscripciones y reseñas por evento) y corregir los que no coinciden. '
+        'Correr despues de cargas masivas o por cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar las filas desfasadas')
+
+    def handle(self, *args, **options):
+        resultado = contadores_service.reconciliar(aplicar=not options['dry_run'])
+        accion = 'desfasadas' if options['dry_run'] else 'corregidas'
+        self.stdout.write(self.style.SUCCESS(
+            ' | '.join(f'{modelo}: {cantidad} {accion}' for modelo, cantidad in resultado.items())
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from api.services.estadisticas_service import estadisticas_service
+
+
+class Command(BaseCommand):
+    help = 'Recalcular el snapshot de estadisticas del dashboard admin (para ejecutar por cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--si-necesario',
+            action='store_true',
+            help='Solo recalcular si el snapshot esta invalidado o vencido'
+        )
+
+    def handle(self, *args, **options):
+        if options['si_necesario']:
+            snapshot, recalculado = estadisticas_service.refrescar_si_necesario()
+            if not recalculado:
+                self.stdout.write('El snapshot esta vigente o ya se esta recalculando; no se recalculo')
+                return
+        else:
+            snapshot = estadisticas_service.refrescar()
+            if snapshot is None:
+                self.stdout.write(self.style.WARNING('Otro proceso ya esta recalculando el snapshot'))
+                return
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot de estadisticas v{snapshot.version} generado en {snapshot.generado_en.isoformat()}'
+        ))
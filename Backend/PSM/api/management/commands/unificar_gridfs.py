@@ -0,0 +1,94 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    from pymongo.errors import OperationFailure
+except ImportError:
+    OperationFailure = Exception
+
+from api.services.mongo_cliente import BUCKET_ANTIGUO, BUCKET_IMAGENES, PYMONGO_AVAILABLE, mongo_cliente
+
+
+class Command(BaseCommand):
+    help = (
+        f"Mover los archivos del bucket de GridFS '{BUCKET_ANTIGUO}' (MongoDBService) al bucket "
+        f"'{BUCKET_IMAGENES}' (UtilidadesMongo), conservando el _id para que las referencias "
+        'guardadas en la base de datos sigan funcionando. Se puede correr varias veces: los '
+        'archivos ya copiados se saltan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar lo que se copiaria')
+        parser.add_argument(
+            '--eliminar-origen', action='store_true',
+            help=f"Borrar de '{BUCKET_ANTIGUO}' cada archivo ya copiado y verificado"
+        )
+        parser.add_argument('--lote', type=int, default=100, help='Chunks por insert')
+
+    def _copiar(self, archivo, origen_chunks, destino_chunks, lote):
+        """Copia los chunks de un archivo. Devuelve cuantos copio."""
+        # Restos de una corrida anterior que se corto antes de escribir el archivo
+        destino_chunks.delete_many({'files_id': archivo['_id']})
+        copiados, pendientes = 0, []
+        for chunk in origen_chunks.find({'files_id': archivo['_id']}).sort('n', 1):
+            pendientes.append(chunk)
+            if len(pendientes) >= lote:
+                destino_chunks.insert_many(pendientes)
+                copiados += len(pendientes)
+                pendientes = []
+        if pendientes:
+            destino_chunks.insert_many(pendientes)
+            copiados += len(pendientes)
+        return copiados
+
+    def handle(self, *args, **options):
+        if not PYMONGO_AVAILABLE:
+            raise CommandError('pymongo no está instalado')
+
+        db = mongo_cliente.db
+        origen_files, origen_chunks = db[f'{BUCKET_ANTIGUO}.files'], db[f'{BUCKET_ANTIGUO}.chunks']
+        destino_files, destino_chunks = db[f'{BUCKET_IMAGENES}.files'], db[f'{BUCKET_IMAGENES}.chunks']
+
+        if not options['dry_run']:
+            # Los mismos indices que crea GridFSBucket al subir el primer archivo
+            try:
+                destino_files.create_index([('filename', 1), ('uploadDate', 1)])
+                destino_chunks.create_index([('files_id', 1), ('n', 1)], unique=True)
+            except OperationFailure as e:
+                self.stderr.write(f'No se crearon los indices de {BUCKET_IMAGENES} (ya existen?): {e}')
+
+        resumen = {'copiados': 0, 'existentes': 0, 'eliminados': 0, 'errores': 0}
+        for archivo in origen_files.find({}).sort('_id', 1):
+            archivo_id = archivo['_id']
+            existe = destino_files.count_documents({'_id': archivo_id}, limit=1)
+
+            if options['dry_run']:
+                resumen['existentes' if existe else 'copiados'] += 1
+                continue
+
+            if existe:
+                resumen['existentes'] += 1
+            else:
+                esperados = math.ceil(archivo.get('length', 0) / archivo['chunkSize']) if archivo.get('chunkSize') else 0
+                copiados = self._copiar(archivo, origen_chunks, destino_chunks, options['lote'])
+                if copiados != esperados:
+                    destino_chunks.delete_many({'files_id': archivo_id})
+                    self.stderr.write(f'{archivo_id}: se esperaban {esperados} chunks y hay {copiados}; se omite')
+                    resumen['errores'] += 1
+                    continue
+                # El documento del archivo va al final: hasta aca el archivo no es visible
+                destino_files.insert_one(archivo)
+                resumen['copiados'] += 1
+
+            if options['eliminar_origen']:
+                # Igual que GridFS: primero el archivo (deja de ser visible), despues los chunks
+                origen_files.delete_one({'_id': archivo_id})
+                origen_chunks.delete_many({'files_id': archivo_id})
+                resumen['eliminados'] += 1
+
+        prefijo = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}Copiados: {resumen['copiados']} | Ya estaban: {resumen['existentes']} | "
+            f"Eliminados del origen: {resumen['eliminados']} | Con error: {resumen['errores']}"
+        ))
@@ -0,0 +1,65 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.tse_service import tse_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Validar contra el TSE las cedulas de un CSV (columna "cedula" o la primera columna) '
+        'y escribir un CSV con los datos de cada persona. Usa la cache de consultas y '
+        'hace varias consultas en paralelo.'
+    )
+
+    COLUMNAS = [
+        'fila', 'cedula', 'valida', 'nombre', 'primer_apellido', 'segundo_apellido',
+        'fecha_nacimiento', 'nacionalidad', 'edad', 'error'
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con las cedulas')
+        parser.add_argument('--salida', help='CSV de resultados (por defecto la salida estandar)')
+        parser.add_argument('--workers', type=int, help='Consultas simultaneas al TSE (por defecto TSE_MAX_CONCURRENTES)')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], encoding='utf-8-sig') as f:
+                cedulas = tse_service.leer_cedulas_csv(f.read())
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+        if not cedulas:
+            raise CommandError('El archivo no tiene cedulas')
+
+        salida = open(options['salida'], 'w', newline='', encoding='utf-8') if options['salida'] else sys.stdout
+        total = len(cedulas)
+        resultados = [None] * total
+        validas = 0
+        inicio = time.monotonic()
+        try:
+            for completadas, (indice, cedula, resultado) in enumerate(
+                tse_service.consultar_lote(cedulas, max_workers=options['workers']), start=1
+            ):
+                resultados[indice] = {**resultado, 'fila': indice + 1, 'cedula': cedula}
+                validas += bool(resultado.get('valida'))
+                if completadas % 50 == 0 or completadas == total:
+                    transcurrido = time.monotonic() - inicio
+                    self.stderr.write(
+                        f'  {completadas}/{total} ({validas} validas) - {transcurrido:.0f}s, '
+                        f'faltan ~{transcurrido / completadas * (total - completadas):.0f}s'
+                    )
+
+            # El CSV de salida respeta el orden del archivo original
+            writer = csv.DictWriter(salida, fieldnames=self.COLUMNAS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(resultados)
+        finally:
+            if salida is not sys.stdout:
+                salida.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Cedulas: {total} | Validas: {validas} | Invalidas: {total - validas} | '
+            f'Tiempo: {time.monotonic() - inicio:.1f}s'
+        ))
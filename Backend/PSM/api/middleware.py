@@ -0,0 +1,119 @@
+"""
+Presupuesto de consultas por peticion y detector de N+1.
+
+PresupuestoConsultasMiddleware registra cada consulta SQL de la peticion con
+connection.execute_wrapper() y al terminar:
+- agrega las cabeceras X-DB-Queries, X-DB-Time-ms y X-DB-Repetidas,
+- agrupa las consultas por "forma" (el SQL con %s, sin los valores) y marca
+  como N+1 las formas que se repiten PRESUPUESTO_REPETICIONES veces o mas,
+- escribe un log JSON en el logger 'api.consultas' (WARNING si se paso del
+  presupuesto o hay N+1, DEBUG si no),
+- con PRESUPUESTO_CONSULTAS_ESTRICTO lanza PresupuestoConsultasExcedido, asi
+  un test que llama a una vista que se pasa del presupuesto falla.
+
+El presupuesto es PRESUPUESTO_CONSULTAS, o el atributo `presupuesto_consultas`
+de la vista si lo tiene:
+
+    class EventoListCreateView(generics.ListCreateAPIView):
+        presupuesto_consultas = 6
+
+Las consultas que se hacen mientras se envia una StreamingHttpResponse (o en
+hilos aparte) no se cuentan.
+"""
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.consultas')
+
+# "IN (%s, %s, %s)" -> "IN (%s...)": la misma consulta con listas de distinto largo
+LISTA_PARAMETROS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+class PresupuestoConsultasExcedido(Exception):
+    """Una vista hizo mas consultas que su presupuesto (solo en modo estricto)."""
+
+
+class RegistroConsultas:
+    """execute_wrapper que cuenta, cronometra y agrupa las consultas."""
+
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0
+        self.formas = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.cantidad += 1
+            forma = LISTA_PARAMETROS.sub('(%s...)', sql)
+            self.formas[forma] = self.formas.get(forma, 0) + 1
+
+    def repetidas(self, minimo):
+        """Formas de consulta que se ejecutaron `minimo` veces o mas (posibles N+1)."""
+        return sorted(
+            ((veces, forma) for forma, veces in self.formas.items() if veces >= minimo),
+            reverse=True
+        )
+
+
+class PresupuestoConsultasMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'PRESUPUESTO_CONSULTAS_ACTIVO', False):
+            return self.get_response(request)
+
+        registro = RegistroConsultas()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(registro))
+            response = self.get_response(request)
+
+        presupuesto = getattr(request, '_presupuesto_consultas', None)
+        if presupuesto is None:
+            presupuesto = getattr(settings, 'PRESUPUESTO_CONSULTAS', None)
+        repetidas = registro.repetidas(getattr(settings, 'PRESUPUESTO_REPETICIONES', 5))
+        excedido = presupuesto is not None and registro.cantidad > presupuesto
+
+        response['X-DB-Queries'] = str(registro.cantidad)
+        response['X-DB-Time-ms'] = f'{registro.tiempo * 1000:.1f}'
+        response['X-DB-Repetidas'] = str(sum(veces for veces, _ in repetidas))
+
+        datos = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': getattr(request, '_nombre_vista', None),
+            'status': response.status_code,
+            'consultas': registro.cantidad,
+            'tiempo_ms': round(registro.tiempo * 1000, 1),
+            'presupuesto': presupuesto,
+            'excedido': excedido,
+            'n_mas_1': [{'veces': veces, 'sql': forma[:300]} for veces, forma in repetidas],
+        }
+        nivel = logging.WARNING if excedido or repetidas else logging.DEBUG
+        logger.log(nivel, json.dumps(datos, ensure_ascii=False))
+
+        if excedido and getattr(settings, 'PRESUPUESTO_CONSULTAS_ESTRICTO', False):
+            raise PresupuestoConsultasExcedido(
+                f"{request.method} {request.path} hizo {registro.cantidad} consultas "
+                f"(presupuesto {presupuesto}). Repetidas: {datos['n_mas_1']}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # as_view() de Django/DRF guarda la clase en view_class
+        vista = getattr(view_func, 'view_class', view_func)
+        request._nombre_vista = getattr(vista, '__name__', str(vista))
+        request._presupuesto_consultas = getattr(vista, 'presupuesto_consultas', None)
+        return None
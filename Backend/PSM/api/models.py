@@ -1,12 +1,60 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser #para heredar el AuthUser
 from django.conf import settings  # << IMPORTANTE para relacionar el usuario
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 # Create your models here.
 
+class ContadoresMixin:
+    """
+    Los campos de CAMPOS_CONTADORES solo se cambian con UPDATE relativos
+    (F('campo') + 1). save() de una instancia ya guardada no los escribe, asi
+    no pisa con un valor viejo los incrementos hechos despues de leerla.
+    """
+    CAMPOS_CONTADORES = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            diferidos = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_CONTADORES
+                and campo.attname not in diferidos
+            ]
+        super().save(*args, **kwargs)
+
+
+class ValoresAnterioresMixin:
+    """
+    Recuerda los valores de CAMPOS_RASTREADOS tal como se leyeron de la base
+    (from_db) y despues de cada save(). Las señales de contadores comparan con
+    `_valores_anteriores` sin volver a consultar la fila. Un campo diferido
+    (.only()/.defer()) no se recuerda y se toma como sin cambios.
+    """
+    CAMPOS_RASTREADOS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._recordar_valores()
+        return instancia
+
+    def _recordar_valores(self):
+        cargados = self.__dict__
+        self._valores_anteriores = {
+            campo: cargados[campo] for campo in self.CAMPOS_RASTREADOS if campo in cargados
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._recordar_valores()
+
+
 # tabla para usuario
-class Usuario(AbstractUser): #una correccion con el nombramiento de 
+class Usuario(ContadoresMixin, AbstractUser): #una correccion con el nombramiento de 
     telefono = models.CharField(max_length=20, blank=True, null=True)
     edad = models.IntegerField(blank=True, null=True)
     fecha_nacimiento = models.DateField(blank=True, null=True)
@@ -25,6 +73,14 @@ class Usuario(AbstractUser): #una correccion con el nombramiento de
     email_verificado = models.BooleanField(default=False)
     # Campo para forzar cambio de contraseña en el primer inicio de sesión
     debe_cambiar_password = models.BooleanField(default=False)
+    # Sube con cada cambio en sus inscripciones (ETag de "mis inscripciones")
+    version_inscripciones = models.PositiveIntegerField(default=0, editable=False)
+
+    CAMPOS_CONTADORES = ('version_inscripciones',)
+
+    class Meta(AbstractUser.Meta):
+        # Filtro por fecha de registro del listado de usuarios
+        indexes = [models.Index(fields=['date_joined'])]
 
     def __str__(self):
         return self.username
@@ -57,10 +113,22 @@ class CodigoVerificacion(models.Model):
         return f"{self.email} - {self.codigo}"
 
 # tabla de categoria de eventos
-class CategEvento(models.Model):
+class CategEvento(ContadoresMixin, models.Model):
     nombre = models.CharField(max_length=100, blank=False, null=False)
     descripcion = models.TextField(blank=True)
     estado = models.BooleanField(default=True)
+    # Contadores mantenidos en cada escritura (services/contadores_service.py)
+    total_eventos = models.IntegerField(default=0, editable=False)
+    total_inscripciones = models.IntegerField(default=0, editable=False)
+
+    CAMPOS_CONTADORES = ('total_eventos', 'total_inscripciones')
+
+    class Meta:
+        # Listados de "populares" sin agregar eventos ni inscripciones
+        indexes = [
+            models.Index(fields=['estado', '-total_eventos']),
+            models.Index(fields=['-total_inscripciones']),
+        ]
     
     def __str__(self):
         return self.nombre
@@ -76,7 +144,7 @@ class Ubicacion(models.Model):
         return self.recinto
 
 # Eventos (programas deportivos)
-class Evento(models.Model):
+class Evento(ValoresAnterioresMixin, ContadoresMixin, models.Model):
     ESTADO_CHOICES = [
         ('activo', 'Activo'),
         ('inactivo', 'Inactivo'),
@@ -88,6 +156,12 @@ class Evento(models.Model):
         ('whatsapp', 'WhatsApp'),
     ]
     
+    IMAGEN_ESTADO_CHOICES = [
+        ('lista', 'Lista'),
+        ('pendiente', 'Pendiente'),
+        ('fallida', 'Fallida'),
+    ]
+    
     nombre = models.CharField(max_length=200, blank=False, null=False)
     descripcion = models.TextField(blank=True)  # Cambiado a blank=True para WhatsApp
     categoria = models.ForeignKey(CategEvento, on_delete=models.CASCADE, related_name="eventos")
@@ -106,16 +180,39 @@ class Evento(models.Model):
     requisitos = models.TextField(blank=True)
     # Campo para guardar el ID de la imagen en MongoDB
     imagen_id = models.CharField(max_length=100, blank=True, null=True)
+    # 'pendiente' mientras la cola de imagenes descarga/sube la imagen (ver ImagenPendiente)
+    imagen_estado = models.CharField(max_length=20, choices=IMAGEN_ESTADO_CHOICES, default='lista')
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='activo')
     # Campos para tracking de origen y completitud
     origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES, default='web')
     datos_completos = models.BooleanField(default=True)
+    # Contadores mantenidos en cada escritura (services/contadores_service.py)
+    total_inscripciones = models.IntegerField(default=0, editable=False)
+    total_resenas = models.IntegerField(default=0, editable=False)
+    suma_calificaciones = models.IntegerField(default=0, editable=False)
+    # suma_calificaciones / total_resenas guardado, para ordenar por calificacion con indice
+    promedio_calificacion = models.FloatField(default=0, editable=False)
+
+    CAMPOS_CONTADORES = ('total_inscripciones', 'total_resenas', 'suma_calificaciones', 'promedio_calificacion')
+    CAMPOS_RASTREADOS = ('categoria_id',)  # Mueve los contadores de la categoria
+    
+    class Meta:
+        # Indices compuestos para el catalogo paginado por cursor (orden por id) y sus filtros
+        indexes = [
+            models.Index(fields=['estado', 'id']),
+            models.Index(fields=['categoria', 'estado', 'id']),
+            models.Index(fields=['ubicacion', 'estado', 'id']),
+            models.Index(fields=['estado', 'fecha_inicio', 'fecha_fin']),
+            # "Populares" y "mejor calificados" por los contadores
+            models.Index(fields=['-total_inscripciones']),
+            models.Index(fields=['-promedio_calificacion', '-total_resenas', 'id']),
+        ]
     
     def __str__(self):
         return self.nombre
 
 # Inscripciones
-class Inscripcion(models.Model):
+class Inscripcion(ValoresAnterioresMixin, models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
         ('confirmada', 'Confirmada'),
@@ -128,17 +225,191 @@ class Inscripcion(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     comentarios = models.TextField(blank=True)
     asistio = models.BooleanField(default=False) # Campo para control de asistencia
+
+    CAMPOS_RASTREADOS = ('evento_id',)
+
+    class Meta:
+        # Filtros del listado paginado por cursor (orden por id)
+        indexes = [
+            models.Index(fields=['evento', 'estado', 'id']),
+            models.Index(fields=['usuario', 'id']),
+            models.Index(fields=['estado', 'id']),
+            models.Index(fields=['fecha_inscripcion']),
+        ]
     
     def __str__(self):
         return f"{self.usuario.username} - {self.evento.nombre}"
 
+# Registro de recordatorios de eventos enviados por email
+class RecordatorioEnviado(models.Model):
+    """
+    Un recordatorio por inscripcion y fecha de evento. La restriccion unica evita
+    que un usuario reciba el mismo recordatorio dos veces, aunque el comando
+    enviar_recordatorios se ejecute varias veces o en paralelo.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    ]
+    
+    inscripcion = models.ForeignKey(Inscripcion, on_delete=models.CASCADE, related_name="recordatorios")
+    fecha_evento = models.DateField()  # fecha_inicio del evento al momento del envio
+    dias_anticipacion = models.IntegerField()
+    lote = models.CharField(max_length=36, blank=True)  # Corrida del comando que lo tomo
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)  # Sumando todas las corridas
+    error = models.TextField(blank=True)
+    message_id = models.CharField(max_length=200, blank=True)
+    tomado_en = models.DateTimeField(auto_now_add=True)  # Ultima renovacion del lease de su corrida
+    enviado_en = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['inscripcion', 'fecha_evento'], name='recordatorio_unico_por_fecha')
+        ]
+        indexes = [models.Index(fields=['lote']), models.Index(fields=['estado', 'tomado_en'])]
+        verbose_name = "Recordatorio Enviado"
+        verbose_name_plural = "Recordatorios Enviados"
+    
+    def __str__(self):
+        return f"Recordatorio {self.inscripcion_id} - {self.fecha_evento} ({self.estado})"
+
+class CorreoSaliente(models.Model):
+    """
+    Bandeja de salida de emails transaccionales. Las vistas encolan aqui y
+    responden de inmediato; el worker de outbox_service hace la entrega con
+    reintentos. El `token` permite al cliente consultar el estado del envio.
+    """
+    TIPO_CHOICES = [
+        ('verificacion', 'Código de verificación'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    ]
+    
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    destinatario = models.EmailField()
+    params = models.JSONField(default=dict, blank=True)  # Se vacia al entregarse
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    message_id = models.CharField(max_length=200, blank=True)
+    disponible_en = models.DateTimeField(default=timezone.now)  # No se reintenta antes de esta hora
+    tomado_en = models.DateTimeField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    enviado_en = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'disponible_en'])]
+        verbose_name = "Correo Saliente"
+        verbose_name_plural = "Correos Salientes"
+    
+    def __str__(self):
+        return f"{self.tipo} a {self.destinatario} ({self.estado})"
+
+class ImagenPendiente(models.Model):
+    """
+    Cola de imagenes de eventos por descargar (imagen_url) o decodificar
+    (imagen_base64) y subir a Cloudinary. La procesa imagenes_service fuera de
+    la peticion; al terminar se actualiza Evento.imagen_id. Las que agotan los
+    reintentos quedan 'fallida' (lista de descarte para revisar o reintentar).
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+        ('reemplazada', 'Reemplazada'),  # Llego otra imagen para el mismo evento
+    ]
+    
+    evento = models.ForeignKey(Evento, on_delete=models.CASCADE, related_name="imagenes_pendientes")
+    url = models.URLField(max_length=1000, blank=True)
+    contenido_base64 = models.TextField(blank=True)  # Se vacia al terminar
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    disponible_en = models.DateTimeField(default=timezone.now)  # No se reintenta antes de esta hora
+    tomado_en = models.DateTimeField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    procesado_en = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'disponible_en'])]
+        verbose_name = "Imagen Pendiente"
+        verbose_name_plural = "Imágenes Pendientes"
+    
+    def __str__(self):
+        return f"Imagen de evento {self.evento_id} ({self.estado})"
+
+class ImagenIndice(models.Model):
+    """
+    Indice de imagenes por contenido (sha256 de los bytes recibidos). Si llega
+    otra vez la misma imagen se reutiliza la que ya esta guardada en vez de
+    volver a subirla (ver IndiceImagenes).
+    """
+    ALMACEN_CHOICES = [
+        ('cloudinary', 'Cloudinary'),
+        ('gridfs', 'GridFS'),
+    ]
+    
+    sha256 = models.CharField(max_length=64)
+    almacen = models.CharField(max_length=20, choices=ALMACEN_CHOICES, default='cloudinary')
+    referencia = models.CharField(max_length=1000)  # URL en Cloudinary o id del archivo en GridFS
+    tamano = models.PositiveIntegerField(default=0)  # Bytes originales
+    usos = models.PositiveIntegerField(default=1)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    ultimo_uso = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'almacen'], name='imagen_unica_por_almacen')
+        ]
+        verbose_name = "Índice de Imagen"
+        verbose_name_plural = "Índice de Imágenes"
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} -> {self.referencia} ({self.usos} usos)"
+
+class ConsultaCedulaCache(models.Model):
+    """
+    Cache persistente de las consultas al TSE (ver TSEService). Sobrevive a
+    reinicios y se comparte entre procesos; la cache en memoria va delante.
+    """
+    cedula = models.CharField(max_length=20, unique=True)  # Normalizada, solo digitos
+    resultado = models.JSONField()
+    valida = models.BooleanField(default=True)  # False = no encontrada (cache negativa)
+    consultado_en = models.DateTimeField(auto_now=True)
+    expira_en = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = "Consulta de Cédula (cache)"
+        verbose_name_plural = "Consultas de Cédula (cache)"
+    
+    def __str__(self):
+        return f"{self.cedula} ({'valida' if self.valida else 'no encontrada'})"
+
 # Reseñas
-class Resena(models.Model):
+class Resena(ValoresAnterioresMixin, models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="resenas") #correcciones si hay algun cambio con la tabla del authuser
     evento = models.ForeignKey(Evento, on_delete=models.CASCADE, related_name="resenas")
     calificacion = models.IntegerField(blank=False, null=False)  # 1-5 estrellas
     comentario = models.TextField(blank=True)
     fecha_resena = models.DateTimeField(auto_now_add=True)
+
+    CAMPOS_RASTREADOS = ('evento_id', 'calificacion')
+
+    class Meta:
+        # Filtros del listado paginado por cursor (orden por id)
+        indexes = [
+            models.Index(fields=['evento', 'id']),
+            models.Index(fields=['usuario', 'id']),
+            models.Index(fields=['fecha_resena']),
+        ]
     
     def __str__(self):
         return f"{self.usuario.username} - {self.evento.nombre} ({self.calificacion}⭐)"
@@ -151,6 +422,9 @@ class Contacto(models.Model):
     mensaje = models.TextField()
     fecha_envio = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['fecha_envio'])]
+
 # Configuracion Global del Perfil
 class ConfiguracionPerfil(models.Model):
     # Singleton: solo debe haber 1 registro. Lo controlaremos en la vista.
@@ -171,6 +445,26 @@ class ConfiguracionPerfil(models.Model):
     def __str__(self):
         return "Configuración Global de Perfil"
 
+# Snapshot precalculado de las estadisticas del dashboard admin
+class EstadisticasSnapshot(models.Model):
+    """
+    Ultimo resultado calculado de las estadisticas del dashboard.
+    Solo hay un registro (id=1). Se recalcula por schedule (comando
+    refrescar_estadisticas) o cuando una escritura lo marca como invalidado.
+    """
+    version = models.PositiveIntegerField(default=0)  # Aumenta en cada recalculo
+    datos = models.JSONField(default=dict)
+    generado_en = models.DateTimeField(blank=True, null=True)  # Fecha "al corte" de los datos
+    invalidado = models.BooleanField(default=True)  # Hubo escrituras desde el ultimo calculo
+    refrescando_desde = models.DateTimeField(blank=True, null=True)  # Recalculo en curso (reclamado por un proceso)
+    
+    class Meta:
+        verbose_name = "Snapshot de Estadísticas"
+        verbose_name_plural = "Snapshots de Estadísticas"
+    
+    def __str__(self):
+        return f"Estadisticas v{self.version} ({self.generado_en})"
+
 # Evento pendiente de confirmacion por WhatsApp (n8n)
 class EventoPendiente(models.Model):
     """
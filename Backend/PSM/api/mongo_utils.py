@@ -1,33 +1,31 @@
-import gridfs
-from pymongo import MongoClient
-from django.conf import settings
 import requests
-from io import BytesIO
+
+from .services.indice_imagenes import indice_imagenes
+from .services.mongo_cliente import mongo_cliente
 
 class UtilidadesMongo:
-    def __init__(self):
-        # Conexion usando la configuracion de settings.py
-        config = settings.MONGODB_CONFIG
-        self.client = MongoClient(
-            host=config['host'],
-            port=config['port']
-        )
-        self.db = self.client[config['database']]
-        # Especificar explícitamente el nombre de la colección para GridFS
-        self.fs = gridfs.GridFS(self.db, collection='imagenes')
+    """
+    Imagenes en GridFS (bucket 'imagenes'). La conexion es la compartida de
+    mongo_cliente: crear esta clase o importar el modulo no conecta a Mongo.
+    """
 
     def guardar_archivo(self, archivo):
         """
         Guardar un archivo (objeto File de Django) en GridFS
         Retorna el ID del archivo como string para su uso en la base de datos
+        Si el mismo contenido ya esta en GridFS retorna ese ID sin guardar otra copia
         """
         try:
             print(f"Intentando guardar archivo: {archivo.name}, tamaño: {archivo.size}")
             # Guardo el archivo con su nombre original y tipo de contenido
-            archivo_id = self.fs.put(
+            archivo_id = indice_imagenes.obtener_o_subir(
                 archivo.read(),  # Leer el contenido del archivo
-                filename=archivo.name, 
-                content_type=archivo.content_type
+                lambda contenido: mongo_cliente.subir(
+                    contenido,
+                    filename=archivo.name,
+                    content_type=archivo.content_type
+                ),
+                almacen='gridfs'
             )
             print(f"Archivo guardado exitosamente con ID: {archivo_id}")
             return str(archivo_id)
@@ -42,13 +40,30 @@ class UtilidadesMongo:
         Recupera un archivo de GridFS dado su ID como string
         Retorna el objeto GridOut o None si no existe
         """
-        from bson.objectid import ObjectId
         try:
-            return self.fs.get(ObjectId(archivo_id))
+            return mongo_cliente.abrir(archivo_id)
         except Exception as e:
             print(f"Error al obtener archivo de Mongo: {e}")
             return None
 
+    def tipo_contenido(self, archivo):
+        return mongo_cliente.tipo_contenido(archivo)
+
+    def leer_por_bloques(self, archivo, inicio=0, fin=None):
+        """
+        Genera el contenido de un GridOut (o de los bytes inicio..fin inclusive)
+        de a un chunk de GridFS, sin cargar el archivo entero en memoria
+        """
+        fin = archivo.length - 1 if fin is None else fin
+        archivo.seek(inicio)
+        restante = fin - inicio + 1
+        while restante > 0:
+            datos = archivo.read(min(archivo.chunk_size, restante))
+            if not datos:
+                break
+            restante -= len(datos)
+            yield datos
+
     def descargar_y_guardar_imagen(self, url):
         """
         Descarga una imagen desde una URL y la guarda en GridFS
@@ -60,13 +75,21 @@ class UtilidadesMongo:
                 # Verificamos que sea una imagen por el header
                 content_type = response.headers.get('Content-Type', '')
                 if 'image' in content_type:
-                    archivo_id = self.fs.put(
-                        BytesIO(response.content),
-                        filename=url.split('/')[-1] or 'imagen_descargada',
-                        content_type=content_type
+                    return indice_imagenes.obtener_o_subir(
+                        response.content,
+                        lambda contenido: mongo_cliente.subir(
+                            contenido,
+                            filename=url.split('/')[-1] or 'imagen_descargada',
+                            content_type=content_type
+                        ),
+                        almacen='gridfs'
                     )
-                    return str(archivo_id)
             return None
         except Exception as e:
             print(f"Error al descargar imagen: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+
+# Instancia global para usar en las vistas
+utilidades_mongo = UtilidadesMongo()
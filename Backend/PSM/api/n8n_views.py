@@ -3,13 +3,13 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
 from .models import Evento, CategEvento, Ubicacion, EventoPendiente, CodigoWhatsApp
-from .cloudinary_utils import cloudinary_utils
-import base64
+from .services.registro import imagenes_service
 import json
 import uuid
-from datetime import date, timedelta
+from datetime import date
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from .permissions import es_admin
 
 
 def verificar_codigo_whatsapp(codigo):
@@ -130,37 +130,10 @@ class N8NCrearEventoView(APIView):
                 fecha_fin = fecha_inicio
                 print(f"fecha_fin no proporcionada, usando fecha_inicio: {fecha_fin}")
             
-            # Procesar imagen si viene en base64
-            imagen_id = None
+            # La imagen (base64 o URL) se procesa en segundo plano despues de crear el evento
             imagen_base64 = data.get('imagen_base64')
             imagen_url = data.get('imagen_url')
             
-            if imagen_base64 or imagen_url:
-                if imagen_base64:
-                    # Decodificar base64 y guardar
-                    try:
-                        # Remover prefijo data:image/...;base64, si existe
-                        if ',' in imagen_base64:
-                            imagen_base64 = imagen_base64.split(',')[1]
-                        
-                        imagen_bytes = base64.b64decode(imagen_base64)
-                        
-                        # Guardar en Cloudinary
-                        from io import BytesIO
-                        archivo = BytesIO(imagen_bytes)
-                        archivo.name = f"evento_{data.get('nombre', 'sin_nombre')}.jpg"
-                        imagen_id = cloudinary_utils.guardar_archivo(archivo)
-                        print(f"Imagen guardada desde base64: {imagen_id}")
-                    except Exception as e:
-                        print(f"Error procesando imagen base64: {e}")
-                
-                elif imagen_url:
-                    try:
-                        imagen_id = cloudinary_utils.guardar_desde_url(imagen_url)
-                        print(f"Imagen descargada desde URL: {imagen_id}")
-                    except Exception as e:
-                        print(f"Error descargando imagen: {e}")
-            
             # Crear el evento
             # Determinar si los datos estan completos
             campos_faltantes = []
@@ -188,12 +161,19 @@ class N8NCrearEventoView(APIView):
                 edad_minima=data.get('edad_minima') if data.get('edad_minima') else None,
                 edad_maxima=data.get('edad_maxima') if data.get('edad_maxima') else None,
                 requisitos=data.get('requisitos') or '',
-                imagen_id=str(imagen_id) if imagen_id else None,
                 estado='activo',
                 origen='whatsapp',  # Marcado como origen WhatsApp
                 datos_completos=datos_completos  # True si tiene todos los campos importantes
             )
             
+            if imagen_base64 or imagen_url:
+                imagenes_service.encolar(
+                    evento,
+                    url=None if imagen_base64 else imagen_url,
+                    contenido_base64=imagen_base64
+                )
+                print(f"Imagen del evento {evento.id} encolada")
+            
             print(f"Evento creado exitosamente: {evento.id} - {evento.nombre} (completo: {datos_completos})")
             
             return Response({
@@ -469,18 +449,6 @@ class N8NConfirmarEventoView(APIView):
             fecha_inicio = data.get('fecha_inicio') or date.today().isoformat()
             fecha_fin = data.get('fecha_fin') or fecha_inicio
             
-            # Procesar imagen si existe
-            imagen_id = None
-            if pendiente.imagen_base64:
-                try:
-                    imagen_bytes = base64.b64decode(pendiente.imagen_base64)
-                    from io import BytesIO
-                    archivo = BytesIO(imagen_bytes)
-                    archivo.name = f"evento_{data.get('nombre', 'sin_nombre')}.jpg"
-                    imagen_id = cloudinary_utils.guardar_archivo(archivo)
-                except Exception as e:
-                    print(f"Error guardando imagen: {e}")
-            
             # Crear evento real
             evento = Evento.objects.create(
                 nombre=data.get('nombre', 'Evento sin nombre'),
@@ -497,10 +465,13 @@ class N8NConfirmarEventoView(APIView):
                 edad_minima=data.get('edad_minima') if data.get('edad_minima') else None,
                 edad_maxima=data.get('edad_maxima') if data.get('edad_maxima') else None,
                 requisitos=data.get('requisitos', ''),
-                imagen_id=str(imagen_id) if imagen_id else None,
                 estado='activo'
             )
             
+            # La imagen se decodifica y sube en segundo plano
+            if pendiente.imagen_base64:
+                imagenes_service.encolar(evento, contenido_base64=pendiente.imagen_base64)
+            
             # Marcar pendiente como confirmado
             pendiente.estado = 'confirmado'
             pendiente.save()
@@ -525,11 +496,11 @@ class N8NConfirmarEventoView(APIView):
 # Endpoints para Admin Panel (usan JWT, no API Key de n8n)
 
 class AdminEventosPendientesView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        if not request.user.groups.filter(name='admin').exists():
+        if not es_admin(request):
             return Response({'error': 'No tienes permisos'}, status=status.HTTP_403_FORBIDDEN)
         
         pendientes = EventoPendiente.objects.filter(estado='pendiente').order_by('-creado_en')
@@ -538,11 +509,11 @@ class AdminEventosPendientesView(APIView):
 
 
 class AdminAprobarEventoView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
     
     def post(self, request, token):
-        if not request.user.groups.filter(name='admin').exists():
+        if not es_admin(request):
             return Response({'error': 'No tienes permisos'}, status=status.HTTP_403_FORBIDDEN)
         
         try:
@@ -577,15 +548,6 @@ class AdminAprobarEventoView(APIView):
             fecha_inicio = data.get('fecha_inicio') or date.today().isoformat()
             fecha_fin = data.get('fecha_fin') or fecha_inicio
             
-            # Procesar imagen
-            imagen_id = None
-            imagen_url = data.get('imagen_url')
-            if imagen_url:
-                try:
-                    imagen_id = cloudinary_utils.guardar_desde_url(imagen_url)
-                except Exception as e:
-                    print(f"Error descargando imagen: {e}")
-            
             evento = Evento.objects.create(
                 nombre=data.get('nombre', 'Evento sin nombre'),
                 descripcion=data.get('descripcion') or '',
@@ -597,10 +559,13 @@ class AdminAprobarEventoView(APIView):
                 cupo_maximo=int(data.get('cupo_maximo') or 50),
                 cupos_disponibles=int(data.get('cupo_maximo') or 50),
                 requisitos=data.get('requisitos') or '',
-                imagen_id=str(imagen_id) if imagen_id else None,
                 estado='activo', origen='whatsapp', datos_completos=True
             )
             
+            # La imagen se descarga en segundo plano
+            if data.get('imagen_url'):
+                imagenes_service.encolar(evento, url=data['imagen_url'])
+            
             pendiente.estado = 'confirmado'
             pendiente.save()
             
@@ -615,11 +580,11 @@ class AdminAprobarEventoView(APIView):
 
 
 class AdminRechazarEventoView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
     
     def post(self, request, token):
-        if not request.user.groups.filter(name='admin').exists():
+        if not es_admin(request):
             return Response({'error': 'No tienes permisos'}, status=status.HTTP_403_FORBIDDEN)
         try:
             pendiente = EventoPendiente.objects.get(token=token, estado='pendiente')
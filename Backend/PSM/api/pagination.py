@@ -0,0 +1,133 @@
+"""
+Paginación por cursor (keyset) para los listados de la API.
+
+Se usa CursorPagination de DRF: cada página se pide con un WHERE sobre la
+columna de orden en lugar de un OFFSET, así que la página 1 y la página 500
+cuestan lo mismo aunque la tabla crezca.
+
+CursorPaginacion es la DEFAULT_PAGINATION_CLASS de REST_FRAMEWORK, así que
+todos los ListAPIView la aceptan (?page_size=50 y luego el link 'next').
+
+El CursorPagination de DRF solo guarda en el cursor la primera columna del
+orden; los empates los recorre con OFFSET (tope offset_cutoff=1000). Para
+ordenes con muchos empates (el catalogo por calificacion) CursorTuplaPaginacion
+guarda la tupla completa de columnas y filtra con una comparacion de tuplas.
+"""
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class CursorPaginacion(CursorPagination):
+    """
+    Paginación por cursor opcional.
+
+    Para no romper a los clientes que esperan la lista completa (el frontend
+    actual), solo se pagina cuando la petición trae `cursor` o `page_size`.
+    Sin esos parámetros la vista responde igual que antes.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    def paginacion_solicitada(self, request):
+        """True si el cliente pidió explícitamente una página."""
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.paginacion_solicitada(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CursorTuplaPaginacion(CursorPaginacion):
+    """
+    Paginación por cursor sobre la tupla completa de `ordering`.
+
+    El cursor lleva los valores de todas las columnas del orden de la última
+    (o primera) fila de la página, y la siguiente se pide con
+    (a, b, id) > (x, y, z) escrito como OR de prefijos iguales, sin OFFSET.
+    La última columna del orden debe ser única (id) y ninguna puede ser NULL.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.paginacion_solicitada(request):
+            return None
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor.reverse if self.cursor else False
+        posicion = self._leer_posicion(self.cursor.position) if self.cursor else None
+        if posicion is not None:
+            queryset = queryset.filter(self._despues_de(posicion, reverse))
+        orden = [self._invertir(campo) for campo in self.ordering] if reverse else list(self.ordering)
+
+        filas = list(queryset.order_by(*orden)[:self.page_size + 1])
+        hay_mas = len(filas) > self.page_size
+        self.page = filas[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        # Se llego con un cursor: del lado por el que se vino siempre hay filas
+        self.has_next = True if reverse else hay_mas
+        self.has_previous = hay_mas if reverse else posicion is not None
+        return self.page
+
+    @staticmethod
+    def _invertir(campo):
+        return campo[1:] if campo.startswith('-') else f'-{campo}'
+
+    def _leer_posicion(self, texto):
+        try:
+            posicion = json.loads(texto) if texto is not None else None
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if posicion is not None and (not isinstance(posicion, list) or len(posicion) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return posicion
+
+    def _despues_de(self, posicion, reverse):
+        """Filas que van despues de `posicion` en el orden (antes si `reverse`)."""
+        condicion = Q()
+        iguales = Q()
+        for campo, valor in zip(self.ordering, posicion):
+            nombre = campo.lstrip('-')
+            mayor = campo.startswith('-') == reverse
+            condicion |= iguales & Q(**{f'{nombre}__gt' if mayor else f'{nombre}__lt': valor})
+            iguales &= Q(**{nombre: valor})
+        return condicion
+
+    def _posicion(self, fila):
+        return json.dumps([getattr(fila, campo.lstrip('-')) for campo in self.ordering])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        posicion = self._posicion(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=posicion))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        posicion = self._posicion(self.page[0]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=posicion))
+
+
+class EventoCursorPaginacion(CursorTuplaPaginacion):
+    """
+    Catálogo de eventos: por id como el listado original, o el orden de
+    ?ordenar= (ver filters.ORDENES_EVENTO) que la vista asigna en `ordering`.
+    """
+    ordering = 'id'
+
+
+class MisInscripcionesCursorPaginacion(CursorPaginacion):
+    """Inscripciones del usuario: mismo orden que la lista completa (por id)."""
+    ordering = 'id'
@@ -1,5 +1,55 @@
 from rest_framework import permissions
 
+
+# ======== ROLES ========
+# Los roles (grupos) viajan en el access token como claim 'roles' (ver
+# CustomTokenObtainPairSerializer.get_token), asi los chequeos de admin no
+# consultan la BD. Se recalculan en cada refresh del token
+# (CustomTokenRefreshSerializer): quitar a alguien del grupo 'admin' se aplica
+# como tarde cuando vence su access token (ACCESS_TOKEN_LIFETIME). Si la peticion no trae el claim (tokens anteriores,
+# force_authenticate en pruebas) se consultan los grupos una sola vez y quedan
+# guardados en el usuario de la peticion.
+
+def roles_de_usuario(user):
+    """Nombres de los grupos del usuario (una consulta por instancia de usuario)."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_roles_cache'):
+        user._roles_cache = frozenset(user.groups.values_list('name', flat=True))
+    return user._roles_cache
+
+
+# Rol que se informa en el login cuando el usuario esta en varios grupos
+ROLES_PRIORIDAD = ('admin', 'cliente')
+
+
+def rol_principal(nombres):
+    """El rol de mayor prioridad (ROLES_PRIORIDAD, despues alfabetico) o None."""
+    if not nombres:
+        return None
+    return min(nombres, key=lambda nombre: (
+        ROLES_PRIORIDAD.index(nombre) if nombre in ROLES_PRIORIDAD else len(ROLES_PRIORIDAD), nombre
+    ))
+
+
+def roles(request):
+    """Roles del usuario de la peticion: del claim del JWT o, si no viene, de la BD."""
+    token = getattr(request, 'auth', None)
+    claim = token.get('roles') if token is not None and hasattr(token, 'get') else None
+    if isinstance(claim, (list, tuple)) and request.user and request.user.is_authenticated:
+        return frozenset(claim)
+    return roles_de_usuario(request.user)
+
+
+def es_admin(request, incluir_staff=False):
+    """True si el usuario esta en el grupo 'admin' (o es staff, con incluir_staff)."""
+    if not request.user or not request.user.is_authenticated:
+        return False
+    if incluir_staff and request.user.is_staff:
+        return True
+    return 'admin' in roles(request)
+
+
 class IsAdminUser(permissions.BasePermission):
     """
     Permiso personalizado que verifica si el usuario pertenece al grupo 'admin'.
@@ -17,7 +67,17 @@ class IsAdminUser(permissions.BasePermission):
             return True
         
         # Para otros metodos (POST, PUT, DELETE), verificar si es admin
-        return request.user.groups.filter(name='admin').exists()
+        return es_admin(request)
+
+
+class IsAdminOrStaff(permissions.BasePermission):
+    """
+    Solo administradores o staff, en cualquier metodo. Es el mismo chequeo que
+    hacen las vistas de escritura de Evento (es_admin con incluir_staff).
+    """
+
+    def has_permission(self, request, view):
+        return es_admin(request, incluir_staff=True)
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -35,7 +95,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
             
-        return request.user.groups.filter(name='admin').exists()
+        return es_admin(request)
 
 
 class IsAdminOrSelf(permissions.BasePermission):
@@ -48,11 +108,11 @@ class IsAdminOrSelf(permissions.BasePermission):
             return False
 
         # Si es admin o staff, permitir todo
-        if request.user.groups.filter(name='admin').exists() or request.user.is_staff:
+        if es_admin(request, incluir_staff=True):
             return True
 
-        # Si es el propio usuario, permitir
-        return obj == request.user
+        # Si es el propio usuario, permitir (por id: request.user puede ser un UsuarioToken)
+        return obj.pk == request.user.id
 
 class IsOwnerOrAdmin(permissions.BasePermission):
     """
@@ -72,13 +132,13 @@ class IsOwnerOrAdmin(permissions.BasePermission):
             return False
 
         # 3. Si es Admin, permitir TODO
-        if request.user.groups.filter(name='admin').exists() or request.user.is_staff:
+        if es_admin(request, incluir_staff=True):
             return True
 
         # 4. Si es el dueño del objeto, permitir.
         #    Verificamos si el objeto tiene atributo 'usuario' (comun en Resena, Inscripcion)
         if hasattr(obj, 'usuario'):
-            return obj.usuario == request.user
+            return obj.usuario_id == request.user.id
             
         #    Si el objeto es el Usuario mismo
-        return obj == request.user
\ No newline at end of file
+        return obj.pk == request.user.id
\ No newline at end of file
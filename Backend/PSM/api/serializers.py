@@ -3,12 +3,52 @@ from rest_framework import serializers
 from django.contrib.auth.hashers import make_password # from django.contrib.auth.models import User # importante para usar la tabla de Django, pero con el abstract ya no es necesario
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .services.registro import normalizador_imagenes
+from .permissions import rol_principal, roles_de_usuario
 
 Usuario = get_user_model()
 userGroup = Usuario.groups.through
 
-class UserSerializer(serializers.ModelSerializer):
+class CamposDinamicosMixin:
+    """
+    Sparse fieldsets: en un GET con ?campos=id,nombre solo se serializan esos
+    campos (el resto no se calcula ni se envia). Sin el parametro, todos.
+    """
+    PARAMETRO_CAMPOS = 'campos'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        pedidos = request.query_params.get(self.PARAMETRO_CAMPOS)
+        if not pedidos:
+            return
+        pedidos = {campo.strip() for campo in pedidos.split(',') if campo.strip()}
+        # Los write_only (password) no se pueden pedir
+        disponibles = {nombre for nombre, campo in self.fields.items() if not campo.write_only}
+        invalidos = pedidos - disponibles
+        if invalidos:
+            raise serializers.ValidationError({
+                self.PARAMETRO_CAMPOS: f"Campos inválidos: {', '.join(sorted(invalidos))}. "
+                                       f"Disponibles: {', '.join(sorted(disponibles))}"
+            })
+        for nombre in set(self.fields) - pedidos:
+            self.fields.pop(nombre)
+
+    @classmethod
+    def campos_pedidos(cls, request):
+        """Campos de ?campos= (None si se piden todos), para ajustar la consulta en la vista."""
+        pedidos = request.query_params.get(cls.PARAMETRO_CAMPOS) if request.method == 'GET' else None
+        if not pedidos:
+            return None
+        return {campo.strip() for campo in pedidos.split(',') if campo.strip()}
+
+
+class UserSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     telefono = serializers.CharField(max_length=20, required=False, allow_blank=True)
     
     class Meta:
@@ -97,7 +137,8 @@ class UserSerializer(serializers.ModelSerializer):
 class CategEventoSerializer(serializers.ModelSerializer):
     class Meta:
         model = CategEvento
-        fields = '__all__'
+        # Los contadores cambian con cada inscripcion: fuera del listado cacheado
+        exclude = ['total_eventos', 'total_inscripciones']
 
 class UbicacionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -105,22 +146,36 @@ class UbicacionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class EventoSerializer(serializers.ModelSerializer):
+    # URLs de la imagen en 320/640/1024px (WebP/AVIF segun el navegador) para srcset
+    imagen_variantes = serializers.SerializerMethodField()
+
     class Meta:
         model = Evento
         fields = '__all__'
+        # Los contadores (total_resenas, promedio_calificacion, ...) son editable=False: solo lectura
+        read_only_fields = ['imagen_estado']  # Lo maneja la cola de imagenes
 
-class InscripcionSerializer(serializers.ModelSerializer):
+    def get_imagen_variantes(self, obj):
+        return normalizador_imagenes.variantes(obj.imagen_id)
+
+class InscripcionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Inscripcion
         fields = '__all__'
         read_only_fields = ['id', 'fecha_inscripcion', 'usuario']
 
-class ResenaSerializer(serializers.ModelSerializer):
+class ResenaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Resena
         fields = '__all__'
 
-class ContactoSerializer(serializers.ModelSerializer):
+    def validate_calificacion(self, value):
+        # Fuera de rango descuadraria el promedio guardado en el evento
+        if not 1 <= value <= 5:
+            raise serializers.ValidationError("La calificación debe estar entre 1 y 5.")
+        return value
+
+class ContactoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Contacto
         fields = '__all__'
@@ -145,13 +200,30 @@ class UserGroupSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Este usuario ya tiene ese rol asignado.")
         return data
 
+def agregar_claims(token, user):
+    """
+    Claims que se leen en cada peticion sin consultar la BD. Se vuelven a
+    calcular en el login y en cada refresh (CustomTokenRefreshSerializer).
+    """
+    # Roles en el token: los permisos de admin no consultan la BD (ver permissions.es_admin)
+    token['roles'] = sorted(roles_de_usuario(user))
+    token['is_staff'] = user.is_staff
+    # Para armar request.user sin leer el Usuario (ver api/authentication.py)
+    token['username'] = user.username
+    token['debe_cambiar_password'] = user.debe_cambiar_password
+    return token
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return agregar_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         
-        groups = self.user.groups.values_list('name', flat=True)
-        
-        data['role'] = groups[0] if groups else None
+        # Grupos ya consultados en get_token; con varios, admin primero
+        data['role'] = rol_principal(roles_de_usuario(self.user))
         data['id'] = self.user.id
         data['username'] = self.user.username
         data['email'] = self.user.email
@@ -159,6 +231,40 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         
         return data
 
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    El refresh de SimpleJWT copia los claims del refresh token al nuevo access
+    (y al refresh rotado), asi roles o is_staff quedarian fijos desde el login.
+    Aca se vuelve a leer el Usuario: si ya no existe o esta inactivo se rechaza,
+    y si no los claims se recalculan con sus datos actuales.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = Usuario.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh.payload.get(jwt_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        agregar_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    pass  # token_blacklist no esta instalada
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
+
 class ConfiguracionPerfilSerializer(serializers.ModelSerializer):
     class Meta:
         model = ConfiguracionPerfil
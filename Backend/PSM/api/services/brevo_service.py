@@ -2,12 +2,19 @@
 Servicio de integración con Brevo para envío de emails transaccionales.
 Incluye funcionalidades para:
 - Envío de códigos de verificación de email
-- Envío de notificaciones de eventos
+- Envío de notificaciones de eventos (individual o por lote)
+
+Las plantillas HTML se renderizan una sola vez al crear el servicio. Los datos
+variables van como marcadores {{ params.nombre }}: los que son iguales para
+todos los destinatarios se rellenan localmente y los que cambian por persona
+los rellena Brevo con los params de cada "message version". Así un
+recordatorio masivo es una sola llamada al API por cada bloque de destinatarios.
 """
 import os
 import random
 import string
-from datetime import datetime, timedelta
+from datetime import datetime
+from html import escape
 
 # Importar SDK de Brevo (sib_api_v3_sdk) - IMPORTANTE: Instalar con pip install sib-api-v3-sdk
 try:
@@ -19,26 +26,146 @@ except ImportError:
     print("sib_api_v3_sdk no está instalado. Ejecute: pip install sib-api-v3-sdk")
 
 
+# Plantillas HTML. Los marcadores {{ params.x }} se rellenan con _rellenar() o,
+# en los envios por lote, los rellena Brevo con los params de cada destinatario.
+PLANTILLA_VERIFICACION = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body { font-family: 'Segoe UI', Tahoma, sans-serif; background: #f4f4f4; margin: 0; padding: 20px; }
+        .container { max-width: 500px; margin: 0 auto; background: white; border-radius: 12px; padding: 30px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
+        .header { text-align: center; margin-bottom: 25px; }
+        .header h1 { color: #2563eb; margin: 0; font-size: 24px; }
+        .code-box { background: linear-gradient(135deg, #2563eb, #7c3aed); color: white; font-size: 32px; letter-spacing: 8px; padding: 20px; text-align: center; border-radius: 8px; margin: 25px 0; font-weight: bold; }
+        .message { color: #64748b; line-height: 1.6; text-align: center; }
+        .footer { text-align: center; margin-top: 25px; font-size: 12px; color: #94a3b8; }
+        .warning { color: #f59e0b; font-weight: 500; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Puntarenas Se Mueve</h1>
+        </div>
+        <p class="message">Tu código de verificación es:</p>
+        <div class="code-box">{{ params.codigo }}</div>
+        <p class="message">
+            Ingresa este código en la aplicación para verificar tu correo electrónico.
+        </p>
+        <p class="message warning">
+            Este código expira en {{ params.minutos_expiracion }} minutos.
+        </p>
+        <div class="footer">
+            <p>Si no solicitaste este código, ignora este mensaje.</p>
+            <p>© {{ params.anio }} Puntarenas Se Mueve - Municipalidad de Puntarenas</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+PLANTILLA_RECORDATORIO = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body { font-family: 'Segoe UI', Tahoma, sans-serif; background: #f4f4f4; margin: 0; padding: 20px; }
+        .container { max-width: 550px; margin: 0 auto; background: white; border-radius: 12px; padding: 30px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
+        .header { text-align: center; margin-bottom: 25px; }
+        .header h1 { color: #2563eb; margin: 0; font-size: 24px; }
+        .event-card { background: linear-gradient(135deg, #f0f9ff, #e0f2fe); border-left: 4px solid #2563eb; padding: 20px; border-radius: 8px; margin: 20px 0; }
+        .event-name { font-size: 20px; font-weight: bold; color: #1e40af; margin-bottom: 10px; }
+        .event-detail { color: #475569; margin: 8px 0; display: flex; align-items: center; gap: 8px; }
+        .countdown { text-align: center; background: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0; }
+        .countdown-number { font-size: 36px; font-weight: bold; color: #d97706; }
+        .footer { text-align: center; margin-top: 25px; font-size: 12px; color: #94a3b8; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1> Puntarenas Se Mueve</h1>
+        </div>
+        
+        <p>Hola <strong>{{ params.nombre_usuario }}</strong>,</p>
+        <p>Te recordamos que tienes un evento próximo:</p>
+        
+        <div class="event-card">
+            <div class="event-name"> {{ params.evento_nombre }}</div>
+            <div class="event-detail"> Fecha: <strong>{{ params.evento_fecha }}</strong></div>
+            <div class="event-detail"> Hora: <strong>{{ params.evento_hora }}</strong></div>
+            <div class="event-detail"> Lugar: <strong>{{ params.evento_ubicacion }}</strong></div>
+        </div>
+        
+        <div class="countdown">
+            <div class="countdown-number">{{ params.dias_anticipacion }}</div>
+            <div>{{ params.texto_dias }} para el evento</div>
+        </div>
+        
+        <p style="text-align: center; color: #64748b;">
+            ¡No olvides asistir! Te esperamos.
+        </p>
+        
+        <div class="footer">
+            <p>Para modificar tus preferencias de notificación, visita tu perfil.</p>
+            <p>© {{ params.anio }} Puntarenas Se Mueve</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+def _rellenar(plantilla, **valores):
+    """Reemplaza los marcadores {{ params.x }} indicados (escapando el HTML)."""
+    for clave, valor in valores.items():
+        plantilla = plantilla.replace('{{ params.%s }}' % clave, escape(str(valor)))
+    return plantilla
+
+
 class BrevoService:
     """
     Servicio para enviar emails usando la API de Brevo (anteriormente SendinBlue).
     """
     
+    # Brevo admite hasta 2000 destinatarios por request; usamos 1 por version
+    MAX_VERSIONES_POR_ENVIO = 1000
+    
     def __init__(self):
         self.api_key = os.environ.get('BREVO_API_KEY', '')
         self.sender_email = os.environ.get('BREVO_SENDER_EMAIL', 'noreply@puntarenassemueve.com')
         self.sender_name = os.environ.get('BREVO_SENDER_NAME', 'Puntarenas Se Mueve')
         self.verification_expiry_minutes = 15  # Expiración del código: 15 minutos
         
+        # Plantillas pre-renderizadas una sola vez (solo quedan los datos de cada envio).
+        # El año se rellena al armar cada mensaje: el proceso puede seguir vivo al cambiar de año
+        self.plantilla_verificacion = _rellenar(
+            PLANTILLA_VERIFICACION, minutos_expiracion=self.verification_expiry_minutes
+        )
+        self.plantilla_recordatorio = PLANTILLA_RECORDATORIO
+        
         if BREVO_AVAILABLE and self.api_key:
             configuration = sib_api_v3_sdk.Configuration()
             configuration.api_key['api-key'] = self.api_key
+            # Permite apuntar a un Brevo falso local para pruebas (ej: http://127.0.0.1:8025/v3)
+            api_host = os.environ.get('BREVO_API_HOST')
+            if api_host:
+                configuration.host = api_host
+            # Conexiones simultaneas al API (el envio de recordatorios usa varios hilos)
+            configuration.connection_pool_maxsize = int(os.environ.get('BREVO_POOL_SIZE', '20'))
             self.api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
                 sib_api_v3_sdk.ApiClient(configuration)
             )
         else:
             self.api_instance = None
     
+    def esta_configurado(self):
+        """True si el SDK está instalado y hay API key."""
+        return BREVO_AVAILABLE and bool(self.api_key)
+    
     def generar_codigo_verificacion(self, longitud=6):
         """Genera un código de verificación numérico aleatorio."""
         return ''.join(random.choices(string.digits, k=longitud))
@@ -67,51 +194,12 @@ class BrevoService:
             }
         
         try:
-            # Crear contenido del email
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{ font-family: 'Segoe UI', Tahoma, sans-serif; background: #f4f4f4; margin: 0; padding: 20px; }}
-                    .container {{ max-width: 500px; margin: 0 auto; background: white; border-radius: 12px; padding: 30px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }}
-                    .header {{ text-align: center; margin-bottom: 25px; }}
-                    .header h1 {{ color: #2563eb; margin: 0; font-size: 24px; }}
-                    .code-box {{ background: linear-gradient(135deg, #2563eb, #7c3aed); color: white; font-size: 32px; letter-spacing: 8px; padding: 20px; text-align: center; border-radius: 8px; margin: 25px 0; font-weight: bold; }}
-                    .message {{ color: #64748b; line-height: 1.6; text-align: center; }}
-                    .footer {{ text-align: center; margin-top: 25px; font-size: 12px; color: #94a3b8; }}
-                    .warning {{ color: #f59e0b; font-weight: 500; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>Puntarenas Se Mueve</h1>
-                    </div>
-                    <p class="message">Tu código de verificación es:</p>
-                    <div class="code-box">{codigo}</div>
-                    <p class="message">
-                        Ingresa este código en la aplicación para verificar tu correo electrónico.
-                    </p>
-                    <p class="message warning">
-                        Este código expira en {self.verification_expiry_minutes} minutos.
-                    </p>
-                    <div class="footer">
-                        <p>Si no solicitaste este código, ignora este mensaje.</p>
-                        <p>© {datetime.now().year} Puntarenas Se Mueve - Municipalidad de Puntarenas</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
             # Configurar el email
             send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
                 to=[{"email": email}],
                 sender={"name": self.sender_name, "email": self.sender_email},
                 subject="Código de verificación - Puntarenas Se Mueve",
-                html_content=html_content
+                html_content=_rellenar(self.plantilla_verificacion, codigo=codigo, anio=datetime.now().year)
             )
             
             # Enviar email
@@ -136,6 +224,22 @@ class BrevoService:
                 'error': f'Error inesperado: {str(e)}'
             }
     
+    def _datos_recordatorio(self, evento_nombre, evento_fecha, evento_hora, evento_ubicacion, dias_anticipacion):
+        """Asunto y HTML del recordatorio con los datos del evento ya rellenados."""
+        texto_dias = 'día' if dias_anticipacion == 1 else 'días'
+        asunto = f"Recordatorio: {evento_nombre} en {dias_anticipacion} {texto_dias}"
+        html_content = _rellenar(
+            self.plantilla_recordatorio,
+            evento_nombre=evento_nombre,
+            evento_fecha=evento_fecha,
+            evento_hora=evento_hora,
+            evento_ubicacion=evento_ubicacion,
+            dias_anticipacion=dias_anticipacion,
+            texto_dias=texto_dias,
+            anio=datetime.now().year
+        )
+        return asunto, html_content
+    
     def enviar_recordatorio_evento(self, email, nombre_usuario, evento_nombre, evento_fecha, 
                                     evento_hora, evento_ubicacion, dias_anticipacion):
         """
@@ -157,63 +261,14 @@ class BrevoService:
             return {'success': False, 'error': 'Brevo no está configurado'}
         
         try:
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{ font-family: 'Segoe UI', Tahoma, sans-serif; background: #f4f4f4; margin: 0; padding: 20px; }}
-                    .container {{ max-width: 550px; margin: 0 auto; background: white; border-radius: 12px; padding: 30px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }}
-                    .header {{ text-align: center; margin-bottom: 25px; }}
-                    .header h1 {{ color: #2563eb; margin: 0; font-size: 24px; }}
-                    .event-card {{ background: linear-gradient(135deg, #f0f9ff, #e0f2fe); border-left: 4px solid #2563eb; padding: 20px; border-radius: 8px; margin: 20px 0; }}
-                    .event-name {{ font-size: 20px; font-weight: bold; color: #1e40af; margin-bottom: 10px; }}
-                    .event-detail {{ color: #475569; margin: 8px 0; display: flex; align-items: center; gap: 8px; }}
-                    .countdown {{ text-align: center; background: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0; }}
-                    .countdown-number {{ font-size: 36px; font-weight: bold; color: #d97706; }}
-                    .footer {{ text-align: center; margin-top: 25px; font-size: 12px; color: #94a3b8; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1> Puntarenas Se Mueve</h1>
-                    </div>
-                    
-                    <p>Hola <strong>{nombre_usuario}</strong>,</p>
-                    <p>Te recordamos que tienes un evento próximo:</p>
-                    
-                    <div class="event-card">
-                        <div class="event-name"> {evento_nombre}</div>
-                        <div class="event-detail"> Fecha: <strong>{evento_fecha}</strong></div>
-                        <div class="event-detail"> Hora: <strong>{evento_hora}</strong></div>
-                        <div class="event-detail"> Lugar: <strong>{evento_ubicacion}</strong></div>
-                    </div>
-                    
-                    <div class="countdown">
-                        <div class="countdown-number">{dias_anticipacion}</div>
-                        <div>{"día" if dias_anticipacion == 1 else "días"} para el evento</div>
-                    </div>
-                    
-                    <p style="text-align: center; color: #64748b;">
-                        ¡No olvides asistir! Te esperamos.
-                    </p>
-                    
-                    <div class="footer">
-                        <p>Para modificar tus preferencias de notificación, visita tu perfil.</p>
-                        <p>© {datetime.now().year} Puntarenas Se Mueve</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
+            asunto, html_content = self._datos_recordatorio(
+                evento_nombre, evento_fecha, evento_hora, evento_ubicacion, dias_anticipacion
+            )
             send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
                 to=[{"email": email}],
                 sender={"name": self.sender_name, "email": self.sender_email},
-                subject=f"Recordatorio: {evento_nombre} en {dias_anticipacion} {'día' if dias_anticipacion == 1 else 'días'}",
-                html_content=html_content
+                subject=asunto,
+                html_content=_rellenar(html_content, nombre_usuario=nombre_usuario)
             )
             
             response = self.api_instance.send_transac_email(send_smtp_email)
@@ -228,7 +283,63 @@ class BrevoService:
             return {'success': False, 'error': str(e)}
         except Exception as e:
             return {'success': False, 'error': str(e)}
+    
+    def enviar_recordatorio_evento_lote(self, destinatarios, evento_nombre, evento_fecha,
+                                         evento_hora, evento_ubicacion, dias_anticipacion):
+        """
+        Envía el mismo recordatorio a muchos usuarios con una llamada al API por
+        cada bloque de MAX_VERSIONES_POR_ENVIO destinatarios (message versions).
+        
+        Args:
+            destinatarios: lista de dicts {'email': ..., 'nombre_usuario': ...}
+            (el resto igual que enviar_recordatorio_evento)
+        
+        Returns:
+            lista con un dict por bloque: 'success', 'emails' y 'message_ids' o 'error'
+        """
+        if not BREVO_AVAILABLE or not self.api_key:
+            return [{
+                'success': False,
+                'emails': [d['email'] for d in destinatarios],
+                'error': 'Brevo no está configurado'
+            }]
+        
+        asunto, html_content = self._datos_recordatorio(
+            evento_nombre, evento_fecha, evento_hora, evento_ubicacion, dias_anticipacion
+        )
+        
+        resultados = []
+        for inicio in range(0, len(destinatarios), self.MAX_VERSIONES_POR_ENVIO):
+            bloque = destinatarios[inicio:inicio + self.MAX_VERSIONES_POR_ENVIO]
+            emails = [d['email'] for d in bloque]
+            try:
+                # Cada destinatario es una version con su propio nombre
+                versiones = [
+                    sib_api_v3_sdk.SendSmtpEmailMessageVersions(
+                        to=[{"email": d['email']}],
+                        params={'nombre_usuario': escape(str(d['nombre_usuario']), quote=False)}
+                    )
+                    for d in bloque
+                ]
+                send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
+                    sender={"name": self.sender_name, "email": self.sender_email},
+                    subject=asunto,
+                    html_content=html_content,
+                    message_versions=versiones
+                )
+                response = self.api_instance.send_transac_email(send_smtp_email)
+                resultados.append({
+                    'success': True,
+                    'emails': emails,
+                    'message_ids': response.message_ids or ([response.message_id] if response.message_id else [])
+                })
+            except ApiException as e:
+                resultados.append({'success': False, 'emails': emails, 'error': str(e)})
+            except Exception as e:
+                resultados.append({'success': False, 'emails': emails, 'error': str(e)})
+        
+        return resultados
 
 
 # Instancia singleton del servicio
-brevo_service = BrevoService()
\ No newline at end of file
+brevo_service = BrevoService()
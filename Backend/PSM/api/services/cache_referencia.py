@@ -0,0 +1,68 @@
+# api/services/cache_referencia.py
+"""
+Cache de lectura de los datos de referencia (categorias, ubicaciones y la
+configuracion del perfil): tablas chicas que el frontend pide en casi todas
+las paginas y que cambian muy poco.
+
+- Cada tabla tiene un numero de version en la cache de Django. Las señales de
+  signals.py lo suben en cada save/delete, asi las entradas anteriores dejan de
+  leerse (quedan huerfanas hasta que vence su TTL) sin tener que borrarlas.
+- Cada entrada guarda los datos ya serializados y su ETag (hash del contenido):
+  una peticion con If-None-Match vigente se responde con 304, y una sin el se
+  responde desde la cache; en ambos casos sin consultar la BD.
+- El ETag sale del contenido y no de la version, porque con la cache en memoria
+  local cada proceso lleva su propia version.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import quote_etag
+
+
+class CacheReferencia:
+    """Datos serializados por tabla, invalidados por version."""
+
+    PREFIJO = 'referencia'
+
+    @property
+    def ttl(self):
+        return settings.CACHE_REFERENCIA_TTL
+
+    def _clave_version(self, tabla):
+        return f'{self.PREFIJO}:{tabla}:version'
+
+    def version(self, tabla):
+        return cache.get_or_set(self._clave_version(tabla), 1, timeout=None)
+
+    def invalidar(self, tabla):
+        """Sube la version de la tabla (lo llaman las señales de escritura)."""
+        try:
+            cache.incr(self._clave_version(tabla))
+        except ValueError:
+            # No habia version en la cache: la proxima lectura arranca de cero
+            cache.set(self._clave_version(tabla), 1, timeout=None)
+
+    def etag(self, datos):
+        contenido = json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True)
+        return quote_etag(hashlib.md5(contenido.encode()).hexdigest())
+
+    def obtener(self, tabla, calcular, variante='todos'):
+        """
+        Devuelve (datos, etag) de la tabla. Si no estan en la cache para la
+        version actual se llama a `calcular()` (que debe devolver datos
+        serializables: listas y diccionarios) y se guardan.
+        """
+        clave = f'{self.PREFIJO}:{tabla}:v{self.version(tabla)}:{variante}'
+        entrada = cache.get(clave)
+        if entrada is None:
+            datos = calcular()
+            entrada = {'datos': datos, 'etag': self.etag(datos)}
+            cache.set(clave, entrada, timeout=self.ttl)
+        return entrada['datos'], entrada['etag']
+
+
+# Instancia singleton
+cache_referencia = CacheReferencia()
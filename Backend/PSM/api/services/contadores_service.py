@@ -0,0 +1,159 @@
+# api/services/contadores_service.py
+"""
+Contadores desnormalizados de eventos, inscripciones y reseñas.
+
+En lugar de agregar (Count/Sum) toda la tabla de inscripciones en cada
+consulta de "populares" o del dashboard, se guardan columnas contador:
+
+    CategEvento.total_eventos, CategEvento.total_inscripciones
+    Evento.total_inscripciones, Evento.total_resenas, Evento.suma_calificaciones,
+    Evento.promedio_calificacion
+
+Las señales de signals.py las ajustan en cada save/delete con un UPDATE
+relativo (F-expressions), igual que los cupos: dos escrituras simultaneas no se
+pisan y, si la escritura corre dentro de transaction.atomic(), el contador se
+revierte con ella. Los valores anteriores de cada fila salen de la instancia
+(ValoresAnterioresMixin), sin un SELECT extra antes de cada save.
+
+Lo que no pasa por las señales (bulk_create, .update(), SQL a mano) se corrige
+con `python manage.py reconciliar_contadores`, a demanda o por cron (recorre
+las tablas completas, por eso no corre al arrancar el contenedor).
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from ..models import CategEvento, Evento, Inscripcion, Resena
+
+
+def _subconsulta(modelo, campo, agregado, **filtro):
+    """Subquery escalar con el agregado de `modelo` agrupado por `campo` = OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            modelo.objects.filter(**{campo: OuterRef('pk')}, **filtro)
+            .order_by().values(campo).annotate(valor=agregado).values('valor')[:1],
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+def _promedio():
+    """
+    promedio_calificacion a partir de total_resenas y suma_calificaciones de la fila.
+    Va en un UPDATE aparte del de los contadores: MySQL evalua las asignaciones
+    de un SET de izquierda a derecha (las siguientes ya ven el valor nuevo) y
+    PostgreSQL/SQLite no, asi que mezclarlas daria un promedio distinto segun la base.
+    """
+    return Case(
+        When(
+            total_resenas__gt=0,
+            then=Cast(F('suma_calificaciones'), FloatField()) / F('total_resenas')
+        ),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+class ContadoresService:
+    """Ajusta y reconcilia los contadores de CategEvento y Evento."""
+
+    # ======== EVENTOS ========
+
+    def evento_creado(self, categoria_id):
+        CategEvento.objects.filter(pk=categoria_id).update(total_eventos=F('total_eventos') + 1)
+
+    def evento_eliminado(self, evento_id, categoria_id):
+        """
+        Descuenta el evento y sus inscripciones de la categoria (un UPDATE). Se llama
+        antes de borrar la fila; las inscripciones que caen en la cascada no se
+        descuentan una por una (ver signals.preparar_borrado_evento).
+        """
+        inscripciones = Evento.objects.filter(pk=evento_id).values('total_inscripciones')[:1]
+        CategEvento.objects.filter(pk=categoria_id).update(
+            total_eventos=F('total_eventos') - 1,
+            total_inscripciones=F('total_inscripciones') - Coalesce(Subquery(inscripciones), Value(0))
+        )
+
+    def evento_movido(self, evento_id, categoria_anterior, categoria_nueva):
+        """El evento cambio de categoria: se lleva su evento y sus inscripciones."""
+        inscripciones = Evento.objects.filter(pk=evento_id).values_list('total_inscripciones', flat=True).first() or 0
+        CategEvento.objects.filter(pk=categoria_anterior).update(
+            total_eventos=F('total_eventos') - 1,
+            total_inscripciones=F('total_inscripciones') - inscripciones
+        )
+        CategEvento.objects.filter(pk=categoria_nueva).update(
+            total_eventos=F('total_eventos') + 1,
+            total_inscripciones=F('total_inscripciones') + inscripciones
+        )
+
+    # ======== INSCRIPCIONES ========
+
+    def inscripciones(self, evento_id, delta):
+        """Suma `delta` inscripciones al evento y a su categoria."""
+        if not delta:
+            return
+        Evento.objects.filter(pk=evento_id).update(total_inscripciones=F('total_inscripciones') + delta)
+        CategEvento.objects.filter(eventos=evento_id).update(total_inscripciones=F('total_inscripciones') + delta)
+
+    # ======== RESEÑAS ========
+
+    def resenas(self, evento_id, delta, calificacion):
+        """
+        Suma `delta` reseñas (1, -1 o 0) y `calificacion` a la suma del evento,
+        y recalcula el promedio con los contadores ya sumados. Los dos UPDATE van
+        en la misma transaccion: el primero bloquea la fila hasta el commit, asi
+        que ninguna otra reseña se cuela entre ambos.
+        """
+        with transaction.atomic():
+            eventos = Evento.objects.filter(pk=evento_id)
+            eventos.update(
+                total_resenas=F('total_resenas') + delta,
+                suma_calificaciones=F('suma_calificaciones') + calificacion
+            )
+            eventos.update(promedio_calificacion=_promedio())
+
+    # ======== RECONCILIACION ========
+
+    def reconciliar(self, aplicar=True):
+        """
+        Recalcula los contadores desde las tablas y corrige las filas que no
+        coinciden. Devuelve cuantas filas de cada modelo estaban mal.
+        """
+        reales_evento = {
+            'total_inscripciones': _subconsulta(Inscripcion, 'evento', Count('id')),
+            'total_resenas': _subconsulta(Resena, 'evento', Count('id')),
+            'suma_calificaciones': _subconsulta(Resena, 'evento', Sum('calificacion')),
+        }
+        reales_categoria = {
+            'total_eventos': _subconsulta(Evento, 'categoria', Count('id')),
+            'total_inscripciones': _subconsulta(Inscripcion, 'evento__categoria', Count('id')),
+        }
+
+        resultado = {}
+        for modelo, reales in ((Evento, reales_evento), (CategEvento, reales_categoria)):
+            distintos = Q()
+            for campo in reales:
+                distintos |= ~Q(**{campo: F(f'real_{campo}')})
+            desfasados = modelo.objects.annotate(
+                **{f'real_{campo}': expresion for campo, expresion in reales.items()}
+            ).filter(distintos).values_list('pk', flat=True)
+
+            ids = set(desfasados)
+            if aplicar and ids:
+                modelo.objects.filter(pk__in=ids).update(**reales)
+            if modelo is Evento:
+                # El promedio se compara contra los contadores ya corregidos
+                sin_promedio = Evento.objects.annotate(real_promedio=_promedio()).exclude(
+                    promedio_calificacion=F('real_promedio')
+                ).values_list('pk', flat=True)
+                promedios = set(sin_promedio)
+                if aplicar and promedios:
+                    Evento.objects.filter(pk__in=promedios).update(promedio_calificacion=_promedio())
+                ids |= promedios
+            resultado[modelo.__name__] = len(ids)
+        return resultado
+
+
+# Instancia singleton
+contadores_service = ContadoresService()
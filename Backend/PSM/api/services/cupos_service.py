@@ -0,0 +1,188 @@
+# api/services/cupos_service.py
+"""
+Servicio de reserva de cupos para las inscripciones.
+
+Los cupos se cambian con un UPDATE condicional sobre la fila del evento
+(F-expressions), por ejemplo:
+
+    UPDATE api_evento SET cupos_disponibles = cupos_disponibles - 1
+    WHERE id = %s AND cupos_disponibles >= 1
+
+Si no quedan cupos el UPDATE no afecta ninguna fila y la reserva se rechaza
+en la base de datos, sin leer el evento en Python ni bloquear filas. Así dos
+confirmaciones simultaneas nunca venden el mismo cupo.
+
+Los cambios de una inscripcion (reservar, liberar, cambiar_estado) no bloquean
+filas. El cambio masivo (cambiar_lote) si las bloquea con select_for_update
+durante su transaccion: necesita leer los cupos de cada evento para decidir
+cuantas de sus confirmaciones entran.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Least
+
+from ..models import Evento, Inscripcion
+from .mis_inscripciones_service import mis_inscripciones_service
+
+
+class SinCuposDisponibles(Exception):
+    """El evento no tiene cupos para confirmar la inscripcion."""
+
+
+class CuposService:
+    """Reserva y libera cupos de eventos de forma atomica."""
+
+    # Maximo de inscripciones por llamada a cambiar_lote
+    LOTE_MAXIMO = 1000
+
+    def reservar(self, evento_id, cantidad=1):
+        """Resta `cantidad` cupos si alcanzan. Devuelve True si se reservaron."""
+        return Evento.objects.filter(
+            pk=evento_id,
+            cupos_disponibles__gte=cantidad
+        ).update(cupos_disponibles=F('cupos_disponibles') - cantidad) == 1
+
+    def liberar(self, evento_id, cantidad=1):
+        """Devuelve `cantidad` cupos sin pasar de cupo_maximo. Devuelve True si se liberaron."""
+        return Evento.objects.filter(
+            pk=evento_id,
+            cupos_disponibles__lte=F('cupo_maximo') - cantidad
+        ).update(cupos_disponibles=F('cupos_disponibles') + cantidad) == 1
+
+    def cambiar_estado(self, inscripcion, nuevo_estado):
+        """
+        Aplica el cambio de estado de una inscripcion y ajusta los cupos del evento.
+
+        La transicion tambien se hace con un UPDATE condicional sobre la
+        inscripcion, asi solo la peticion que realmente la cambia toca los cupos
+        (dos confirmaciones de la misma inscripcion no reservan dos cupos).
+
+        Lanza SinCuposDisponibles si se intenta confirmar y el evento esta lleno;
+        en ese caso la transaccion se revierte y la inscripcion queda como estaba.
+        """
+        with transaction.atomic():
+            if nuevo_estado == 'confirmada':
+                # Pendiente/Cancelada -> Confirmada: reservar un cupo
+                cambio = Inscripcion.objects.filter(pk=inscripcion.pk).exclude(
+                    estado='confirmada'
+                ).update(estado='confirmada')
+                if cambio and not self.reservar(inscripcion.evento_id):
+                    raise SinCuposDisponibles()
+            else:
+                # Confirmada -> Cancelada/Pendiente: liberar el cupo
+                cambio = Inscripcion.objects.filter(
+                    pk=inscripcion.pk,
+                    estado='confirmada'
+                ).update(estado=nuevo_estado)
+                if cambio:
+                    self.liberar(inscripcion.evento_id)
+            if cambio:
+                # El UPDATE directo no dispara las señales de Inscripcion
+                mis_inscripciones_service.invalidar([inscripcion.usuario_id])
+
+        inscripcion.estado = nuevo_estado
+        return bool(cambio)
+
+    def cambiar_lote(self, ids, estado=None, asistio=None):
+        """
+        Cambia el estado y/o la asistencia de muchas inscripciones a la vez.
+
+        - Las inscripciones se leen y bloquean con una sola consulta.
+        - Los cupos se ajustan con UN UPDATE para todos los eventos afectados
+          (CASE por evento). Si un evento no tiene cupos para todas las
+          confirmaciones, se confirman las primeras (en el orden de `ids`)
+          y el resto se rechaza.
+        - Las inscripciones se guardan con bulk_update.
+
+        Devuelve una lista de resultados por id, en el mismo orden recibido.
+        """
+        ids = list(dict.fromkeys(ids))  # Quitar repetidos manteniendo el orden
+        resultados = {}
+
+        with transaction.atomic():
+            inscripciones = {
+                i.pk: i for i in Inscripcion.objects.select_for_update().filter(
+                    pk__in=ids
+                ).only('id', 'usuario_id', 'evento_id', 'estado', 'asistio')
+            }
+
+            # Agrupar por evento las inscripciones que cambian de cupo
+            por_evento = {}
+            if estado is not None:
+                for pk in ids:
+                    inscripcion = inscripciones.get(pk)
+                    if not inscripcion:
+                        continue
+                    ocupa_antes = inscripcion.estado == 'confirmada'
+                    ocupa_despues = estado == 'confirmada'
+                    if ocupa_antes != ocupa_despues:
+                        por_evento.setdefault(inscripcion.evento_id, []).append(inscripcion)
+
+            # Calcular el ajuste de cupos de cada evento (con las filas bloqueadas)
+            ajustes = {}
+            rechazadas = set()
+            if por_evento:
+                eventos = Evento.objects.select_for_update().filter(
+                    pk__in=por_evento.keys()
+                ).values_list('id', 'cupos_disponibles', 'cupo_maximo')
+                for evento_id, disponibles, maximo in eventos:
+                    afectadas = por_evento[evento_id]
+                    if estado == 'confirmada':
+                        aceptadas = afectadas[:max(disponibles, 0)]
+                        rechazadas.update(i.pk for i in afectadas[len(aceptadas):])
+                        ajustes[evento_id] = -len(aceptadas)
+                    else:
+                        ajustes[evento_id] = max(0, min(len(afectadas), maximo - disponibles))
+
+                ajustes = {evento_id: delta for evento_id, delta in ajustes.items() if delta}
+                if ajustes:
+                    Evento.objects.filter(pk__in=ajustes.keys()).update(
+                        cupos_disponibles=Least(
+                            F('cupos_disponibles') + Case(
+                                *[When(pk=evento_id, then=Value(delta)) for evento_id, delta in ajustes.items()],
+                                default=Value(0),
+                                output_field=IntegerField()
+                            ),
+                            F('cupo_maximo')
+                        )
+                    )
+
+            # Aplicar los cambios a las inscripciones aceptadas
+            campos = []
+            if estado is not None:
+                campos.append('estado')
+            if asistio is not None:
+                campos.append('asistio')
+
+            actualizadas = []
+            for pk in ids:
+                inscripcion = inscripciones.get(pk)
+                if not inscripcion:
+                    resultados[pk] = {'id': pk, 'success': False, 'error': 'Inscripción no encontrada'}
+                    continue
+                if pk in rechazadas:
+                    resultados[pk] = {
+                        'id': pk, 'success': False, 'estado': inscripcion.estado,
+                        'error': 'No hay cupos disponibles. No se puede confirmar la inscripción.'
+                    }
+                    continue
+                if estado is not None:
+                    inscripcion.estado = estado
+                if asistio is not None:
+                    inscripcion.asistio = asistio
+                actualizadas.append(inscripcion)
+                resultados[pk] = {
+                    'id': pk, 'success': True,
+                    'estado': inscripcion.estado, 'asistio': inscripcion.asistio
+                }
+
+            if actualizadas and campos:
+                Inscripcion.objects.bulk_update(actualizadas, campos, batch_size=500)
+                # bulk_update no dispara las señales de Inscripcion
+                mis_inscripciones_service.invalidar(i.usuario_id for i in actualizadas)
+
+        return [resultados[pk] for pk in ids]
+
+
+# Instancia singleton
+cupos_service = CuposService()
@@ -0,0 +1,233 @@
+# api/services/estadisticas_service.py
+"""
+Motor de estadisticas del dashboard admin.
+
+Calcula todos los bloques del dashboard con pocas consultas agregadas
+(Count/Sum con filter=Q(...)) y guarda el resultado en EstadisticasSnapshot.
+La vista solo lee el snapshot. Hace falta recalcular cuando:
+- una escritura lo invalido y ya paso el intervalo minimo de refresco,
+- o supero la antiguedad maxima (cubre cambios hechos con .update()).
+
+Un snapshot vencido se sirve igual y el recalculo queda para un hilo de fondo
+(ESTADISTICAS_REFRESCO_EN_PROCESO) o para el comando
+`python manage.py refrescar_estadisticas --si-necesario` (cron). Solo se calcula
+dentro de la peticion si todavia no existe ningun snapshot. El recalculo se
+reclama con un UPDATE condicional sobre `refrescando_desde`: entre todos los
+procesos hay a lo sumo uno calculando.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from ..models import CategEvento, Contacto, EstadisticasSnapshot, Evento, Inscripcion
+from .trabajador_fondo import TrabajadorFondo
+
+
+class EstadisticasService:
+    """Calcula, guarda y sirve el snapshot de estadisticas."""
+
+    SNAPSHOT_ID = 1
+    # Un recalculo que no termino en este tiempo (proceso caido) se puede volver a reclamar
+    TIEMPO_RECLAMO = timedelta(minutes=5)
+
+    def __init__(self):
+        # Tiempo minimo entre recalculos aunque lleguen muchas escrituras
+        self.refresco_minimo = timedelta(seconds=getattr(settings, 'ESTADISTICAS_REFRESCO_MINIMO', 60))
+        # Antiguedad maxima del snapshot aunque nadie lo invalide
+        self.antiguedad_maxima = timedelta(seconds=getattr(settings, 'ESTADISTICAS_ANTIGUEDAD_MAXIMA', 900))
+        self.trabajador = TrabajadorFondo(
+            'estadisticas',
+            procesar=self._refrescar_en_fondo,
+            proxima_espera=lambda: self.antiguedad_maxima.total_seconds(),
+            setting_habilitado='ESTADISTICAS_REFRESCO_EN_PROCESO',
+            intervalo=self.antiguedad_maxima.total_seconds()
+        )
+
+    # ======== CALCULO ========
+
+    def _rangos_mensuales(self, ahora):
+        """Mismos 6 rangos mensuales que usaba EstadisticasView (del mas antiguo al actual)."""
+        rangos = []
+        for i in range(5, -1, -1):
+            fecha_inicio = (ahora - timedelta(days=30*i)).replace(day=1)
+            if i > 0:
+                fecha_fin = (ahora - timedelta(days=30*(i-1))).replace(day=1)
+            else:
+                fecha_fin = ahora
+            rangos.append((fecha_inicio, fecha_fin))
+        return rangos
+
+    def calcular(self):
+        """Calcula todos los bloques del dashboard. Devuelve un dict serializable a JSON."""
+        Usuario = get_user_model()
+        ahora = timezone.now()
+        hace_7_dias = ahora - timedelta(days=7)
+        hace_30_dias = ahora - timedelta(days=30)
+
+        # ======== USUARIOS (1 consulta) ========
+        usuarios = Usuario.objects.aggregate(
+            total=Count('id'),
+            nuevos_7d=Count('id', filter=Q(date_joined__gte=hace_7_dias)),
+            nuevos_30d=Count('id', filter=Q(date_joined__gte=hace_30_dias)),
+            activos=Count('id', filter=Q(last_login__gte=hace_30_dias)),
+            inactivos=Count('id', filter=Q(last_login__lt=hace_30_dias) | Q(last_login__isnull=True)),
+        )
+
+        # ======== EVENTOS (2 consultas) ========
+        eventos = Evento.objects.aggregate(
+            total=Count('id'),
+            activos=Count('id', filter=Q(estado='activo')),
+            inactivos=Count('id', filter=Q(estado='inactivo')),
+            finalizados=Count('id', filter=Q(estado='finalizado')),
+            llenos=Count('id', filter=Q(cupos_disponibles=0)),
+        )
+        # Contadores desnormalizados (services/contadores_service.py): sin JOIN a inscripciones
+        eventos['populares'] = list(Evento.objects.order_by('-total_inscripciones')[:5].values(
+            'id', 'nombre', 'total_inscripciones'
+        ))
+
+        # ======== INSCRIPCIONES (2 consultas) ========
+        rangos = self._rangos_mensuales(ahora)
+        conteos_mes = {
+            f'mes_{i}': Count('id', filter=Q(fecha_inscripcion__gte=inicio, fecha_inscripcion__lt=fin))
+            for i, (inicio, fin) in enumerate(rangos)
+        }
+        conteos = Inscripcion.objects.aggregate(
+            total=Count('id'),
+            pendientes=Count('id', filter=Q(estado='pendiente')),
+            confirmadas=Count('id', filter=Q(estado='confirmada')),
+            canceladas=Count('id', filter=Q(estado='cancelada')),
+            asistieron=Count('id', filter=Q(asistio=True)),
+            **conteos_mes
+        )
+        confirmadas = conteos['confirmadas']
+        inscripciones = {
+            'total': conteos['total'],
+            'pendientes': conteos['pendientes'],
+            'confirmadas': confirmadas,
+            'canceladas': conteos['canceladas'],
+            'tasa_asistencia': round((conteos['asistieron'] / confirmadas * 100), 1) if confirmadas > 0 else 0,
+            'por_mes': [
+                {'mes': inicio.strftime('%b'), 'cantidad': conteos[f'mes_{i}']}
+                for i, (inicio, fin) in enumerate(rangos)
+            ],
+            'categorias_demandadas': list(CategEvento.objects.order_by('-total_inscripciones')[:5].values(
+                'id', 'nombre', 'total_inscripciones'
+            )),
+        }
+
+        # ======== RESEÑAS (2 consultas) ========
+        # Desde los contadores de calificacion de cada evento, sin leer la tabla de reseñas
+        resenas = Evento.objects.aggregate(total=Sum('total_resenas'), suma=Sum('suma_calificaciones'))
+        resenas['total'] = resenas['total'] or 0
+        promedio = resenas['suma'] / resenas['total'] if resenas['total'] else 0
+        mejor_calificados = Evento.objects.filter(total_resenas__gt=0).order_by(
+            '-promedio_calificacion', '-total_resenas', 'id'
+        )[:5].values('id', 'nombre', 'total_resenas', promedio=F('promedio_calificacion'))
+
+        # ======== CONTACTOS (1 consulta) ========
+        contactos = Contacto.objects.aggregate(
+            total=Count('id'),
+            ultimos_7d=Count('id', filter=Q(fecha_envio__gte=hace_7_dias)),
+            ultimos_30d=Count('id', filter=Q(fecha_envio__gte=hace_30_dias)),
+        )
+
+        return {
+            'usuarios': usuarios,
+            'eventos': eventos,
+            'inscripciones': inscripciones,
+            'resenas': {
+                'total': resenas['total'],
+                'promedio_calificacion': round(promedio, 1) if promedio else 0,
+                'mejor_calificados': list(mejor_calificados)
+            },
+            'contactos': contactos
+        }
+
+    # ======== SNAPSHOT ========
+
+    def _tomar_refresco(self):
+        """Reclama el recalculo. False si otro proceso ya esta calculando."""
+        EstadisticasSnapshot.objects.get_or_create(pk=self.SNAPSHOT_ID)
+        ahora = timezone.now()
+        return EstadisticasSnapshot.objects.filter(pk=self.SNAPSHOT_ID).filter(
+            Q(refrescando_desde__isnull=True) | Q(refrescando_desde__lt=ahora - self.TIEMPO_RECLAMO)
+        ).update(refrescando_desde=ahora) == 1
+
+    def refrescar(self):
+        """
+        Recalcula las estadisticas y guarda una nueva version del snapshot.
+        Devuelve None sin calcular si otro proceso ya tiene el recalculo.
+        """
+        if not self._tomar_refresco():
+            return None
+        try:
+            # Se marca como vigente ANTES de calcular: si llega una escritura durante
+            # el calculo, vuelve a quedar invalidado y no se pierde.
+            EstadisticasSnapshot.objects.filter(pk=self.SNAPSHOT_ID).update(invalidado=False)
+
+            datos = self.calcular()
+            EstadisticasSnapshot.objects.filter(pk=self.SNAPSHOT_ID).update(
+                datos=datos,
+                generado_en=timezone.now(),
+                version=F('version') + 1
+            )
+        finally:
+            EstadisticasSnapshot.objects.filter(pk=self.SNAPSHOT_ID).update(refrescando_desde=None)
+        return EstadisticasSnapshot.objects.get(pk=self.SNAPSHOT_ID)
+
+    def necesita_refresco(self, snapshot, ahora=None):
+        """Decide si el snapshot guardado se puede servir tal cual."""
+        if snapshot is None or snapshot.generado_en is None:
+            return True
+        antiguedad = (ahora or timezone.now()) - snapshot.generado_en
+        if antiguedad >= self.antiguedad_maxima:
+            return True
+        return snapshot.invalidado and antiguedad >= self.refresco_minimo
+
+    def refrescar_si_necesario(self):
+        """
+        Recalcula solo si el snapshot esta invalidado o vencido.
+        Devuelve (snapshot, recalculado); si otro proceso esta recalculando
+        devuelve el snapshot actual sin esperar.
+        """
+        snapshot = EstadisticasSnapshot.objects.filter(pk=self.SNAPSHOT_ID).first()
+        if not self.necesita_refresco(snapshot):
+            return snapshot, False
+        nuevo = self.refrescar()
+        if nuevo is None:
+            return snapshot, False
+        return nuevo, True
+
+    def _refrescar_en_fondo(self):
+        self.refrescar_si_necesario()
+        return 0  # Un recalculo por despertar; el TrabajadorFondo no repite
+
+    def obtener(self):
+        """
+        Devuelve el snapshot para la vista sin recalcular dentro de la peticion:
+        si esta vencido se sirve igual y se despierta el hilo de fondo.
+        """
+        snapshot = EstadisticasSnapshot.objects.filter(pk=self.SNAPSHOT_ID).first()
+        if snapshot is None or snapshot.generado_en is None:
+            # Primer uso: no hay nada que servir todavia
+            snapshot = self.refrescar()
+            if snapshot is None:
+                # Otro proceso esta generando el primero; se responde sin guardar
+                snapshot = EstadisticasSnapshot(
+                    pk=self.SNAPSHOT_ID, datos=self.calcular(), generado_en=timezone.now()
+                )
+        elif self.necesita_refresco(snapshot):
+            self.trabajador.despertar()
+        return snapshot
+
+    def invalidar(self):
+        """Marca el snapshot como desactualizado (lo llaman las señales de escritura)."""
+        EstadisticasSnapshot.objects.filter(pk=self.SNAPSHOT_ID, invalidado=False).update(invalidado=True)
+
+
+# Instancia singleton
+estadisticas_service = EstadisticasService()
@@ -0,0 +1,266 @@
+# api/services/imagenes_service.py
+"""
+Cola de ingesta de imagenes de eventos.
+
+Las vistas ya no descargan ni suben imagenes dentro de la peticion: crean el
+evento con imagen_estado='pendiente' y encolan una ImagenPendiente con la URL
+o el base64 recibido. procesar_pendientes() toma un lote de la cola y, con un
+pool de hilos, descarga/decodifica, valida y sube cada imagen a Cloudinary;
+despues actualiza Evento.imagen_id e imagen_estado. Antes de subir, la imagen
+se normaliza con normalizador_imagenes (sin EXIF, lado maximo, WebP); si ya
+esta en el indice por contenido (sha256) no se vuelve a subir.
+
+- Errores transitorios (timeouts, 5xx, fallas de Cloudinary) se reintentan con
+  backoff exponencial hasta `max_intentos`.
+- Errores permanentes (no es una imagen, demasiado grande, 404) y los que
+  agotan reintentos quedan 'fallida': es la lista de descarte, que se revisa y
+  reintenta con `python manage.py procesar_imagenes --fallidas/--reintentar-fallidas`.
+- Cada imagen se toma con un UPDATE condicional, asi varios procesos pueden
+  vaciar la cola sin procesar dos veces la misma.
+"""
+import base64
+import binascii
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Evento, ImagenPendiente
+from .indice_imagenes import indice_imagenes
+from .normalizador_imagenes import normalizador_imagenes
+from .registro import cloudinary_utils
+from .trabajador_fondo import TrabajadorFondo
+
+
+class ImagenInvalida(Exception):
+    """Error permanente: reintentar no va a cambiar el resultado."""
+
+
+class ImagenesService:
+    """Encola y procesa las imagenes de eventos fuera de las peticiones."""
+
+    TIEMPO_RECLAMO = timedelta(minutes=10)
+    # Firmas (magic bytes) de los formatos de imagen aceptados
+    FIRMAS = [
+        (b'\xff\xd8\xff', 'jpeg'),
+        (b'\x89PNG\r\n\x1a\n', 'png'),
+        (b'GIF87a', 'gif'),
+        (b'GIF89a', 'gif'),
+    ]
+
+    def __init__(self, max_intentos=5, backoff_base=30, intervalo=60):
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base  # Segundos antes del primer reintento
+        self.trabajador = TrabajadorFondo(
+            'cola-imagenes',
+            procesar=lambda: sum(self.procesar_pendientes().values()),
+            proxima_espera=self._proxima_espera,
+            setting_habilitado='IMAGENES_WORKER_EN_PROCESO',
+            intervalo=intervalo
+        )
+
+    @property
+    def max_workers(self):
+        return getattr(settings, 'IMAGENES_WORKERS', 4)
+
+    @property
+    def tamano_maximo(self):
+        return getattr(settings, 'IMAGEN_TAMANO_MAXIMO', 10 * 1024 * 1024)
+
+    # ======== ENCOLAR ========
+
+    def encolar(self, evento, url=None, contenido_base64=None):
+        """
+        Encola la imagen de un evento (URL o base64) y lo marca como pendiente.
+        Una imagen anterior del mismo evento que aun no termino queda reemplazada.
+        """
+        if contenido_base64 and ',' in contenido_base64:
+            # Remover prefijo data:image/...;base64, si existe
+            contenido_base64 = contenido_base64.split(',', 1)[1]
+
+        with transaction.atomic():
+            ImagenPendiente.objects.filter(
+                evento=evento, estado__in=['pendiente', 'procesando', 'fallida']
+            ).update(estado='reemplazada', contenido_base64='')
+            pendiente = ImagenPendiente.objects.create(
+                evento=evento, url=url or '', contenido_base64=contenido_base64 or ''
+            )
+            Evento.objects.filter(pk=evento.pk).update(imagen_estado='pendiente')
+            transaction.on_commit(self.trabajador.despertar)
+
+        evento.imagen_estado = 'pendiente'
+        return pendiente
+
+    # ======== PROCESAMIENTO ========
+
+    def _tomar(self, limite):
+        """Toma hasta `limite` imagenes listas. Devuelve la lista tomada."""
+        ahora = timezone.now()
+        listas = Q(estado='pendiente', disponible_en__lte=ahora) | Q(
+            estado='procesando', tomado_en__lt=ahora - self.TIEMPO_RECLAMO
+        )
+        candidatas = ImagenPendiente.objects.filter(listas).order_by('disponible_en').values_list(
+            'id', 'estado', 'tomado_en'
+        )[:limite]
+
+        tomadas = []
+        for imagen_id, estado, tomado_en in candidatas:
+            # Solo gana quien cambia la fila; otro worker que la tomo antes la deja igual
+            if ImagenPendiente.objects.filter(
+                pk=imagen_id, estado=estado, tomado_en=tomado_en
+            ).update(estado='procesando', tomado_en=ahora):
+                tomadas.append(imagen_id)
+        return list(ImagenPendiente.objects.filter(pk__in=tomadas))
+
+    def _validar(self, contenido):
+        """Verifica tamaño y formato por los primeros bytes (no por la extension ni el header)."""
+        if not contenido:
+            raise ImagenInvalida('La imagen está vacía')
+        if len(contenido) > self.tamano_maximo:
+            raise ImagenInvalida(f'La imagen supera el máximo de {self.tamano_maximo} bytes')
+        if contenido[:4] == b'RIFF' and contenido[8:12] == b'WEBP':
+            return 'webp'
+        if contenido[4:8] == b'ftyp':
+            return 'heic/avif'
+        for firma, formato in self.FIRMAS:
+            if contenido.startswith(firma):
+                return formato
+        raise ImagenInvalida('El contenido no es una imagen JPEG, PNG, GIF, WebP, HEIC o AVIF')
+
+    def _descargar(self, url):
+        """Descarga la imagen cortando apenas supera el tamaño maximo."""
+        try:
+            with requests.get(url, stream=True, timeout=(5, 20)) as response:
+                if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    raise ImagenInvalida(f'El servidor de la imagen respondió {response.status_code}')
+                response.raise_for_status()
+
+                contenido = bytearray()
+                for bloque in response.iter_content(chunk_size=64 * 1024):
+                    contenido.extend(bloque)
+                    if len(contenido) > self.tamano_maximo:
+                        raise ImagenInvalida(f'La imagen supera el máximo de {self.tamano_maximo} bytes')
+                return bytes(contenido)
+        except (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                requests.exceptions.InvalidSchema) as e:
+            raise ImagenInvalida(f'URL inválida: {e}')
+
+    def _obtener_y_subir(self, imagen):
+        """Trabajo de red de una imagen (corre en el pool). Retorna la URL."""
+        if imagen.contenido_base64:
+            try:
+                contenido = base64.b64decode(imagen.contenido_base64, validate=False)
+            except (binascii.Error, ValueError) as e:
+                raise ImagenInvalida(f'Base64 inválido: {e}')
+        elif imagen.url:
+            contenido = self._descargar(imagen.url)
+        else:
+            raise ImagenInvalida('La imagen no tiene URL ni contenido')
+
+        self._validar(contenido)
+
+        def subir(contenido):
+            try:
+                # EXIF fuera, lado maximo acotado y WebP antes de subir
+                contenido, _ = normalizador_imagenes.normalizar(contenido)
+            except ValueError as e:
+                raise ImagenInvalida(str(e))
+            return cloudinary_utils.subir_bytes(contenido)
+
+        try:
+            # Si la misma imagen ya se subio (reenvio, payload repetido) se reutiliza
+            url = indice_imagenes.obtener_o_subir(contenido, subir)
+        finally:
+            # El indice usa la BD desde este hilo del pool
+            connection.close()
+        if not url:
+            raise RuntimeError('Cloudinary no devolvió la URL de la imagen')
+        return url
+
+    def _guardar_resultado(self, imagen, url=None, error=None):
+        """Guarda el resultado de una imagen. Retorna True si quedo lista."""
+        intentos = imagen.intentos + 1
+        if url:
+            with transaction.atomic():
+                # Si llego otra imagen para el evento mientras tanto, esta no se aplica
+                vigente = ImagenPendiente.objects.filter(pk=imagen.pk, estado='procesando').update(
+                    estado='completada', intentos=intentos, error='', contenido_base64='',
+                    procesado_en=timezone.now()
+                )
+                if vigente:
+                    Evento.objects.filter(pk=imagen.evento_id).update(imagen_id=url, imagen_estado='lista')
+            return True
+
+        mensaje = str(error)[:1000]
+        print(f"[IMAGENES] Error con la imagen del evento {imagen.evento_id} (intento {intentos}): {mensaje}")
+        if isinstance(error, ImagenInvalida) or intentos >= self.max_intentos:
+            with transaction.atomic():
+                vigente = ImagenPendiente.objects.filter(pk=imagen.pk, estado='procesando').update(
+                    estado='fallida', intentos=intentos, error=mensaje, procesado_en=timezone.now()
+                )
+                if vigente:
+                    Evento.objects.filter(pk=imagen.evento_id).update(imagen_estado='fallida')
+        else:
+            espera = self.backoff_base * (2 ** (intentos - 1))
+            ImagenPendiente.objects.filter(pk=imagen.pk, estado='procesando').update(
+                estado='pendiente', intentos=intentos, error=mensaje,
+                disponible_en=timezone.now() + timedelta(seconds=espera)
+            )
+        return False
+
+    def procesar_pendientes(self, limite=20):
+        """
+        Procesa un lote de la cola con `IMAGENES_WORKERS` descargas/subidas
+        simultaneas. Los resultados se guardan desde este hilo.
+        Devuelve un dict con las listas y las que tuvieron error.
+        """
+        resumen = {'listas': 0, 'errores': 0}
+        imagenes = self._tomar(limite)
+        if not imagenes:
+            return resumen
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futuros = {executor.submit(self._obtener_y_subir, imagen): imagen for imagen in imagenes}
+            for futuro in as_completed(futuros):
+                imagen = futuros[futuro]
+                try:
+                    lista = self._guardar_resultado(imagen, url=futuro.result())
+                except Exception as e:
+                    lista = self._guardar_resultado(imagen, error=e)
+                resumen['listas' if lista else 'errores'] += 1
+        return resumen
+
+    def _proxima_espera(self):
+        """Segundos hasta el proximo reintento programado."""
+        proximo = ImagenPendiente.objects.filter(estado='pendiente').order_by(
+            'disponible_en'
+        ).values_list('disponible_en', flat=True).first()
+        if proximo is None:
+            return self.trabajador.intervalo
+        return max(0, (proximo - timezone.now()).total_seconds())
+
+    # ======== LISTA DE DESCARTE ========
+
+    def fallidas(self):
+        """Imagenes que agotaron los reintentos o no son validas."""
+        return ImagenPendiente.objects.filter(estado='fallida').select_related('evento').order_by('-procesado_en')
+
+    def reintentar_fallidas(self, ids=None):
+        """Vuelve a encolar las imagenes fallidas (todas o las de `ids`). Devuelve cuantas."""
+        fallidas = ImagenPendiente.objects.filter(estado='fallida')
+        if ids:
+            fallidas = fallidas.filter(pk__in=ids)
+        with transaction.atomic():
+            eventos = list(fallidas.values_list('evento_id', flat=True))
+            cantidad = fallidas.update(estado='pendiente', intentos=0, disponible_en=timezone.now())
+            Evento.objects.filter(pk__in=eventos).update(imagen_estado='pendiente')
+            transaction.on_commit(self.trabajador.despertar)
+        return cantidad
+
+
+# Instancia singleton
+imagenes_service = ImagenesService()
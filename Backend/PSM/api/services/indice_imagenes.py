@@ -0,0 +1,96 @@
+# api/services/indice_imagenes.py
+"""
+Almacenamiento de imagenes direccionado por contenido.
+
+El mismo afiche suele llegar varias veces (reenvios de WhatsApp, reintentos de
+n8n). Antes de subir, obtener_o_subir() calcula el sha256 de los bytes
+recibidos y lo busca en ImagenIndice: si ya existe se devuelve la URL (o el id
+de GridFS) guardada y no se sube nada. Si no, se sube y se registra.
+
+El hash es de los bytes originales, antes de normalizar, asi una repeticion
+ni siquiera se decodifica. Si dos procesos suben la misma imagen a la vez, la
+restriccion unica deja una sola fila y ambos terminan usando esa referencia.
+
+Cada reutilizacion suma un uso. Al borrar una imagen (cloudinary_utils.eliminar_archivo,
+mongo_cliente.eliminar) se descuenta uno y el archivo solo se borra del almacen
+cuando ya nadie lo usa.
+"""
+import hashlib
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from ..models import ImagenIndice
+
+
+class IndiceImagenes:
+    """Busca y registra imagenes por el sha256 de su contenido."""
+
+    def calcular_hash(self, contenido):
+        return hashlib.sha256(contenido).hexdigest()
+
+    def buscar(self, sha256, almacen='cloudinary'):
+        """Referencia guardada para ese hash, o None. Cuenta el uso."""
+        fila = ImagenIndice.objects.filter(sha256=sha256, almacen=almacen).values_list('pk', 'referencia').first()
+        if not fila:
+            return None
+        pk, referencia = fila
+        ImagenIndice.objects.filter(pk=pk).update(usos=F('usos') + 1)
+        return referencia
+
+    def registrar(self, sha256, referencia, tamano=0, almacen='cloudinary'):
+        """Registra la referencia; si otro proceso gano la carrera devuelve la suya."""
+        try:
+            with transaction.atomic():
+                ImagenIndice.objects.create(sha256=sha256, almacen=almacen, referencia=referencia, tamano=tamano)
+            return referencia
+        except IntegrityError:
+            return ImagenIndice.objects.filter(sha256=sha256, almacen=almacen).values_list(
+                'referencia', flat=True
+            ).first() or referencia
+
+    def obtener_o_subir(self, contenido, subir, almacen='cloudinary'):
+        """
+        Devuelve la referencia de `contenido`, llamando a `subir(contenido)`
+        solo si la imagen no esta en el indice. Los errores de `subir` se propagan.
+        """
+        sha256 = self.calcular_hash(contenido)
+        existente = self.buscar(sha256, almacen)
+        if existente:
+            print(f"Imagen repetida ({sha256[:12]}), se reutiliza: {existente}")
+            return existente
+
+        referencia = subir(contenido)
+        if not referencia:
+            return referencia
+        return self.registrar(sha256, referencia, len(contenido), almacen)
+
+    def _liberar(self, filas):
+        """
+        Descuenta un uso de las filas dadas. True si ya nadie usa la imagen
+        (se quita del indice y se puede borrar del almacen) y False si otros
+        registros todavia apuntan a esa referencia.
+        """
+        with transaction.atomic():
+            usos = list(filas.select_for_update().values_list('usos', flat=True))
+            if any(u > 1 for u in usos):
+                filas.update(usos=F('usos') - 1)
+                return False
+            filas.delete()
+            return True
+
+    def liberar(self, referencia, almacen='gridfs'):
+        """Descuenta un uso de la imagen `referencia` (ver _liberar)."""
+        return self._liberar(ImagenIndice.objects.filter(almacen=almacen, referencia=referencia))
+
+    def liberar_public_id(self, public_id):
+        """Descuenta un uso de la imagen de Cloudinary `public_id` (ver _liberar)."""
+        # El public_id es el final exacto de la URL, con la extension opcional:
+        # "eventos/afiche" no debe tocar ".../eventos/afiche-2.jpg"
+        patron = f'/{re.escape(public_id)}(\\.[A-Za-z0-9]+)?$'
+        return self._liberar(ImagenIndice.objects.filter(almacen='cloudinary', referencia__regex=patron))
+
+
+# Instancia singleton
+indice_imagenes = IndiceImagenes()
@@ -0,0 +1,63 @@
+# api/services/mis_inscripciones_service.py
+"""
+Servicio de "mis inscripciones" (las inscripciones del usuario autenticado).
+
+- El listado se arma con .values(): una sola consulta con JOIN al evento que
+  trae solo las columnas que se devuelven, sin construir objetos Evento.
+- Cada Usuario tiene un contador `version_inscripciones` que sube con cada
+  escritura de sus inscripciones (señales de Inscripcion y Evento en
+  signals.py, y los UPDATE directos de cupos_service). El ETag de la respuesta
+  sale de ese contador, asi un If-None-Match vigente se responde con 304 leyendo
+  solo el contador, sin correr el listado.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.utils.http import quote_etag
+
+from ..models import Inscripcion
+
+
+class MisInscripcionesService:
+    """Listado proyectado y version (ETag) de las inscripciones de un usuario."""
+
+    # Mismas claves que devolvia MisInscripcionesView
+    CAMPOS = {
+        'evento_nombre': F('evento__nombre'),
+        'evento_fecha_inicio': F('evento__fecha_inicio'),
+        'evento_fecha_fin': F('evento__fecha_fin'),
+        'evento_hora_inicio': F('evento__hora_inicio'),
+        'evento_hora_fin': F('evento__hora_fin'),
+    }
+
+    def listar(self, usuario_id):
+        """QuerySet de diccionarios con las inscripciones del usuario."""
+        return Inscripcion.objects.filter(usuario_id=usuario_id).values(
+            'id', 'evento_id', 'fecha_inscripcion', 'estado', 'comentarios', **self.CAMPOS
+        )
+
+    def version(self, usuario_id):
+        """Version actual de las inscripciones del usuario (None si no existe)."""
+        return get_user_model().objects.filter(pk=usuario_id).values_list(
+            'version_inscripciones', flat=True
+        ).first()
+
+    def etag(self, usuario_id, version):
+        return quote_etag(f'inscripciones-{usuario_id}-{version}')
+
+    def invalidar(self, usuario_ids):
+        """Sube la version de los usuarios indicados (sus ETags dejan de valer)."""
+        usuario_ids = set(usuario_ids)
+        if usuario_ids:
+            get_user_model().objects.filter(pk__in=usuario_ids).update(
+                version_inscripciones=F('version_inscripciones') + 1
+            )
+
+    def invalidar_evento(self, evento_id):
+        """Un cambio en el evento cambia el listado de todos sus inscritos."""
+        get_user_model().objects.filter(inscripciones__evento_id=evento_id).update(
+            version_inscripciones=F('version_inscripciones') + 1
+        )
+
+
+# Instancia singleton
+mis_inscripciones_service = MisInscripcionesService()
@@ -0,0 +1,161 @@
+# api/services/mongo_cliente.py
+"""
+Cliente de MongoDB compartido por mongo_service y mongo_utils.
+
+- Un solo MongoClient (con su pool de conexiones) por proceso, creado la
+  primera vez que se usa: importar el modulo no conecta a Mongo.
+- Seguro ante fork: si el pid cambio (workers de gunicorn) se crea un cliente
+  nuevo en vez de reutilizar los sockets del proceso padre.
+- Pool y timeouts configurables en settings.MONGODB_CONFIG.
+- Todas las imagenes van a un unico bucket de GridFS (BUCKET_IMAGENES) y se
+  leen/escriben en streaming con GridFSBucket. Los archivos del bucket antiguo
+  'fs' se mueven con `python manage.py unificar_gridfs`; mientras tanto abrir()
+  los sigue encontrando.
+"""
+import importlib.util
+import os
+import threading
+
+from django.conf import settings
+
+# pymongo es opcional (solo para las imagenes antiguas en GridFS) y pesado de
+# importar: se verifica que este instalado sin importarlo, y se importa recien
+# al crear el cliente.
+PYMONGO_AVAILABLE = importlib.util.find_spec('pymongo') is not None
+
+BUCKET_IMAGENES = 'imagenes'
+BUCKET_ANTIGUO = 'fs'  # El que usaba MongoDBService (GridFS por defecto)
+
+
+class ClienteMongo:
+    """Fabrica perezosa del MongoClient y de los buckets de GridFS."""
+
+    def __init__(self):
+        self._cliente = None
+        self._pid = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return settings.MONGODB_CONFIG
+
+    @property
+    def cliente(self):
+        # Se compara el pid porque un MongoClient no sobrevive a un fork
+        if self._cliente is None or self._pid != os.getpid():
+            with self._lock:
+                if self._cliente is None or self._pid != os.getpid():
+                    self._cliente = self._crear_cliente()
+                    self._buckets = {}
+                    self._pid = os.getpid()
+        return self._cliente
+
+    def _crear_cliente(self):
+        if not PYMONGO_AVAILABLE:
+            raise RuntimeError('pymongo no está instalado')
+        from pymongo import MongoClient
+
+        config = self.config
+        return MongoClient(
+            host=config['host'],
+            port=config['port'],
+            maxPoolSize=config.get('max_pool_size', 20),
+            minPoolSize=config.get('min_pool_size', 0),
+            serverSelectionTimeoutMS=config.get('server_selection_timeout_ms', 5000),
+            connectTimeoutMS=config.get('connect_timeout_ms', 5000),
+            socketTimeoutMS=config.get('socket_timeout_ms', 20000),
+            connect=False  # La primera operacion abre la conexion
+        )
+
+    @property
+    def db(self):
+        return self.cliente[self.config['database']]
+
+    def bucket(self, nombre=BUCKET_IMAGENES):
+        """GridFSBucket `nombre` (se crea una vez por cliente)."""
+        from gridfs import GridFSBucket
+
+        cliente = self.cliente
+        if nombre not in self._buckets:
+            self._buckets[nombre] = GridFSBucket(cliente[self.config['database']], bucket_name=nombre)
+        return self._buckets[nombre]
+
+    # ======== GRIDFS ========
+
+    def _object_id(self, archivo_id):
+        """ObjectId del id recibido como string, o None si no es valido."""
+        from bson import ObjectId
+        from bson.errors import InvalidId
+
+        try:
+            return ObjectId(archivo_id)
+        except (InvalidId, TypeError):
+            return None
+
+    def subir(self, origen, filename, content_type=None, metadata=None):
+        """
+        Guarda un archivo en el bucket de imagenes leyendo `origen` (bytes o un
+        objeto tipo archivo) por chunks. Retorna el id como string.
+        """
+        metadata = dict(metadata or {})
+        if content_type:
+            metadata['contentType'] = content_type
+        archivo_id = self.bucket().upload_from_stream(filename, origen, metadata=metadata)
+        return str(archivo_id)
+
+    def abrir(self, archivo_id):
+        """
+        GridOut para leer el archivo en streaming, o None si no existe.
+        Busca en el bucket de imagenes y despues en el antiguo 'fs'.
+        """
+        from gridfs.errors import NoFile
+
+        oid = self._object_id(archivo_id)
+        if oid is None:
+            return None
+        for nombre in (BUCKET_IMAGENES, BUCKET_ANTIGUO):
+            try:
+                return self.bucket(nombre).open_download_stream(oid)
+            except NoFile:
+                continue
+        return None
+
+    def eliminar(self, archivo_id):
+        """
+        Elimina el archivo de cualquiera de los dos buckets. True si existia.
+        Si la imagen esta reutilizada por otros registros (ver ImagenIndice.usos)
+        solo se descuenta un uso y el archivo se conserva (devuelve True).
+        """
+        from gridfs.errors import NoFile
+
+        from .indice_imagenes import indice_imagenes
+
+        oid = self._object_id(archivo_id)
+        if oid is None:
+            return False
+        # Que una imagen repetida no reutilice un id que ya no existe
+        if not indice_imagenes.liberar(str(archivo_id), almacen='gridfs'):
+            return True
+        for nombre in (BUCKET_IMAGENES, BUCKET_ANTIGUO):
+            try:
+                self.bucket(nombre).delete(oid)
+                return True
+            except NoFile:
+                continue
+        return False
+
+    def tipo_contenido(self, archivo):
+        """Content-Type de un GridOut (campo antiguo contentType o metadata del bucket)."""
+        return (archivo.metadata or {}).get('contentType') or archivo.content_type or 'application/octet-stream'
+
+    def cerrar(self):
+        with self._lock:
+            if self._cliente is not None and self._pid == os.getpid():
+                self._cliente.close()
+            self._cliente = None
+            self._buckets = {}
+
+
+# Instancia singleton
+mongo_cliente = ClienteMongo()
@@ -1,48 +1,29 @@
 # api/services/mongo_service.py
+"""
+Imagenes en MongoDB/GridFS. Usa el cliente compartido de mongo_cliente: no
+conecta al importar y guarda en el mismo bucket que UtilidadesMongo.
+"""
+from .mongo_cliente import mongo_cliente
 
-from pymongo import MongoClient
-from django.conf import settings
-import gridfs
-from bson import ObjectId
 
 class MongoDBService:
-    _instance = None
-    _client = None
-    _db = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-    
-    def __init__(self):
-        if self._client is None:
-            config = settings.MONGODB_CONFIG
-            # Conexión simple sin autenticación
-            self._client = MongoClient(
-                host=config['host'],
-                port=config['port']
-            )
-            self._db = self._client[config['database']]
-            self.fs = gridfs.GridFS(self._db)
-    
+
     def save_image(self, file, metadata=None):
         """Guarda imagen en MongoDB usando GridFS"""
-        file_id = self.fs.put(
-            file.read(),
+        return mongo_cliente.subir(
+            file,  # Se lee por chunks, sin cargar el archivo entero
             filename=file.name,
             content_type=file.content_type,
-            metadata=metadata or {}
+            metadata=metadata
         )
-        return str(file_id)
-    
+
     def get_image(self, file_id):
-        """Recupera imagen de MongoDB"""
-        return self.fs.get(ObjectId(file_id))
-    
+        """Recupera imagen de MongoDB (GridOut para leer en streaming, o None)"""
+        return mongo_cliente.abrir(file_id)
+
     def delete_image(self, file_id):
         """Elimina imagen de MongoDB"""
-        self.fs.delete(ObjectId(file_id))
+        return mongo_cliente.eliminar(file_id)
 
 # ejecucion singleton
-mongo_service = MongoDBService()
\ No newline at end of file
+mongo_service = MongoDBService()
@@ -0,0 +1,107 @@
+# api/services/normalizador_imagenes.py
+"""
+Normalizacion de imagenes antes de guardarlas en Cloudinary.
+
+Las imagenes de eventos suelen llegar como fotos de celular a tamaño completo
+(4000px, varios MB, con EXIF y GPS). normalizar():
+1. decodifica la imagen con Pillow (protegido contra "decompression bombs"),
+2. aplica la orientacion del EXIF y descarta todos los metadatos,
+3. limita el lado mayor a IMAGEN_LADO_MAXIMO,
+4. re-codifica a IMAGEN_FORMATO (WebP por defecto; AVIF si Pillow lo soporta).
+
+Los GIF animados se dejan como estan. Si Pillow no esta instalado se sube el
+original y Cloudinary sigue sirviendo las variantes (ver variantes()).
+"""
+import importlib.util
+from io import BytesIO
+
+from django.conf import settings
+
+# Pillow es opcional; se importa recien al normalizar (variantes() no lo necesita)
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+
+class NormalizadorImagenes:
+    """Reduce, limpia y re-codifica imagenes para guardarlas."""
+
+    # Tamaños (ancho en px) de las variantes responsivas que se exponen en la API
+    VARIANTES = {
+        'pequena': 320,
+        'mediana': 640,
+        'grande': 1024,
+    }
+    # Formatos de salida soportados: nombre de Pillow -> (extension, opciones de guardado)
+    FORMATOS = {
+        'WEBP': ('webp', {'quality': 82, 'method': 4}),
+        'AVIF': ('avif', {'quality': 60}),
+    }
+
+    @property
+    def lado_maximo(self):
+        return getattr(settings, 'IMAGEN_LADO_MAXIMO', 2048)
+
+    @property
+    def formato(self):
+        formato = getattr(settings, 'IMAGEN_FORMATO', 'WEBP').upper()
+        if formato not in self.FORMATOS:
+            formato = 'WEBP'
+        # AVIF necesita Pillow compilado con libavif; si no, WebP
+        if formato == 'AVIF' and not (PIL_AVAILABLE and self._soporta_avif()):
+            formato = 'WEBP'
+        return formato
+
+    def _soporta_avif(self):
+        from PIL import features
+        return features.check('avif')
+
+    def normalizar(self, contenido):
+        """
+        Devuelve (bytes, extension) de la imagen normalizada.
+        Si Pillow no esta instalado o la imagen es animada devuelve el original
+        con extension None. Lanza ValueError si los bytes no son una imagen.
+        """
+        if not PIL_AVAILABLE:
+            return contenido, None
+        from PIL import Image, ImageOps
+
+        try:
+            imagen = Image.open(BytesIO(contenido))
+            if getattr(imagen, 'is_animated', False):
+                return contenido, None
+            # Carga los pixeles aqui para que los errores de decodificacion salgan ahora
+            imagen.load()
+        except (Image.DecompressionBombError, OSError, SyntaxError) as e:
+            raise ValueError(f'No se pudo decodificar la imagen: {e}')
+
+        # Rota segun el EXIF; la imagen resultante ya no trae los metadatos
+        imagen = ImageOps.exif_transpose(imagen)
+        if imagen.mode not in ('RGB', 'RGBA'):
+            con_alpha = imagen.mode in ('LA', 'PA') or (imagen.mode == 'P' and 'transparency' in imagen.info)
+            imagen = imagen.convert('RGBA' if con_alpha else 'RGB')
+        imagen.thumbnail((self.lado_maximo, self.lado_maximo), Image.LANCZOS)
+
+        formato = self.formato
+        extension, opciones = self.FORMATOS[formato]
+        salida = BytesIO()
+        # exif vacio explicito; se conserva solo el perfil de color
+        imagen.save(salida, format=formato, exif=b'', icc_profile=imagen.info.get('icc_profile'), **opciones)
+        return salida.getvalue(), extension
+
+    def variantes(self, url):
+        """
+        URLs de las variantes responsivas de una imagen de Cloudinary.
+        Cloudinary las genera y cachea en el CDN la primera vez que se piden
+        (c_limit: nunca agranda; f_auto/q_auto: WebP/AVIF segun el navegador).
+        Devuelve None si la URL no es de Cloudinary.
+        """
+        if not url or 'res.cloudinary.com' not in url or '/upload/' not in url:
+            return None
+        base, ruta = url.split('/upload/', 1)
+        return {
+            nombre: f"{base}/upload/c_limit,w_{ancho},f_auto,q_auto/{ruta}"
+            for nombre, ancho in self.VARIANTES.items()
+        }
+
+
+# Instancia singleton
+normalizador_imagenes = NormalizadorImagenes()
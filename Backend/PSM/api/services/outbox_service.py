@@ -0,0 +1,145 @@
+# api/services/outbox_service.py
+"""
+Bandeja de salida (outbox) de emails transaccionales.
+
+Las vistas no llaman a Brevo: guardan el email en CorreoSaliente con encolar()
+y responden de inmediato. La entrega la hace procesar_pendientes(), que corre:
+- en un hilo de fondo dentro de cada proceso web (se despierta al encolar), y/o
+- en el comando `python manage.py procesar_correos --continuo` (worker aparte).
+
+Cada correo se toma con un UPDATE condicional (estado pendiente -> enviando), asi
+varios procesos pueden procesar la misma tabla sin enviar dos veces el mismo email.
+Si Brevo falla se reintenta con backoff exponencial hasta `max_intentos`; despues
+queda 'fallido'. Un correo que quedo 'enviando' porque el proceso se cayo se
+vuelve a tomar pasado TIEMPO_RECLAMO.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import CorreoSaliente
+from .registro import brevo_service
+from .trabajador_fondo import TrabajadorFondo
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxService:
+    """Encola, entrega y reporta el estado de los emails salientes."""
+
+    TIEMPO_RECLAMO = timedelta(minutes=5)
+
+    def __init__(self, max_intentos=5, backoff_base=30, intervalo=30):
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base  # Segundos antes del primer reintento
+        # Hilo de fondo de cada proceso web; revisa cada `intervalo` aunque nadie lo despierte
+        self.trabajador = TrabajadorFondo(
+            'outbox-correos',
+            procesar=lambda: sum(self.procesar_pendientes().values()),
+            proxima_espera=self._proxima_espera,
+            setting_habilitado='OUTBOX_WORKER_EN_PROCESO',
+            intervalo=intervalo
+        )
+
+        # Como se entrega cada tipo de correo: (destinatario, params) -> resultado de brevo_service
+        self.entregas = {
+            'verificacion': lambda destinatario, params: brevo_service.enviar_codigo_verificacion(
+                destinatario, params['codigo']
+            ),
+        }
+
+    # ======== ENCOLAR ========
+
+    def encolar(self, tipo, destinatario, params=None):
+        """Guarda el correo como pendiente y despierta al worker al confirmar la transaccion."""
+        if tipo not in self.entregas:
+            raise ValueError(f'Tipo de correo desconocido: {tipo}')
+        correo = CorreoSaliente.objects.create(tipo=tipo, destinatario=destinatario, params=params or {})
+        transaction.on_commit(self.trabajador.despertar)
+        return correo
+
+    def estado(self, token):
+        """Estado publico de un envio (sin los params). None si el token no existe."""
+        return CorreoSaliente.objects.filter(token=token).values(
+            'token', 'tipo', 'estado', 'intentos', 'error', 'creado_en', 'enviado_en'
+        ).first()
+
+    # ======== ENTREGA ========
+
+    def _tomar(self, limite):
+        """Toma hasta `limite` correos listos para enviar. Devuelve la lista tomada."""
+        ahora = timezone.now()
+        listos = Q(estado='pendiente', disponible_en__lte=ahora) | Q(
+            estado='enviando', tomado_en__lt=ahora - self.TIEMPO_RECLAMO
+        )
+        candidatos = CorreoSaliente.objects.filter(listos).order_by('disponible_en').values_list(
+            'id', 'estado', 'tomado_en'
+        )[:limite]
+
+        tomados = []
+        for correo_id, estado, tomado_en in candidatos:
+            # Solo gana quien cambia la fila; otro worker que la tomo antes la deja igual
+            tomado = CorreoSaliente.objects.filter(
+                pk=correo_id, estado=estado, tomado_en=tomado_en
+            ).update(estado='enviando', tomado_en=ahora)
+            if tomado:
+                tomados.append(correo_id)
+        return list(CorreoSaliente.objects.filter(pk__in=tomados))
+
+    def _entregar(self, correo):
+        """Envia un correo y guarda el resultado."""
+        intentos = correo.intentos + 1
+        try:
+            resultado = self.entregas[correo.tipo](correo.destinatario, correo.params)
+        except Exception as e:
+            logger.exception('[OUTBOX] Error enviando %s a %s (intento %s)', correo.tipo, correo.destinatario, intentos)
+            resultado = {'success': False, 'error': str(e)}
+        else:
+            if not resultado.get('success'):
+                logger.warning('[OUTBOX] Error enviando %s a %s (intento %s): %s',
+                               correo.tipo, correo.destinatario, intentos, resultado.get('error', ''))
+
+        if resultado.get('success'):
+            CorreoSaliente.objects.filter(pk=correo.pk).update(
+                estado='enviado', intentos=intentos, error='', params={},
+                message_id=str(resultado.get('message_id') or '')[:200],
+                enviado_en=timezone.now()
+            )
+            return True
+
+        error = str(resultado.get('error', ''))[:1000]
+        if intentos >= self.max_intentos:
+            CorreoSaliente.objects.filter(pk=correo.pk).update(
+                estado='fallido', intentos=intentos, error=error
+            )
+        else:
+            espera = self.backoff_base * (2 ** (intentos - 1))
+            CorreoSaliente.objects.filter(pk=correo.pk).update(
+                estado='pendiente', intentos=intentos, error=error,
+                disponible_en=timezone.now() + timedelta(seconds=espera)
+            )
+        return False
+
+    def procesar_pendientes(self, limite=50):
+        """Entrega los correos listos. Devuelve un dict con enviados y con error."""
+        resumen = {'enviados': 0, 'errores': 0}
+        for correo in self._tomar(limite):
+            clave = 'enviados' if self._entregar(correo) else 'errores'
+            resumen[clave] += 1
+        return resumen
+
+    def _proxima_espera(self):
+        """Segundos hasta el proximo reintento programado."""
+        proximo = CorreoSaliente.objects.filter(estado='pendiente').order_by(
+            'disponible_en'
+        ).values_list('disponible_en', flat=True).first()
+        if proximo is None:
+            return self.trabajador.intervalo
+        return max(0, (proximo - timezone.now()).total_seconds())
+
+
+# Instancia singleton
+outbox_service = OutboxService()
@@ -0,0 +1,310 @@
+# api/services/recordatorios_service.py
+"""
+Pipeline de recordatorios de eventos por email.
+
+1. buscar_pendientes(): UNA consulta que une Inscripcion -> Evento -> Usuario y
+   devuelve las inscripciones cuyo evento empieza dentro de
+   `dias_anticipacion_notificacion` dias del usuario y que aun no tienen
+   recordatorio para esa fecha.
+2. tomar_lote(): registra esos recordatorios en RecordatorioEnviado con un id de
+   corrida. La restriccion unica (inscripcion, fecha_evento) hace que dos
+   corridas simultaneas nunca tomen el mismo recordatorio.
+   Mientras envia, la corrida renueva `tomado_en` de sus recordatorios cada
+   pocos minutos (lease). Otra corrida solo reclama los 'pendiente' cuyo lease
+   vencio, o sea los de una corrida que se cayo, sin importar cuanto dure la
+   que sigue viva. Los 'fallido' se vuelven a tomar en corridas siguientes
+   hasta `max_intentos_totales`, si el evento todavia no empezo.
+3. enviar_lote(): agrupa los recordatorios por evento y anticipacion (mismo
+   contenido) y envia cada grupo como un lote de Brevo (message versions),
+   con un pool de hilos acotado, reintentos con backoff exponencial, y guarda
+   el resultado de cada envio. Cada recordatorio guarda su propio message id.
+   Si Brevo rechaza el bloque completo (basta una direccion invalida) se
+   reenvia de a un destinatario, asi solo falla el que tiene el problema.
+"""
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from ..models import Inscripcion, RecordatorioEnviado
+from .registro import brevo_service
+
+
+class RecordatoriosService:
+    """Busca, toma y envia los recordatorios de eventos."""
+
+    # Rango permitido para Usuario.dias_anticipacion_notificacion
+    DIAS_ANTICIPACION = range(1, 8)
+    # Un 'pendiente' cuyo lease no se renovo en este tiempo es de una corrida caida.
+    # La corrida viva lo renueva cada LEASE / 3
+    LEASE = timedelta(minutes=5)
+
+    def __init__(self, max_workers=10, max_intentos=3, backoff_base=1.0, max_intentos_totales=9):
+        self.max_workers = max_workers
+        self.max_intentos = max_intentos  # Por corrida
+        self.backoff_base = backoff_base  # Segundos de espera antes del primer reintento
+        # Sumando todas las corridas: despues de esto un 'fallido' ya no se reintenta
+        self.max_intentos_totales = max_intentos_totales
+
+    def buscar_pendientes(self, hoy=None):
+        """Inscripciones con recordatorio para hoy que todavia no se registro (1 consulta)."""
+        hoy = hoy or timezone.localdate()
+
+        # Evento que empieza exactamente en `dias` dias para usuarios con esa anticipacion
+        vencen_hoy = Q()
+        for dias in self.DIAS_ANTICIPACION:
+            vencen_hoy |= Q(
+                usuario__dias_anticipacion_notificacion=dias,
+                evento__fecha_inicio=hoy + timedelta(days=dias)
+            )
+
+        ya_registrado = RecordatorioEnviado.objects.filter(
+            inscripcion=OuterRef('pk'),
+            fecha_evento=OuterRef('evento__fecha_inicio')
+        )
+
+        return Inscripcion.objects.filter(
+            vencen_hoy,
+            usuario__recibir_notificaciones=True,
+            evento__estado='activo'
+        ).exclude(
+            estado='cancelada'
+        ).exclude(
+            usuario__email=''
+        ).filter(
+            ~Exists(ya_registrado)
+        ).values_list('id', 'evento__fecha_inicio', 'usuario__dias_anticipacion_notificacion')
+
+    def tomar_lote(self, hoy=None):
+        """
+        Registra los recordatorios pendientes bajo un id de corrida y los devuelve
+        con usuario/evento/ubicacion cargados. Tambien reclama los 'pendiente' de
+        una corrida que se cayo (lease vencido) y los 'fallido' que aun tienen
+        intentos, si su evento no empezo y la inscripcion sigue vigente.
+        """
+        hoy = hoy or timezone.localdate()
+        lote = str(uuid.uuid4())
+        pendientes = list(self.buscar_pendientes(hoy))
+
+        RecordatorioEnviado.objects.bulk_create([
+            RecordatorioEnviado(
+                inscripcion_id=inscripcion_id,
+                fecha_evento=fecha_evento,
+                dias_anticipacion=dias,
+                lote=lote
+            )
+            for inscripcion_id, fecha_evento, dias in pendientes
+        ], ignore_conflicts=True, batch_size=500)
+
+        ahora = timezone.now()
+        RecordatorioEnviado.objects.filter(
+            estado='pendiente',
+            tomado_en__lt=ahora - self.LEASE
+        ).update(lote=lote, tomado_en=ahora)
+
+        RecordatorioEnviado.objects.filter(
+            estado='fallido',
+            intentos__lt=self.max_intentos_totales,
+            fecha_evento__gt=hoy,
+            # El evento no se movio de fecha y la inscripcion sigue queriendo el aviso
+            inscripcion__evento__fecha_inicio=F('fecha_evento'),
+            inscripcion__evento__estado='activo',
+            inscripcion__usuario__recibir_notificaciones=True
+        ).exclude(
+            inscripcion__estado='cancelada'
+        ).update(estado='pendiente', lote=lote, tomado_en=ahora)
+
+        recordatorios = RecordatorioEnviado.objects.filter(
+            lote=lote,
+            estado='pendiente'
+        ).select_related('inscripcion__usuario', 'inscripcion__evento__ubicacion')
+        return lote, list(recordatorios)
+
+    def _agrupar(self, recordatorios):
+        """
+        Agrupa por (evento, dias de anticipacion): todos los del grupo reciben el
+        mismo email salvo el nombre, asi que viajan en una sola llamada a Brevo.
+        """
+        grupos = {}
+        for recordatorio in recordatorios:
+            clave = (recordatorio.inscripcion.evento_id, recordatorio.dias_anticipacion)
+            grupos.setdefault(clave, []).append(recordatorio)
+
+        tamano = brevo_service.MAX_VERSIONES_POR_ENVIO
+        for grupo in grupos.values():
+            for inicio in range(0, len(grupo), tamano):
+                yield grupo[inicio:inicio + tamano]
+
+    def _datos_envio(self, bloque):
+        """Parametros de BrevoService.enviar_recordatorio_evento_lote para un bloque."""
+        primero = bloque[0]
+        evento = primero.inscripcion.evento
+        return {
+            'destinatarios': [
+                {
+                    'email': r.inscripcion.usuario.email,
+                    'nombre_usuario': r.inscripcion.usuario.first_name or r.inscripcion.usuario.username,
+                }
+                for r in bloque
+            ],
+            'evento_nombre': evento.nombre,
+            'evento_fecha': evento.fecha_inicio.strftime('%d/%m/%Y'),
+            'evento_hora': evento.hora_inicio.strftime('%H:%M'),
+            'evento_ubicacion': evento.ubicacion.recinto,
+            'dias_anticipacion': primero.dias_anticipacion,
+        }
+
+    def _enviar_con_reintentos(self, envio, *args, **kwargs):
+        """
+        Llama a `envio` y reintenta con backoff exponencial y jitter mientras falle.
+        Devuelve el ultimo resultado con la cantidad de intentos.
+        """
+        resultado = {}
+        for intento in range(1, self.max_intentos + 1):
+            resultado = envio(*args, **kwargs)
+            if resultado.get('success'):
+                break
+            if intento < self.max_intentos:
+                espera = self.backoff_base * (2 ** (intento - 1))
+                time.sleep(espera + random.uniform(0, espera / 2))
+        resultado['intentos'] = intento
+        return resultado
+
+    def _enviar_bloque(self, datos):
+        """
+        Envia un bloque y devuelve un resultado por destinatario, en el mismo orden:
+        dicts con 'success', 'intentos' y 'message_id' o 'error'.
+        """
+        # El bloque ya cabe en una sola llamada, asi que hay un unico resultado
+        resultado = self._enviar_con_reintentos(
+            lambda: brevo_service.enviar_recordatorio_evento_lote(**datos)[0]
+        )
+        destinatarios = datos['destinatarios']
+        message_ids = resultado.get('message_ids') or []
+
+        if resultado.get('success'):
+            # Brevo devuelve un message id por version, en el orden en que se enviaron.
+            # Si no coinciden no se puede saber cual es de quien: mejor no guardar ninguno
+            if len(message_ids) != len(destinatarios):
+                message_ids = [''] * len(destinatarios)
+            return [
+                {'success': True, 'intentos': resultado['intentos'], 'message_id': message_id}
+                for message_id in message_ids
+            ]
+
+        if len(destinatarios) == 1:
+            return [{'success': False, 'intentos': resultado['intentos'], 'error': resultado.get('error', '')}]
+
+        # Brevo rechaza el bloque entero si un destinatario es invalido: se reenvia uno por uno
+        comunes = {clave: valor for clave, valor in datos.items() if clave != 'destinatarios'}
+        resultados = []
+        for destinatario in destinatarios:
+            individual = self._enviar_con_reintentos(
+                brevo_service.enviar_recordatorio_evento,
+                email=destinatario['email'],
+                nombre_usuario=destinatario['nombre_usuario'],
+                **comunes
+            )
+            individual['intentos'] += resultado['intentos']
+            resultados.append(individual)
+        return resultados
+
+    @contextmanager
+    def _mantener_lease(self, lote):
+        """Renueva en segundo plano el lease de los recordatorios de `lote` que siguen pendientes."""
+        detener = threading.Event()
+
+        def latido():
+            try:
+                while not detener.wait(self.LEASE.total_seconds() / 3):
+                    RecordatorioEnviado.objects.filter(lote=lote, estado='pendiente').update(
+                        tomado_en=timezone.now()
+                    )
+            finally:
+                connection.close()  # La conexion de BD de este hilo
+
+        hilo = threading.Thread(target=latido, name=f'lease-recordatorios-{lote[:8]}', daemon=True)
+        hilo.start()
+        try:
+            yield
+        finally:
+            detener.set()
+            hilo.join()
+
+    def _guardar_resultados(self, bloque, resultados):
+        """
+        Guarda el resultado de cada recordatorio del bloque (un UPDATE por estado).
+        Si otra corrida reclamo alguno (se perdio el lease) no se pisa su estado.
+        """
+        propios = set(RecordatorioEnviado.objects.filter(
+            pk__in=[r.pk for r in bloque], lote=bloque[0].lote
+        ).values_list('pk', flat=True))
+        ahora = timezone.now()
+        enviados, fallidos = [], []
+        for recordatorio, resultado in zip(bloque, resultados):
+            if recordatorio.pk not in propios:
+                continue
+            recordatorio.intentos += resultado['intentos']
+            if resultado.get('success'):
+                recordatorio.estado = 'enviado'
+                recordatorio.message_id = (resultado.get('message_id') or '')[:200]
+                recordatorio.enviado_en = ahora
+                recordatorio.error = ''
+                enviados.append(recordatorio)
+            else:
+                recordatorio.estado = 'fallido'
+                recordatorio.error = (resultado.get('error') or '')[:1000]
+                fallidos.append(recordatorio)
+
+        if enviados:
+            RecordatorioEnviado.objects.bulk_update(
+                enviados, ['estado', 'intentos', 'message_id', 'enviado_en', 'error'], batch_size=500
+            )
+        if fallidos:
+            RecordatorioEnviado.objects.bulk_update(fallidos, ['estado', 'intentos', 'error'], batch_size=500)
+        return len(enviados), len(fallidos)
+
+    def enviar_lote(self, recordatorios, progreso=None):
+        """
+        Envia los recordatorios por bloques con a lo sumo `max_workers` llamadas
+        simultaneas a Brevo. El resultado de cada bloque se guarda apenas termina
+        (desde el hilo principal).
+        Devuelve un dict con el conteo de enviados y fallidos.
+        """
+        resumen = {'enviados': 0, 'fallidos': 0}
+        if not recordatorios:
+            return resumen
+
+        with self._mantener_lease(recordatorios[0].lote), \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futuros = {
+                executor.submit(self._enviar_bloque, self._datos_envio(bloque)): bloque
+                for bloque in self._agrupar(recordatorios)
+            }
+            for futuro in as_completed(futuros):
+                bloque = futuros[futuro]
+                try:
+                    resultados = futuro.result()
+                except Exception as e:
+                    resultados = [
+                        {'success': False, 'error': str(e), 'intentos': self.max_intentos}
+                    ] * len(bloque)
+
+                enviados, fallidos = self._guardar_resultados(bloque, resultados)
+                resumen['enviados'] += enviados
+                resumen['fallidos'] += fallidos
+
+                if progreso:
+                    progreso(resumen, len(recordatorios))
+        return resumen
+
+
+# Instancia singleton
+recordatorios_service = RecordatoriosService()
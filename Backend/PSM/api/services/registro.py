@@ -0,0 +1,81 @@
+# api/services/registro.py
+"""
+Registro de servicios perezosos.
+
+Los servicios que dependen de librerias pesadas (requests, bs4/lxml, pymongo,
+cloudinary, sib_api_v3_sdk, Pillow) no se importan ni se construyen al arrancar
+Django: las vistas importan desde aca un proxy que, la primera vez que se usa
+un atributo, importa el modulo real y toma su instancia singleton.
+
+    from .services.registro import tse_service
+    tse_service.consultar_cedula('...')   # recien aca se importa tse_service.py
+
+Asi cada worker (y cada comando de management, que tambien carga las URLs al
+correr los checks) solo paga las importaciones de lo que realmente usa.
+Medir con `python manage.py benchmark_arranque`.
+"""
+import threading
+from importlib import import_module
+
+
+class ServicioPerezoso:
+    """Proxy que importa y resuelve `modulo.nombre` en el primer uso."""
+
+    def __init__(self, modulo, nombre):
+        object.__setattr__(self, '_modulo', modulo)
+        object.__setattr__(self, '_nombre', nombre)
+        object.__setattr__(self, '_instancia', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _resolver(self):
+        instancia = self._instancia
+        if instancia is None:
+            with self._lock:
+                instancia = self._instancia
+                if instancia is None:
+                    instancia = getattr(import_module(self._modulo), self._nombre)
+                    object.__setattr__(self, '_instancia', instancia)
+        return instancia
+
+    @property
+    def cargado(self):
+        return self._instancia is not None
+
+    def __getattr__(self, atributo):
+        return getattr(self._resolver(), atributo)
+
+    def __setattr__(self, atributo, valor):
+        setattr(self._resolver(), atributo, valor)
+
+    def __repr__(self):
+        estado = 'cargado' if self.cargado else 'sin cargar'
+        return f'<ServicioPerezoso {self._modulo}.{self._nombre} ({estado})>'
+
+
+SERVICIOS = {
+    'tse_service': 'api.services.tse_service',
+    'brevo_service': 'api.services.brevo_service',
+    'outbox_service': 'api.services.outbox_service',
+    'recordatorios_service': 'api.services.recordatorios_service',
+    'imagenes_service': 'api.services.imagenes_service',
+    'normalizador_imagenes': 'api.services.normalizador_imagenes',
+    'mongo_service': 'api.services.mongo_service',
+    'cloudinary_utils': 'api.cloudinary_utils',
+    'utilidades_mongo': 'api.mongo_utils',
+}
+
+tse_service = ServicioPerezoso(SERVICIOS['tse_service'], 'tse_service')
+brevo_service = ServicioPerezoso(SERVICIOS['brevo_service'], 'brevo_service')
+outbox_service = ServicioPerezoso(SERVICIOS['outbox_service'], 'outbox_service')
+recordatorios_service = ServicioPerezoso(SERVICIOS['recordatorios_service'], 'recordatorios_service')
+imagenes_service = ServicioPerezoso(SERVICIOS['imagenes_service'], 'imagenes_service')
+normalizador_imagenes = ServicioPerezoso(SERVICIOS['normalizador_imagenes'], 'normalizador_imagenes')
+mongo_service = ServicioPerezoso(SERVICIOS['mongo_service'], 'mongo_service')
+cloudinary_utils = ServicioPerezoso(SERVICIOS['cloudinary_utils'], 'cloudinary_utils')
+utilidades_mongo = ServicioPerezoso(SERVICIOS['utilidades_mongo'], 'utilidades_mongo')
+
+
+def cargar_todos():
+    """Importa y construye todos los servicios (para comparar con el arranque perezoso)."""
+    for nombre in SERVICIOS:
+        globals()[nombre]._resolver()
@@ -0,0 +1,67 @@
+# api/services/trabajador_fondo.py
+"""
+Hilo de fondo reutilizable para las colas en base de datos (correos, imagenes).
+
+Cada proceso web tiene a lo sumo un hilo por cola. El hilo:
+- se inicia la primera vez que alguien lo despierta (y de nuevo tras un fork),
+- ejecuta `procesar()` hasta que no quede trabajo listo,
+- duerme hasta que lo despierten o hasta `proxima_espera()` segundos.
+
+Si el setting indicado en `setting_habilitado` es False no se inicia nada y la
+cola queda para el comando de management correspondiente (worker aparte).
+"""
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class TrabajadorFondo:
+    """Hilo daemon por proceso que vacia una cola cuando lo despiertan."""
+
+    def __init__(self, nombre, procesar, proxima_espera, setting_habilitado, intervalo=30):
+        self.nombre = nombre
+        self.procesar = procesar  # () -> cantidad de elementos procesados
+        self.proxima_espera = proxima_espera  # () -> segundos hasta el proximo elemento listo
+        self.setting_habilitado = setting_habilitado
+        self.intervalo = intervalo
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def despertar(self):
+        """Avisa al hilo que hay trabajo (lo inicia si hace falta)."""
+        if not getattr(settings, self.setting_habilitado, True):
+            return
+        self._iniciar()
+        self._despertar.set()
+
+    def _iniciar(self):
+        # Se compara el pid porque tras un fork (gunicorn) el hilo no existe en el hijo
+        with self._lock:
+            if self._hilo and self._hilo.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name=self.nombre, daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        espera = 0
+        while True:
+            self._despertar.wait(timeout=espera)
+            self._despertar.clear()
+            espera = self.intervalo
+            try:
+                # Vaciar todo lo que este listo antes de volver a dormir
+                while self.procesar():
+                    pass
+                espera = min(self.intervalo, self.proxima_espera())
+            except Exception:
+                logger.exception('[%s] Error en el hilo de fondo', self.nombre)
+            finally:
+                close_old_connections()
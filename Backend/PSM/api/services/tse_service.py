@@ -1,26 +1,146 @@
 # api/services/tse_service.py
 """Servicio para consultar cédulas en el TSE de Costa Rica
-mediante web scraping al sitio público.b"""
+mediante web scraping al sitio público.
+
+Para no repetir consultas al TSE:
+- Los resultados se guardan por cédula normalizada en una cache LRU en memoria
+  y, si TSE_CACHE_BD está activo, en la tabla ConsultaCedulaCache. Las cédulas
+  no encontradas también se guardan (menos tiempo); los errores de conexión no.
+- Cada hilo tiene su propia requests.Session y reutiliza el formulario
+  (__VIEWSTATE y demás campos ASP.NET) hasta que vence, en vez de hacer un GET
+  por consulta. Si el TSE rechaza el formulario se pide uno nuevo.
+- Consultas simultáneas de la misma cédula esperan a una sola petición al TSE.
+- TSE_MAX_CONCURRENTES limita las peticiones simultáneas al sitio del TSE.
+- consultar_lote() valida listas grandes (importaciones desde hojas de cálculo):
+  resuelve primero lo que ya está en cache y consulta el resto en paralelo,
+  entregando cada resultado apenas está listo.
+
+Las páginas se leen con lxml (solo los inputs, celdas y spans que se usan, sin
+construir el árbol de BeautifulSoup). BeautifulSoup queda como respaldo si lxml
+no está instalado o si la ruta rápida no logra extraer los datos; ambas rutas
+dan el mismo resultado (ver `python manage.py benchmark_tse_parser`).
+"""
+import csv
+import io
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import timedelta
+
 import requests
 from bs4 import BeautifulSoup
-import re
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+    print("lxml no está instalado. Se usará BeautifulSoup para leer las páginas del TSE")
+
+CAMPOS_ASPNET = ['__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION']
+# Etiquetas cuyo texto no cuenta en BeautifulSoup.get_text()
+ETIQUETAS_SIN_TEXTO = {'script', 'style', 'template'}
+
+
+def _textos_lxml(elemento):
+    """
+    Los mismos textos que recorre BeautifulSoup.get_text() para `elemento`:
+    sin comentarios ni el contenido de script/style/template.
+    """
+    if elemento.text and elemento.tag not in ETIQUETAS_SIN_TEXTO:
+        yield elemento.text
+    for hijo in elemento:
+        # Los comentarios tienen un tag que no es str; igual se cuenta su tail
+        if isinstance(hijo.tag, str) and hijo.tag not in ETIQUETAS_SIN_TEXTO:
+            yield from _textos_lxml(hijo)
+        if hijo.tail:
+            yield hijo.tail
+
+
+def _texto_lxml(elemento, strip=False):
+    """Equivalente a get_text() / get_text(strip=True) de BeautifulSoup."""
+    if strip:
+        return ''.join(t.strip() for t in _textos_lxml(elemento) if t.strip())
+    return ''.join(_textos_lxml(elemento))
+
+
+class _CacheLRU:
+    """Cache LRU en memoria con vencimiento por entrada, segura entre hilos."""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._datos = OrderedDict()  # clave -> (expira_monotonic, valor)
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] <= time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave, valor, ttl):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
 
 
 class TSEService:
     """Servicio para consultar datos de cédulas en el TSE de Costa Rica."""
     
     URL = "https://servicioselectorales.tse.go.cr/chc/consulta_cedula.aspx"
+    # Tiempo que se reutiliza el formulario ASP.NET de un hilo (segundos)
+    VIEWSTATE_TTL = 600
+    ERROR_NO_ENCONTRADA = 'Cédula no encontrada en el padrón electoral'
+    HEADERS = {
+        # Headers para simular un navegador
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+        'Accept-Language': 'es-CR,es;q=0.8,en-US;q=0.5,en;q=0.3',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+    }
     
     def __init__(self):
-        self.session = requests.Session()
-        # Headers para simular un navegador
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-            'Accept-Language': 'es-CR,es;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-        })
+        self._local = threading.local()  # Session y formulario de cada hilo
+        self._cache = _CacheLRU(getattr(settings, 'TSE_CACHE_MAXIMO', 5000))
+        self.cache_ttl = getattr(settings, 'TSE_CACHE_TTL', 7 * 24 * 3600)
+        self.cache_ttl_negativo = getattr(settings, 'TSE_CACHE_TTL_NEGATIVO', 3600)
+        self.cache_bd = getattr(settings, 'TSE_CACHE_BD', True)
+        self._limite_tse = threading.BoundedSemaphore(getattr(settings, 'TSE_MAX_CONCURRENTES', 4))
+        # Consultas en curso por cédula: las repetidas esperan el mismo Future
+        self._en_vuelo = {}
+        self._lock_vuelo = threading.Lock()
+    
+    @property
+    def session(self):
+        """requests.Session del hilo actual (Session no es segura entre hilos)."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.HEADERS)
+            self._local.session = session
+        return session
     
     def _limpiar_cedula(self, cedula: str) -> str:
         """Elimina guiones y espacios de la cédula."""
@@ -29,12 +149,53 @@ class TSEService:
     def _extraer_campos_aspnet(self, soup: BeautifulSoup) -> dict:
         """Extrae los campos hidden de ASP.NET necesarios para el POST."""
         campos = {}
-        for field_name in ['__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION']:
+        for field_name in CAMPOS_ASPNET:
             field = soup.find('input', {'name': field_name})
             if field:
                 campos[field_name] = field.get('value', '')
         return campos
     
+    def _leer_formulario(self, html: str) -> dict:
+        """Campos ASP.NET y nombres del textbox y del botón del formulario del TSE."""
+        if LXML_AVAILABLE:
+            try:
+                return self._leer_formulario_lxml(lxml_html.document_fromstring(html))
+            except (ValueError, etree.LxmlError):
+                pass  # HTML que lxml no acepta: se usa BeautifulSoup
+        
+        return self._leer_formulario_bs4(BeautifulSoup(html, 'html.parser'))
+    
+    def _leer_formulario_bs4(self, soup: BeautifulSoup) -> dict:
+        """Lectura del formulario con BeautifulSoup (respaldo)."""
+        # Buscamos el ID del textbox de cédula
+        textbox = soup.find('input', {'type': 'text'})
+        # Buscamos el botón de consulta
+        button = soup.find('input', {'type': 'submit'})
+        return {
+            'campos': self._extraer_campos_aspnet(soup),
+            'textbox': textbox.get('name', 'txtcedula') if textbox else 'txtcedula',
+            'boton': button.get('name', 'btnConsultaCedula') if button else 'btnConsultaCedula',
+        }
+    
+    def _leer_formulario_lxml(self, raiz) -> dict:
+        """Como _leer_formulario, recorriendo solo los <input> de la página."""
+        campos = {}
+        textbox = button = None
+        for elemento in raiz.iter('input'):
+            nombre = elemento.get('name')
+            if nombre in CAMPOS_ASPNET and nombre not in campos:
+                campos[nombre] = elemento.get('value', '')
+            tipo = elemento.get('type')
+            if tipo == 'text' and textbox is None:
+                textbox = elemento
+            elif tipo == 'submit' and button is None:
+                button = elemento
+        return {
+            'campos': {nombre: campos[nombre] for nombre in CAMPOS_ASPNET if nombre in campos},
+            'textbox': textbox.get('name', 'txtcedula') if textbox is not None else 'txtcedula',
+            'boton': button.get('name', 'btnConsultaCedula') if button is not None else 'btnConsultaCedula',
+        }
+    
     def _parsear_fecha(self, fecha_str: str) -> str:
         """Convierte fecha DD/MM/YYYY a YYYY-MM-DD (formato ISO)."""
         try:
@@ -55,9 +216,58 @@ class TSEService:
             pass
         return None
     
+    # ======== CACHE ========
+    
+    def _leer_cache(self, cedula: str):
+        """Busca la cédula en memoria y luego en la tabla. Devuelve el resultado o None."""
+        resultado = self._cache.obtener(cedula)
+        if resultado is not None or not self.cache_bd:
+            return resultado
+        
+        from ..models import ConsultaCedulaCache
+        try:
+            fila = ConsultaCedulaCache.objects.filter(
+                cedula=cedula, expira_en__gt=timezone.now()
+            ).values('resultado', 'expira_en').first()
+        except Exception:
+            logger.warning('[TSE] No se pudo leer la cache en BD', exc_info=True)
+            return None
+        if fila:
+            restante = (fila['expira_en'] - timezone.now()).total_seconds()
+            self._cache.guardar(cedula, fila['resultado'], restante)
+            return fila['resultado']
+        return None
+    
+    def _guardar_cache(self, cedula: str, resultado: dict):
+        """Guarda resultados definitivos: cédulas encontradas y no encontradas."""
+        if resultado.get('valida'):
+            ttl = self.cache_ttl
+        elif resultado.get('error') == self.ERROR_NO_ENCONTRADA:
+            ttl = self.cache_ttl_negativo
+        else:
+            return  # Errores de conexión o de formato: no se guardan
+        
+        self._cache.guardar(cedula, resultado, ttl)
+        if self.cache_bd:
+            from ..models import ConsultaCedulaCache
+            try:
+                ConsultaCedulaCache.objects.update_or_create(
+                    cedula=cedula,
+                    defaults={
+                        'resultado': resultado,
+                        'valida': bool(resultado.get('valida')),
+                        'expira_en': timezone.now() + timedelta(seconds=ttl)
+                    }
+                )
+            except Exception:
+                logger.warning('[TSE] No se pudo guardar la cache en BD', exc_info=True)
+    
+    # ======== CONSULTA ========
+    
     def consultar_cedula(self, cedula: str) -> dict:
         """
         Consulta una cédula en el TSE y devuelve los datos de la persona.
+        Usa la cache si la cédula ya se consultó y agrupa consultas simultáneas.
         
         Args:
             cedula: Número de cédula (puede incluir guiones o no)
@@ -74,47 +284,200 @@ class TSEService:
                 'error': 'Formato de cédula inválido. Debe tener al menos 9 dígitos.'
             }
         
+        resultado = self._leer_cache(cedula_limpia)
+        if resultado is not None:
+            return dict(resultado)
+        
+        # Si ya hay una consulta de esta cédula en curso, esperar su resultado
+        with self._lock_vuelo:
+            futuro = self._en_vuelo.get(cedula_limpia)
+            lider = futuro is None
+            if lider:
+                futuro = self._en_vuelo[cedula_limpia] = Future()
+        if not lider:
+            return dict(futuro.result())
+        
         try:
-            # Paso 1: GET inicial para obtener campos ASP.NET y cookies
-            response = self.session.get(self.URL, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            campos_aspnet = self._extraer_campos_aspnet(soup)
-            
-            # Verificar que tenemos los campos necesarios
-            if not campos_aspnet.get('__VIEWSTATE'):
-                return {
-                    'valida': False,
-                    'error': 'No se pudo obtener el estado de la página del TSE'
-                }
-            
-            # Paso 2: POST con la cédula
-            # Buscamos el ID del textbox de cédula
-            textbox = soup.find('input', {'type': 'text'})
-            textbox_name = textbox.get('name', 'txtcedula') if textbox else 'txtcedula'
-            
-            # Buscamos el botón de consulta
-            button = soup.find('input', {'type': 'submit'})
-            button_name = button.get('name', 'btnConsultaCedula') if button else 'btnConsultaCedula'
-            
-            data = {
-                **campos_aspnet,
-                textbox_name: cedula_limpia,
-                button_name: 'Consultar'
-            }
-            
-            response = self.session.post(self.URL, data=data, timeout=15)
-            response.raise_for_status()
-            
-            # Paso 3: Parsear la respuesta
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Buscar tabla de resultados o mensaje de error
-            # Basado en la captura del usuario, los datos están en una tabla
-            resultado = self._parsear_resultado(soup, cedula_limpia)
-            
-            return resultado
+            resultado = self._consultar_tse(cedula_limpia)
+            self._guardar_cache(cedula_limpia, resultado)
+            futuro.set_result(resultado)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock_vuelo:
+                self._en_vuelo.pop(cedula_limpia, None)
+        return dict(resultado)
+    
+    def _precargar_cache(self, cedulas):
+        """Pasa a la cache en memoria las cédulas de la lista que estén en la tabla (1 consulta)."""
+        if not self.cache_bd:
+            return
+        faltantes = [c for c in cedulas if self._cache.obtener(c) is None]
+        if not faltantes:
+            return
+        
+        from ..models import ConsultaCedulaCache
+        ahora = timezone.now()
+        try:
+            filas = ConsultaCedulaCache.objects.filter(
+                cedula__in=faltantes, expira_en__gt=ahora
+            ).values_list('cedula', 'resultado', 'expira_en')
+            for cedula, resultado, expira_en in filas:
+                self._cache.guardar(cedula, resultado, (expira_en - ahora).total_seconds())
+        except Exception:
+            logger.warning('[TSE] No se pudo leer la cache en BD', exc_info=True)
+    
+    def sin_cache(self, cedulas) -> set:
+        """
+        Cédulas distintas de la lista que no están en cache y habría que
+        consultar al TSE (las de formato inválido no cuentan: no van a la red).
+        """
+        limpias = {self._limpiar_cedula(c) for c in cedulas}
+        self._precargar_cache(limpias)
+        return {
+            c for c in limpias
+            if c.isdigit() and len(c) >= 9 and self._cache.obtener(c) is None
+        }
+    
+    def consultar_lote(self, cedulas, max_workers=None):
+        """
+        Consulta muchas cédulas. Es un generador que entrega (indice, cedula, resultado)
+        a medida que cada consulta termina (no en el orden de la lista).
+        
+        Las que están en cache se entregan de inmediato; las demás se consultan
+        con `max_workers` hilos (por defecto TSE_MAX_CONCURRENTES). Las cédulas
+        repetidas en la lista se consultan una sola vez.
+        """
+        cedulas = list(cedulas)
+        limpias = [self._limpiar_cedula(c) for c in cedulas]
+        self._precargar_cache(set(limpias))
+        
+        por_consultar = {}  # cedula limpia -> indices donde aparece
+        for indice, (cedula, limpia) in enumerate(zip(cedulas, limpias)):
+            en_cache = self._cache.obtener(limpia)
+            if en_cache is not None:
+                yield indice, cedula, dict(en_cache)
+            elif not limpia.isdigit() or len(limpia) < 9:
+                yield indice, cedula, self.consultar_cedula(cedula)  # Error de formato, sin red
+            else:
+                por_consultar.setdefault(limpia, []).append(indice)
+        
+        if not por_consultar:
+            return
+        
+        pendientes = queue.SimpleQueue()
+        for limpia in por_consultar:
+            pendientes.put(limpia)
+        listos = queue.SimpleQueue()
+        detener = threading.Event()
+        
+        def trabajador():
+            try:
+                while not detener.is_set():
+                    try:
+                        limpia = pendientes.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        listos.put((limpia, self.consultar_cedula(limpia), None))
+                    except BaseException as e:
+                        listos.put((limpia, None, e))
+            finally:
+                connection.close()  # Una vez por hilo: su conexión de BD (cache en BD)
+        
+        max_workers = max_workers or getattr(settings, 'TSE_MAX_CONCURRENTES', 4)
+        for _ in range(min(max_workers, len(por_consultar))):
+            threading.Thread(target=trabajador, daemon=True).start()
+        try:
+            for _ in range(len(por_consultar)):
+                limpia, resultado, error = listos.get()
+                if error is not None:
+                    raise error
+                for indice in por_consultar[limpia]:
+                    yield indice, cedulas[indice], dict(resultado)
+        finally:
+            # Si el cliente deja de leer, no seguir consultando lo que falta
+            detener.set()
+    
+    def leer_cedulas_csv(self, texto: str) -> list:
+        """
+        Lee las cédulas de un CSV. Usa la columna 'cedula' si el encabezado la
+        tiene; si no, la primera columna. Ignora filas vacías.
+        """
+        muestra = texto[:2048]
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        filas = [fila for fila in csv.reader(io.StringIO(texto), dialecto) if any(c.strip() for c in fila)]
+        if not filas:
+            return []
+        
+        encabezado = [c.strip().lower().replace('é', 'e') for c in filas[0]]
+        if 'cedula' in encabezado:
+            columna = encabezado.index('cedula')
+            filas = filas[1:]
+        else:
+            columna = 0
+            # Encabezado sin columna 'cedula' (texto en la primera celda): se descarta
+            if not self._limpiar_cedula(filas[0][0]).isdigit():
+                filas = filas[1:]
+        return [fila[columna].strip() for fila in filas if len(fila) > columna and fila[columna].strip()]
+    
+    def _formulario(self, renovar=False) -> dict:
+        """
+        Campos del formulario del TSE para el hilo actual. Se reutilizan durante
+        VIEWSTATE_TTL; con renovar=True (o vencidos) se hace un GET nuevo.
+        """
+        formulario = getattr(self._local, 'formulario', None)
+        if formulario and not renovar and time.monotonic() - formulario['obtenido_en'] < self.VIEWSTATE_TTL:
+            return formulario
+        
+        # GET inicial para obtener campos ASP.NET y cookies
+        response = self.session.get(self.URL, timeout=15)
+        response.raise_for_status()
+        
+        formulario = self._leer_formulario(response.text)
+        formulario['obtenido_en'] = time.monotonic()
+        self._local.formulario = formulario
+        return formulario
+    
+    def _consultar_tse(self, cedula_limpia: str) -> dict:
+        """Hace la consulta real al sitio del TSE (sin cache)."""
+        try:
+            with self._limite_tse:
+                for intento in range(2):
+                    formulario = self._formulario(renovar=intento > 0)
+                    
+                    # Verificar que tenemos los campos necesarios
+                    if not formulario['campos'].get('__VIEWSTATE'):
+                        self._local.formulario = None
+                        return {
+                            'valida': False,
+                            'error': 'No se pudo obtener el estado de la página del TSE'
+                        }
+                    
+                    # POST con la cédula
+                    data = {
+                        **formulario['campos'],
+                        formulario['textbox']: cedula_limpia,
+                        formulario['boton']: 'Consultar'
+                    }
+                    response = self.session.post(self.URL, data=data, timeout=15)
+                    
+                    if response.ok:
+                        # Parsear la respuesta
+                        resultado = self._parsear_pagina(response.text, cedula_limpia)
+                        if resultado.get('valida') or resultado.get('error') == self.ERROR_NO_ENCONTRADA:
+                            return resultado
+                    
+                    # El TSE rechazó el formulario reutilizado (vencido o sin sesión):
+                    # se descarta y se intenta una vez más con uno nuevo
+                    self._local.formulario = None
+                
+                response.raise_for_status()
+                return resultado
             
         except requests.Timeout:
             return {
@@ -132,18 +495,63 @@ class TSEService:
                 'error': f'Error inesperado: {str(e)}'
             }
     
+    def _parsear_pagina(self, html: str, cedula: str) -> dict:
+        """
+        Parsea la respuesta del TSE con lxml. Si lxml no está o no logra extraer
+        los datos, se repite con BeautifulSoup (mismo resultado en páginas válidas).
+        """
+        if LXML_AVAILABLE:
+            try:
+                resultado = self._parsear_resultado_lxml(lxml_html.document_fromstring(html), cedula)
+                if resultado.get('valida') or resultado.get('error') == self.ERROR_NO_ENCONTRADA:
+                    return resultado
+            except (ValueError, etree.LxmlError):
+                pass
+        return self._parsear_resultado(BeautifulSoup(html, 'html.parser'), cedula)
+    
     def _parsear_resultado(self, soup: BeautifulSoup, cedula: str) -> dict:
-        """Parsea la página de resultados del TSE."""
+        """Parsea la página de resultados del TSE (BeautifulSoup)."""
+        
+        def celdas():
+            for td in soup.find_all('td'):
+                next_td = td.find_next_sibling('td')
+                yield td.get_text(strip=True), next_td.get_text(strip=True) if next_td else None
+        
+        def spans():
+            for span in soup.find_all('span'):
+                yield span.get('id', ''), span.get_text(strip=True)
+        
+        return self._armar_resultado(soup.get_text(), celdas(), spans(), cedula)
+    
+    def _parsear_resultado_lxml(self, raiz, cedula: str) -> dict:
+        """Parsea la página de resultados del TSE (lxml)."""
+        
+        def celdas():
+            for td in raiz.iter('td'):
+                next_td = next(td.itersiblings('td'), None)
+                yield _texto_lxml(td, strip=True), _texto_lxml(next_td, strip=True) if next_td is not None else None
+        
+        def spans():
+            for span in raiz.iter('span'):
+                yield span.get('id', ''), _texto_lxml(span, strip=True)
+        
+        return self._armar_resultado(_texto_lxml(raiz), celdas(), spans(), cedula)
+    
+    def _armar_resultado(self, page_text: str, celdas, spans, cedula: str) -> dict:
+        """
+        Arma el resultado a partir del texto de la página, los pares
+        (texto de celda, texto de la celda siguiente) y los pares (id, texto) de spans.
+        """
         
         # Buscar si hay mensaje de error (cédula no encontrada)
         error_msgs = ['no se encontró', 'no encontrada', 'no existe']
-        page_text = soup.get_text().lower()
+        page_text = page_text.lower()
         
         for msg in error_msgs:
             if msg in page_text:
                 return {
                     'valida': False,
-                    'error': 'Cédula no encontrada en el padrón electoral'
+                    'error': self.ERROR_NO_ENCONTRADA
                 }
         
         # Intentar extraer datos de la tabla de resultados
@@ -161,13 +569,8 @@ class TSEService:
         # El TSE usa una estructura de tabla con labels y valores
         
         # Método 1: Buscar por texto de label
-        for td in soup.find_all('td'):
-            text = td.get_text(strip=True)
-            next_td = td.find_next_sibling('td')
-            
-            if next_td:
-                value = next_td.get_text(strip=True)
-                
+        for text, value in celdas:
+            if value is not None:
                 if 'Nombre Completo' in text:
                     resultado['nombre_completo'] = value
                 elif 'Fecha Nacimiento' in text or 'Fecha de Nacimiento' in text:
@@ -180,9 +583,8 @@ class TSEService:
         
         # Método 2: Buscar spans con IDs específicos (común en ASP.NET)
         if not resultado['nombre_completo']:
-            for span in soup.find_all('span'):
-                span_id = span.get('id', '').lower()
-                text = span.get_text(strip=True)
+            for span_id, text in spans:
+                span_id = span_id.lower()
                 
                 if 'nombre' in span_id and text:
                     resultado['nombre_completo'] = text
@@ -0,0 +1,130 @@
+"""
+Señales del modelo que mantienen al dia los datos derivados
+(snapshot de estadisticas, etc.). Se registran en ApiConfig.ready().
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import CategEvento, ConfiguracionPerfil, Contacto, Evento, Inscripcion, Resena, Ubicacion
+from .services.cache_referencia import cache_referencia
+from .services.contadores_service import contadores_service
+from .services.estadisticas_service import estadisticas_service
+from .services.mis_inscripciones_service import mis_inscripciones_service
+
+
+# ======== BORRADO DE EVENTOS ========
+# Borrar un evento borra en cascada sus inscripciones y reseñas, y Django manda
+# un post_delete por cada una. En vez de un UPDATE de versiones, contadores y
+# estadisticas por fila, el pre_delete del evento hace todo en bloque y anota el
+# evento en `origin` (el objeto o queryset al que se le llamo .delete(), el mismo
+# para toda la cascada); los handlers por fila de ese evento no hacen nada.
+
+def _en_borrado_de_evento(instance, origin):
+    """True si `instance` se borra en la cascada de su evento (ya resuelto en bloque)."""
+    return instance.evento_id in getattr(origin, '_eventos_borrados', ())
+
+
+@receiver(pre_delete, sender=Evento)
+def preparar_borrado_evento(sender, instance, origin=None, **kwargs):
+    # La fila del evento todavia existe: sus inscripciones se descuentan de la categoria
+    contadores_service.evento_eliminado(instance.pk, instance.categoria_id)
+    mis_inscripciones_service.invalidar_evento(instance.pk)
+    if origin is not None:
+        if not hasattr(origin, '_eventos_borrados'):
+            origin._eventos_borrados = set()
+        origin._eventos_borrados.add(instance.pk)
+
+
+# Cualquier escritura en estas tablas deja el snapshot del dashboard desactualizado
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+@receiver([post_save, post_delete], sender=Evento)
+@receiver([post_save, post_delete], sender=Inscripcion)
+@receiver([post_save, post_delete], sender=Resena)
+@receiver([post_save, post_delete], sender=Contacto)
+@receiver([post_save, post_delete], sender=CategEvento)
+def invalidar_estadisticas(sender, instance, origin=None, **kwargs):
+    if sender in (Inscripcion, Resena) and _en_borrado_de_evento(instance, origin):
+        return  # Ya lo invalida el post_delete del evento
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        return  # Cada login guarda last_login; "activos" se pone al dia con la antiguedad maxima
+    estadisticas_service.invalidar()
+
+
+# ETag de "mis inscripciones": version del usuario dueño de la inscripcion
+@receiver([post_save, post_delete], sender=Inscripcion)
+def invalidar_mis_inscripciones(sender, instance, origin=None, **kwargs):
+    if not _en_borrado_de_evento(instance, origin):
+        mis_inscripciones_service.invalidar([instance.usuario_id])
+
+
+# El listado incluye nombre, fechas y horas del evento
+@receiver(post_save, sender=Evento)
+def invalidar_inscritos_evento(sender, instance, created, **kwargs):
+    if not created:
+        mis_inscripciones_service.invalidar_evento(instance.pk)
+
+
+# Datos de referencia en cache (ver services/cache_referencia.py)
+@receiver([post_save, post_delete], sender=CategEvento)
+def invalidar_cache_categorias(sender, **kwargs):
+    cache_referencia.invalidar('categorias')
+
+
+@receiver([post_save, post_delete], sender=Ubicacion)
+def invalidar_cache_ubicaciones(sender, **kwargs):
+    cache_referencia.invalidar('ubicaciones')
+
+
+@receiver([post_save, post_delete], sender=ConfiguracionPerfil)
+def invalidar_cache_configuracion(sender, **kwargs):
+    cache_referencia.invalidar('configuracion_perfil')
+
+
+# ======== CONTADORES (ver services/contadores_service.py) ========
+
+def _anterior(instance, campo):
+    """Valor de `campo` al leer la instancia (ver ValoresAnterioresMixin), sin consultar."""
+    return getattr(instance, '_valores_anteriores', {}).get(campo, getattr(instance, campo))
+
+
+@receiver(post_save, sender=Evento)
+def contar_evento(sender, instance, created, **kwargs):
+    if created:
+        contadores_service.evento_creado(instance.categoria_id)
+    elif _anterior(instance, 'categoria_id') != instance.categoria_id:
+        contadores_service.evento_movido(instance.pk, _anterior(instance, 'categoria_id'), instance.categoria_id)
+
+
+@receiver(post_save, sender=Inscripcion)
+def contar_inscripcion(sender, instance, created, **kwargs):
+    if created:
+        contadores_service.inscripciones(instance.evento_id, 1)
+    elif _anterior(instance, 'evento_id') != instance.evento_id:
+        contadores_service.inscripciones(_anterior(instance, 'evento_id'), -1)
+        contadores_service.inscripciones(instance.evento_id, 1)
+
+
+@receiver(post_delete, sender=Inscripcion)
+def descontar_inscripcion(sender, instance, origin=None, **kwargs):
+    if not _en_borrado_de_evento(instance, origin):
+        contadores_service.inscripciones(instance.evento_id, -1)
+
+
+@receiver(post_save, sender=Resena)
+def contar_resena(sender, instance, created, **kwargs):
+    evento_anterior = _anterior(instance, 'evento_id')
+    calificacion_anterior = _anterior(instance, 'calificacion')
+    if created:
+        contadores_service.resenas(instance.evento_id, 1, instance.calificacion)
+    elif evento_anterior != instance.evento_id:
+        contadores_service.resenas(evento_anterior, -1, -calificacion_anterior)
+        contadores_service.resenas(instance.evento_id, 1, instance.calificacion)
+    elif calificacion_anterior != instance.calificacion:
+        contadores_service.resenas(instance.evento_id, 0, instance.calificacion - calificacion_anterior)
+
+
+@receiver(post_delete, sender=Resena)
+def descontar_resena(sender, instance, origin=None, **kwargs):
+    if not _en_borrado_de_evento(instance, origin):
+        contadores_service.resenas(instance.evento_id, -1, -instance.calificacion)
@@ -1,3 +1,1356 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import (
+    CategEvento, Evento, Inscripcion, RecordatorioEnviado, Ubicacion, Usuario,
+)
+from .services.normalizador_imagenes import PIL_AVAILABLE
+
+
+class DatosPruebaMixin:
+    """Crea categorias, ubicaciones, eventos, usuarios e inscripciones minimas."""
+
+    def crear_usuario(self, username, **extra):
+        extra.setdefault('email', f'{username}@example.com')
+        # Sin password: hashearla hace lentas las pruebas y se autentica con el token
+        return Usuario.objects.create_user(username=username, password=None, **extra)
+
+    def autenticar(self, cliente, usuario):
+        """Access token real (con los claims de roles) como en produccion."""
+        from .serializers import CustomTokenObtainPairSerializer
+
+        token = CustomTokenObtainPairSerializer.get_token(usuario).access_token
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def crear_admin(self, username='admin', **extra):
+        from django.contrib.auth.models import Group
+
+        usuario = self.crear_usuario(username, **extra)
+        usuario.groups.add(Group.objects.get_or_create(name='admin')[0])
+        return usuario
+
+    def crear_evento(self, categoria=None, ubicacion=None, **extra):
+        if categoria is None:
+            categoria = CategEvento.objects.create(nombre='Atletismo')
+        if ubicacion is None:
+            ubicacion = Ubicacion.objects.create(recinto='Estadio', direccion='https://maps.example.com/estadio')
+        inicio = extra.pop('fecha_inicio', timezone.localdate() + timedelta(days=10))
+        datos = {
+            'nombre': 'Carrera',
+            'categoria': categoria,
+            'ubicacion': ubicacion,
+            'fecha_inicio': inicio,
+            'fecha_fin': inicio + timedelta(days=30),
+            'hora_inicio': time(8, 0),
+            'hora_fin': time(10, 0),
+            'cupo_maximo': 10,
+            'cupos_disponibles': 10,
+        }
+        datos.update(extra)
+        return Evento.objects.create(**datos)
+
+
+class RecordatoriosServiceTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        from .services.recordatorios_service import RecordatoriosService
+
+        self.hoy = date(2030, 3, 1)
+        self.evento = self.crear_evento(fecha_inicio=self.hoy + timedelta(days=1))
+        for nombre in ('ana', 'beto', 'carla'):
+            usuario = self.crear_usuario(nombre, dias_anticipacion_notificacion=1)
+            Inscripcion.objects.create(usuario=usuario, evento=self.evento, estado='confirmada')
+        self.servicio = RecordatoriosService(max_workers=1, max_intentos=1, backoff_base=0)
+
+    def test_cada_recordatorio_guarda_su_message_id(self):
+        from .services.brevo_service import brevo_service
+
+        def lote(destinatarios, **datos):
+            return [{'success': True, 'message_ids': [f"<{d['email']}>" for d in destinatarios]}]
+
+        _, recordatorios = self.servicio.tomar_lote(self.hoy)
+        with mock.patch.object(brevo_service, 'enviar_recordatorio_evento_lote', side_effect=lote):
+            resumen = self.servicio.enviar_lote(recordatorios)
+
+        self.assertEqual(resumen, {'enviados': 3, 'fallidos': 0})
+        for recordatorio in RecordatorioEnviado.objects.select_related('inscripcion__usuario'):
+            self.assertEqual(recordatorio.message_id, f'<{recordatorio.inscripcion.usuario.email}>')
+
+    def test_bloque_rechazado_se_reenvia_por_destinatario(self):
+        from .services.brevo_service import brevo_service
+
+        def individual(email, **datos):
+            if email.startswith('beto'):
+                return {'success': False, 'error': 'invalid email'}
+            return {'success': True, 'message_id': f'<{email}>'}
+
+        _, recordatorios = self.servicio.tomar_lote(self.hoy)
+        with mock.patch.object(brevo_service, 'enviar_recordatorio_evento_lote',
+                               return_value=[{'success': False, 'error': 'invalid email'}]), \
+                mock.patch.object(brevo_service, 'enviar_recordatorio_evento', side_effect=individual):
+            resumen = self.servicio.enviar_lote(recordatorios)
+
+        self.assertEqual(resumen, {'enviados': 2, 'fallidos': 1})
+        fallido = RecordatorioEnviado.objects.get(estado='fallido')
+        self.assertEqual(fallido.inscripcion.usuario.username, 'beto')
+
+    def test_no_reclama_pendientes_de_una_corrida_viva(self):
+        lote, recordatorios = self.servicio.tomar_lote(self.hoy)
+        self.assertEqual(len(recordatorios), 3)
+
+        # Otra corrida mientras la primera sigue renovando su lease: no toma nada
+        _, otros = self.servicio.tomar_lote(self.hoy)
+        self.assertEqual(otros, [])
+
+        # Lease vencido (la corrida se cayo): se reclaman
+        RecordatorioEnviado.objects.update(tomado_en=timezone.now() - self.servicio.LEASE * 2)
+        otro_lote, reclamados = self.servicio.tomar_lote(self.hoy)
+        self.assertEqual(len(reclamados), 3)
+        self.assertNotEqual(otro_lote, lote)
+
+    def test_fallidos_se_reintentan_hasta_el_maximo(self):
+        from .services.brevo_service import brevo_service
+
+        self.servicio.max_intentos_totales = 2
+        falla = mock.patch.object(
+            brevo_service, 'enviar_recordatorio_evento_lote', return_value=[{'success': False, 'error': 'caido'}]
+        )
+        falla_individual = mock.patch.object(
+            brevo_service, 'enviar_recordatorio_evento', return_value={'success': False, 'error': 'caido'}
+        )
+        with falla, falla_individual:
+            _, recordatorios = self.servicio.tomar_lote(self.hoy)
+            self.servicio.enviar_lote(recordatorios)
+            # 1 intento del bloque + 1 individual: ya llego al maximo
+            self.assertEqual(set(RecordatorioEnviado.objects.values_list('intentos', flat=True)), {2})
+            self.assertEqual(self.servicio.tomar_lote(self.hoy)[1], [])
+
+        self.servicio.max_intentos_totales = 5
+        with mock.patch.object(brevo_service, 'enviar_recordatorio_evento_lote',
+                               return_value=[{'success': True, 'message_ids': ['a', 'b', 'c']}]):
+            _, recordatorios = self.servicio.tomar_lote(self.hoy)
+            self.assertEqual(len(recordatorios), 3)
+            self.assertEqual(self.servicio.enviar_lote(recordatorios), {'enviados': 3, 'fallidos': 0})
+        self.assertEqual(set(RecordatorioEnviado.objects.values_list('intentos', flat=True)), {3})
+
+
+class ContadoresTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        self.evento = self.crear_evento()
+        self.usuario = self.crear_usuario('ana')
+
+    def test_inscripciones_y_resenas_mueven_los_contadores(self):
+        from .models import Resena
+
+        inscripcion = Inscripcion.objects.create(usuario=self.usuario, evento=self.evento)
+        resena = Resena.objects.create(usuario=self.usuario, evento=self.evento, calificacion=4)
+        Resena.objects.create(usuario=self.crear_usuario('beto'), evento=self.evento, calificacion=2)
+
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.total_inscripciones, 1)
+        self.assertEqual(self.evento.categoria.total_eventos, 1)
+        self.assertEqual((self.evento.total_resenas, self.evento.suma_calificaciones), (2, 6))
+        self.assertEqual(self.evento.promedio_calificacion, 3.0)
+
+        resena = Resena.objects.get(pk=resena.pk)
+        resena.calificacion = 5
+        resena.save()
+        inscripcion.delete()
+
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.total_inscripciones, 0)
+        self.assertEqual(self.evento.suma_calificaciones, 7)
+        self.assertEqual(self.evento.promedio_calificacion, 3.5)
+
+    def test_promedio_se_calcula_con_los_contadores_nuevos(self):
+        from django.test.utils import CaptureQueriesContext
+
+        from .models import Resena
+
+        Resena.objects.create(usuario=self.usuario, evento=self.evento, calificacion=5)
+        with CaptureQueriesContext(connection) as consultas:
+            Resena.objects.create(usuario=self.crear_usuario('beto'), evento=self.evento, calificacion=3)
+
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.promedio_calificacion, 4.0)
+        # En MySQL un SET que mezcle contadores y promedio contaria la reseña dos veces
+        for consulta in consultas.captured_queries:
+            if consulta['sql'].startswith('UPDATE "api_evento"'):
+                self.assertFalse(
+                    'suma_calificaciones" =' in consulta['sql'] and 'promedio_calificacion" =' in consulta['sql'],
+                    consulta['sql']
+                )
+
+    def test_cambio_de_categoria_mueve_evento_e_inscripciones(self):
+        Inscripcion.objects.create(usuario=self.usuario, evento=self.evento)
+        anterior = self.evento.categoria
+        nueva = CategEvento.objects.create(nombre='Natación')
+
+        evento = Evento.objects.get(pk=self.evento.pk)
+        evento.categoria = nueva
+        evento.save()
+
+        anterior.refresh_from_db()
+        nueva.refresh_from_db()
+        self.assertEqual((anterior.total_eventos, anterior.total_inscripciones), (0, 0))
+        self.assertEqual((nueva.total_eventos, nueva.total_inscripciones), (1, 1))
+
+    def test_guardar_no_relee_la_fila(self):
+        from django.test.utils import CaptureQueriesContext
+
+        inscripcion = Inscripcion.objects.create(usuario=self.usuario, evento=self.evento)
+        inscripcion = Inscripcion.objects.get(pk=inscripcion.pk)
+        inscripcion.comentarios = 'Llego tarde'
+        with CaptureQueriesContext(connection) as consultas:
+            inscripcion.save()
+        for consulta in consultas.captured_queries:
+            self.assertNotRegex(consulta['sql'], r'^SELECT .* FROM "api_inscripcion"')
+
+    def test_borrar_evento_actualiza_en_bloque(self):
+        from django.test.utils import CaptureQueriesContext
+
+        from .models import Resena
+
+        usuarios = [self.crear_usuario(f'u{i}') for i in range(20)]
+        for usuario in usuarios:
+            Inscripcion.objects.create(usuario=usuario, evento=self.evento)
+            Resena.objects.create(usuario=usuario, evento=self.evento, calificacion=5)
+        otro = self.crear_evento(categoria=self.evento.categoria, ubicacion=self.evento.ubicacion)
+        Inscripcion.objects.create(usuario=self.usuario, evento=otro)
+        versiones = dict(Usuario.objects.values_list('pk', 'version_inscripciones'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            Evento.objects.get(pk=self.evento.pk).delete()
+
+        updates = [q for q in consultas.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertLessEqual(len(updates), 3)
+        categoria = CategEvento.objects.get(pk=self.evento.categoria_id)
+        self.assertEqual((categoria.total_eventos, categoria.total_inscripciones), (1, 1))
+        for usuario in usuarios:
+            usuario.refresh_from_db()
+            self.assertEqual(usuario.version_inscripciones, versiones[usuario.pk] + 1)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.version_inscripciones, versiones[self.usuario.pk])
+
+    def test_reconciliar_corrige_contadores_desfasados(self):
+        from .services.contadores_service import contadores_service
+
+        Inscripcion.objects.bulk_create([Inscripcion(usuario=self.usuario, evento=self.evento)])
+        self.assertEqual(contadores_service.reconciliar(), {'Evento': 1, 'CategEvento': 1})
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.total_inscripciones, 1)
+
+
+class ValidarCedulaLoteTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.crear_admin())
+
+    def test_consultar_lote_entrega_todas_las_cedulas(self):
+        from .services.tse_service import tse_service
+
+        cedulas = ['101110111', '202220222', '1-0111-0111', '12']
+        with mock.patch.object(tse_service, '_consultar_tse', side_effect=lambda c: {'valida': True, 'cedula': c}), \
+                mock.patch.object(tse_service, '_guardar_cache'):
+            resultados = sorted(tse_service.consultar_lote(cedulas, max_workers=2))
+
+        self.assertEqual([indice for indice, _, _ in resultados], [0, 1, 2, 3])
+        self.assertEqual(resultados[2][2]['cedula'], '101110111')
+        self.assertFalse(resultados[3][2]['valida'])
+
+    def test_rechaza_lotes_que_no_caben_en_el_timeout(self):
+        cedulas = [str(100000000 + i) for i in range(61)]
+        with self.settings(TSE_LOTE_MAXIMO_SIN_CACHE=60):
+            respuesta = self.cliente.post('/api/validar-cedula/lote/', {'cedulas': cedulas}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('validar_cedulas', respuesta.json()['error'])
+
+
+class SesionTSEFalsa:
+    """requests.Session de prueba: GET devuelve el formulario y POST la pagina de resultado."""
+
+    def __init__(self, paginas, post=None):
+        self.headers = {}
+        self.paginas = paginas
+        self.gets = []
+        self.posts = []
+        self._post = post
+
+    def _respuesta(self, texto):
+        return mock.Mock(text=texto, ok=True, raise_for_status=mock.Mock())
+
+    def get(self, url, **kwargs):
+        self.gets.append(url)
+        return self._respuesta(self.paginas['formulario'])
+
+    def post(self, url, data=None, **kwargs):
+        self.posts.append(data)
+        if self._post:
+            self._post()
+        return self._respuesta(self.paginas['resultado'])
+
+
+@override_settings(TSE_CACHE_BD=False)
+class TSEServiceTests(TestCase):
+    CEDULA = '109870654'
+
+    @classmethod
+    def setUpClass(cls):
+        from pathlib import Path
+
+        super().setUpClass()
+        carpeta = Path(__file__).resolve().parent / 'fixtures' / 'tse'
+        cls.paginas = {nombre: (carpeta / f'{nombre}.html').read_text(encoding='utf-8')
+                       for nombre in ('formulario', 'resultado', 'no_encontrada')}
+
+    def servicio(self, post=None):
+        """TSEService nuevo (cache vacia) con una sesion falsa compartida por todos los hilos."""
+        from .services.tse_service import TSEService
+
+        self.sesion = SesionTSEFalsa(self.paginas, post)
+        parche = mock.patch('api.services.tse_service.requests.Session', return_value=self.sesion)
+        parche.start()
+        self.addCleanup(parche.stop)
+        return TSEService()
+
+    def test_cache_lru_vence_y_descarta_la_menos_usada(self):
+        from .services.tse_service import _CacheLRU
+
+        cache = _CacheLRU(maximo=2)
+        with mock.patch('api.services.tse_service.time.monotonic', return_value=100):
+            cache.guardar('a', 1, ttl=10)
+            cache.guardar('b', 2, ttl=10)
+            self.assertEqual(cache.obtener('a'), 1)  # 'b' queda como la menos usada
+            cache.guardar('c', 3, ttl=10)
+            self.assertIsNone(cache.obtener('b'))
+            self.assertEqual(cache.obtener('a'), 1)
+        with mock.patch('api.services.tse_service.time.monotonic', return_value=110):
+            self.assertIsNone(cache.obtener('a'))
+
+    def test_cache_en_memoria_evita_la_segunda_consulta(self):
+        servicio = self.servicio()
+        primero = servicio.consultar_cedula(self.CEDULA)
+        self.assertTrue(primero['valida'])
+        self.assertEqual(servicio.consultar_cedula('1-0987-0654'), primero)
+        self.assertEqual(len(self.sesion.posts), 1)
+
+    def test_cache_en_bd(self):
+        from .models import ConsultaCedulaCache
+
+        guardado = {'valida': True, 'cedula': self.CEDULA, 'nombre_completo': 'DESDE LA TABLA'}
+        ConsultaCedulaCache.objects.create(
+            cedula=self.CEDULA, resultado=guardado, expira_en=timezone.now() + timedelta(hours=1)
+        )
+        with self.settings(TSE_CACHE_BD=True):
+            servicio = self.servicio()
+        self.assertEqual(servicio.consultar_cedula(self.CEDULA), guardado)
+        self.assertEqual(self.sesion.posts, [])
+
+        # Vencida: se consulta al TSE y se reemplaza la fila
+        ConsultaCedulaCache.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+        servicio._cache.limpiar()
+        resultado = servicio.consultar_cedula(self.CEDULA)
+        self.assertEqual(len(self.sesion.posts), 1)
+        self.assertEqual(ConsultaCedulaCache.objects.get().resultado['nombre_completo'], resultado['nombre_completo'])
+        self.assertGreater(ConsultaCedulaCache.objects.get().expira_en, timezone.now())
+
+    def test_consultas_simultaneas_de_la_misma_cedula_van_una_vez_al_tse(self):
+        import threading
+
+        entro, soltar = threading.Event(), threading.Event()
+
+        def post_lento():
+            entro.set()
+            soltar.wait(5)
+
+        servicio = self.servicio(post=post_lento)
+        # Cuenta quien toma el lock de consultas en curso para saber cuando el segundo ya se sumo
+        tomas = threading.Semaphore(0)
+        lock = servicio._lock_vuelo
+
+        class LockContado:
+            def __enter__(self):
+                lock.acquire()
+                tomas.release()
+
+            def __exit__(self, *args):
+                lock.release()
+
+        servicio._lock_vuelo = LockContado()
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(servicio.consultar_cedula(self.CEDULA)))
+                 for _ in range(2)]
+        with mock.patch.object(servicio, '_guardar_cache'):  # Sin cache: solo comparten la consulta en curso
+            hilos[0].start()
+            self.assertTrue(entro.wait(5))
+            hilos[1].start()
+            for _ in range(2):
+                self.assertTrue(tomas.acquire(timeout=5))
+            soltar.set()
+            for hilo in hilos:
+                hilo.join(5)
+
+        self.assertEqual(len(self.sesion.posts), 1)
+        self.assertEqual(len(resultados), 2)
+        self.assertEqual(resultados[0], resultados[1])
+
+    def test_reutiliza_el_formulario_aspnet(self):
+        servicio = self.servicio()
+        servicio.consultar_cedula(self.CEDULA)
+        servicio.consultar_cedula('208880888')
+        self.assertEqual((len(self.sesion.gets), len(self.sesion.posts)), (1, 2))
+        self.assertTrue(all(datos['__VIEWSTATE'] for datos in self.sesion.posts))
+
+        # Vencido el formulario se pide uno nuevo
+        servicio._local.formulario['obtenido_en'] -= servicio.VIEWSTATE_TTL
+        servicio.consultar_cedula('307770777')
+        self.assertEqual(len(self.sesion.gets), 2)
+
+    def test_formulario_rechazado_se_renueva_una_vez(self):
+        servicio = self.servicio()
+        paginas = iter([self.paginas['formulario'], self.paginas['resultado']])
+        self.sesion.post = lambda url, data=None, **kwargs: (
+            self.sesion.posts.append(data) or self.sesion._respuesta(next(paginas))
+        )
+        self.assertTrue(servicio.consultar_cedula(self.CEDULA)['valida'])
+        self.assertEqual((len(self.sesion.gets), len(self.sesion.posts)), (2, 2))
+
+
+class TSEParserTests(TestCase):
+    """lxml y BeautifulSoup deben dar lo mismo en las paginas grabadas del TSE."""
+
+    def setUp(self):
+        from .services.tse_service import LXML_AVAILABLE
+
+        if not LXML_AVAILABLE:
+            self.skipTest('lxml no está instalado')
+
+    def pagina(self, nombre):
+        from pathlib import Path
+
+        return (Path(__file__).resolve().parent / 'fixtures' / 'tse' / f'{nombre}.html').read_text(encoding='utf-8')
+
+    def test_formulario(self):
+        from bs4 import BeautifulSoup
+        from lxml import html as lxml_html
+
+        from .services.tse_service import tse_service
+
+        html = self.pagina('formulario')
+        lxml = tse_service._leer_formulario_lxml(lxml_html.document_fromstring(html))
+        self.assertEqual(lxml, tse_service._leer_formulario_bs4(BeautifulSoup(html, 'html.parser')))
+        self.assertTrue(lxml['campos']['__VIEWSTATE'])
+
+    def test_resultado_y_cedula_no_encontrada(self):
+        from bs4 import BeautifulSoup
+        from lxml import html as lxml_html
+
+        from .services.tse_service import tse_service
+
+        for nombre in ('resultado', 'no_encontrada'):
+            with self.subTest(pagina=nombre):
+                html = self.pagina(nombre)
+                lxml = tse_service._parsear_resultado_lxml(lxml_html.document_fromstring(html), '109870654')
+                bs4 = tse_service._parsear_resultado(BeautifulSoup(html, 'html.parser'), '109870654')
+                self.assertEqual(lxml, bs4)
+
+                if nombre == 'resultado':
+                    self.assertTrue(lxml['valida'])
+                    self.assertTrue(lxml['nombre_completo'])
+                else:
+                    self.assertEqual(lxml, {'valida': False, 'error': tse_service.ERROR_NO_ENCONTRADA})
+
+
+@skipIf(not PIL_AVAILABLE, 'Pillow no está instalado')
+class NormalizadorImagenesTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        from .services.normalizador_imagenes import normalizador_imagenes
+
+        self.normalizador = normalizador_imagenes
+
+    def foto(self, tamano=(200, 100), **guardar):
+        from io import BytesIO
+
+        from PIL import Image
+
+        salida = BytesIO()
+        Image.new('RGB', tamano, 'red').save(salida, 'JPEG', **guardar)
+        return salida.getvalue()
+
+    def abrir(self, contenido):
+        from io import BytesIO
+
+        from PIL import Image
+
+        return Image.open(BytesIO(contenido))
+
+    def test_aplica_la_orientacion_y_quita_exif_y_gps(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Girada 90°: la foto real es vertical
+        exif.get_ifd(0x8825).update({1: 'N', 2: (9.0, 56.0, 0.0)})
+        original = self.foto(exif=exif.tobytes())
+        self.assertTrue(self.abrir(original).getexif().get_ifd(0x8825))
+
+        contenido, extension = self.normalizador.normalizar(original)
+        imagen = self.abrir(contenido)
+        self.assertEqual((extension, imagen.format), ('webp', 'WEBP'))
+        self.assertEqual(imagen.size, (100, 200))
+        self.assertEqual(dict(imagen.getexif()), {})
+        self.assertNotIn('exif', imagen.info)
+
+    @override_settings(IMAGEN_LADO_MAXIMO=64)
+    def test_limita_el_lado_mayor(self):
+        contenido, _ = self.normalizador.normalizar(self.foto((300, 150)))
+        self.assertEqual(self.abrir(contenido).size, (64, 32))
+
+    def test_gif_animado_pasa_sin_cambios(self):
+        from io import BytesIO
+
+        from PIL import Image
+
+        cuadros = [Image.new('RGB', (10, 10), color) for color in ('red', 'blue')]
+        salida = BytesIO()
+        cuadros[0].save(salida, 'GIF', save_all=True, append_images=cuadros[1:])
+        gif = salida.getvalue()
+        self.assertEqual(self.normalizador.normalizar(gif), (gif, None))
+
+    def test_bytes_que_no_son_imagen(self):
+        with self.assertRaises(ValueError):
+            self.normalizador.normalizar(b'esto no es una imagen')
+
+    def test_imagen_variantes_solo_para_cloudinary(self):
+        from .serializers import EventoSerializer
+
+        evento = self.crear_evento(imagen_id='64b7f0c2a1b2c3d4e5f60718')
+        self.assertIsNone(EventoSerializer(evento).data['imagen_variantes'])
+        evento.imagen_id = 'https://example.com/upload/afiche.jpg'
+        self.assertIsNone(EventoSerializer(evento).data['imagen_variantes'])
+
+        evento.imagen_id = 'https://res.cloudinary.com/demo/image/upload/v1/eventos/afiche.jpg'
+        variantes = EventoSerializer(evento).data['imagen_variantes']
+        self.assertEqual(
+            variantes['pequena'],
+            'https://res.cloudinary.com/demo/image/upload/c_limit,w_320,f_auto,q_auto/v1/eventos/afiche.jpg'
+        )
+
+
+@override_settings(IMAGENES_WORKER_EN_PROCESO=False)
+class ImagenesServiceTests(DatosPruebaMixin, TestCase):
+    URL = 'https://res.cloudinary.com/demo/image/upload/v1/eventos/nueva.webp'
+
+    def setUp(self):
+        from .services.imagenes_service import ImagenesService
+
+        self.servicio = ImagenesService(max_intentos=3, backoff_base=30)
+        self.evento = self.crear_evento()
+
+    def procesar(self, **stub):
+        with mock.patch.object(self.servicio, '_obtener_y_subir', **stub) as obtener_y_subir:
+            resumen = self.servicio.procesar_pendientes()
+        return resumen, obtener_y_subir
+
+    def vencer_espera(self, imagen):
+        from .models import ImagenPendiente
+
+        ImagenPendiente.objects.filter(pk=imagen.pk).update(disponible_en=timezone.now())
+
+    def test_imagen_lista(self):
+        imagen = self.servicio.encolar(self.evento, url='https://example.com/afiche.jpg')
+        resumen, _ = self.procesar(return_value=self.URL)
+
+        self.assertEqual(resumen, {'listas': 1, 'errores': 0})
+        imagen.refresh_from_db()
+        self.evento.refresh_from_db()
+        self.assertEqual(imagen.estado, 'completada')
+        self.assertEqual((self.evento.imagen_id, self.evento.imagen_estado), (self.URL, 'lista'))
+
+    def test_error_transitorio_se_reintenta_con_backoff(self):
+        imagen = self.servicio.encolar(self.evento, url='https://example.com/afiche.jpg')
+        esperas = []
+        for _ in range(2):
+            antes = timezone.now()
+            self.procesar(side_effect=RuntimeError('Cloudinary 503'))
+            imagen.refresh_from_db()
+            self.assertEqual(imagen.estado, 'pendiente')
+            esperas.append(round((imagen.disponible_en - antes).total_seconds()))
+            self.vencer_espera(imagen)
+        self.assertEqual(esperas, [30, 60])
+        self.assertEqual(imagen.intentos, 2)
+
+        # El ultimo intento agota los reintentos: lista de descarte
+        self.procesar(side_effect=RuntimeError('Cloudinary 503'))
+        imagen.refresh_from_db()
+        self.evento.refresh_from_db()
+        self.assertEqual((imagen.estado, imagen.intentos), ('fallida', 3))
+        self.assertEqual(self.evento.imagen_estado, 'fallida')
+
+    def test_error_permanente_va_directo_a_fallida(self):
+        from .services.imagenes_service import ImagenInvalida
+
+        imagen = self.servicio.encolar(self.evento, url='https://example.com/no-existe.jpg')
+        self.procesar(side_effect=ImagenInvalida('El servidor de la imagen respondió 404'))
+        imagen.refresh_from_db()
+        self.assertEqual((imagen.estado, imagen.intentos), ('fallida', 1))
+        self.assertIn('404', imagen.error)
+
+    def test_tomar_no_repite_y_reclama_las_abandonadas(self):
+        from .models import ImagenPendiente
+
+        imagen = self.servicio.encolar(self.evento, url='https://example.com/afiche.jpg')
+        self.assertEqual([i.pk for i in self.servicio._tomar(10)], [imagen.pk])
+        self.assertEqual(self.servicio._tomar(10), [])  # Otro worker no la vuelve a tomar
+
+        # El proceso que la tenia murio: pasado TIEMPO_RECLAMO se puede volver a tomar
+        ImagenPendiente.objects.filter(pk=imagen.pk).update(
+            tomado_en=timezone.now() - self.servicio.TIEMPO_RECLAMO - timedelta(seconds=1)
+        )
+        self.assertEqual([i.pk for i in self.servicio._tomar(10)], [imagen.pk])
+
+    def test_imagen_reemplazada_no_pisa_la_nueva(self):
+        vieja = self.servicio.encolar(self.evento, url='https://example.com/vieja.jpg')
+        (tomada,) = self.servicio._tomar(10)
+        nueva = self.servicio.encolar(self.evento, url='https://example.com/nueva.jpg')
+
+        # La vieja termina despues de que llego la nueva: no se aplica
+        self.servicio._guardar_resultado(tomada, url='https://res.cloudinary.com/demo/image/upload/vieja.webp')
+        vieja.refresh_from_db()
+        self.evento.refresh_from_db()
+        self.assertEqual(vieja.estado, 'reemplazada')
+        self.assertEqual((self.evento.imagen_id, self.evento.imagen_estado), (None, 'pendiente'))
+
+        self.procesar(return_value=self.URL)
+        nueva.refresh_from_db()
+        self.evento.refresh_from_db()
+        self.assertEqual(nueva.estado, 'completada')
+        self.assertEqual(self.evento.imagen_id, self.URL)
+
+
+class GridOutFalso:
+    """Lo que EventoImagenView usa de un GridOut de pymongo, sobre bytes en memoria."""
+
+    def __init__(self, contenido, chunk_size=4):
+        from datetime import datetime
+        from io import BytesIO
+
+        self._datos = BytesIO(contenido)
+        self._id = '64b7f0c2a1b2c3d4e5f60718'
+        self.length = len(contenido)
+        self.chunk_size = chunk_size
+        self.upload_date = datetime(2024, 5, 1, 12, 0)
+        self.metadata = {'contentType': 'image/webp'}
+        self.content_type = None
+        self.cerrado = False
+
+    def seek(self, posicion):
+        self._datos.seek(posicion)
+
+    def read(self, tamano):
+        return self._datos.read(tamano)
+
+    def close(self):
+        self.cerrado = True
+
+
+class EventoImagenViewTests(TestCase):
+    URL = '/api/Evento/imagen/64b7f0c2a1b2c3d4e5f60718/'
+
+    def pedir(self, contenido=b'0123456789', **cabeceras):
+        from .mongo_utils import utilidades_mongo
+
+        self.archivo = GridOutFalso(contenido)
+        with mock.patch('api.views.PYMONGO_AVAILABLE', True), \
+                mock.patch.object(utilidades_mongo, 'obtener_archivo', return_value=self.archivo):
+            return self.client.get(self.URL, **cabeceras)
+
+    def contenido(self, respuesta):
+        return b''.join(respuesta.streaming_content)
+
+    def test_archivo_completo(self):
+        respuesta = self.pedir()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.contenido(respuesta), b'0123456789')
+        self.assertEqual(respuesta['Content-Length'], '10')
+        self.assertEqual(respuesta['Content-Type'], 'image/webp')
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertEqual(respuesta['ETag'], '"64b7f0c2a1b2c3d4e5f60718-10"')
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertFalse(respuesta.has_header('Content-Range'))
+
+    def test_rango(self):
+        respuesta = self.pedir(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(self.contenido(respuesta), b'2345')
+        self.assertEqual(respuesta['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(respuesta['Content-Length'], '4')
+
+        respuesta = self.pedir(HTTP_RANGE='bytes=-3')
+        self.assertEqual(self.contenido(respuesta), b'789')
+        self.assertEqual(respuesta['Content-Range'], 'bytes 7-9/10')
+
+    def test_rango_fuera_del_archivo(self):
+        respuesta = self.pedir(HTTP_RANGE='bytes=10-')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], 'bytes */10')
+        self.assertTrue(self.archivo.cerrado)
+
+    def test_if_range_de_otra_version_envia_el_archivo_completo(self):
+        respuesta = self.pedir(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"otra-version"')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.contenido(respuesta), b'0123456789')
+
+    def test_no_modificada(self):
+        etag = self.pedir()['ETag']
+        respuesta = self.pedir(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        self.assertTrue(self.archivo.cerrado)
+
+        respuesta = self.pedir(HTTP_IF_MODIFIED_SINCE='Wed, 01 May 2024 12:00:00 GMT')
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_archivo_vacio(self):
+        respuesta = self.pedir(b'')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Length'], '0')
+        self.assertEqual(self.contenido(respuesta), b'')
+
+        self.assertEqual(self.pedir(b'', HTTP_RANGE='bytes=0-').status_code, 416)
+
+    def test_imagen_inexistente(self):
+        from .mongo_utils import utilidades_mongo
+
+        with mock.patch('api.views.PYMONGO_AVAILABLE', True), \
+                mock.patch.object(utilidades_mongo, 'obtener_archivo', return_value=None):
+            self.assertEqual(self.client.get(self.URL).status_code, 404)
+
+
+class CuposServiceTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        self.evento = self.crear_evento(cupo_maximo=2, cupos_disponibles=2)
+        self.inscripciones = [
+            Inscripcion.objects.create(usuario=self.crear_usuario(f'u{i}'), evento=self.evento)
+            for i in range(3)
+        ]
+
+    def test_no_confirma_sin_cupos(self):
+        from .services.cupos_service import SinCuposDisponibles, cupos_service
+
+        cupos_service.cambiar_estado(self.inscripciones[0], 'confirmada')
+        cupos_service.cambiar_estado(self.inscripciones[1], 'confirmada')
+        with self.assertRaises(SinCuposDisponibles):
+            cupos_service.cambiar_estado(self.inscripciones[2], 'confirmada')
+
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.cupos_disponibles, 0)
+        self.assertEqual(Inscripcion.objects.filter(estado='confirmada').count(), 2)
+
+    def test_confirmar_dos_veces_reserva_un_cupo(self):
+        from .services.cupos_service import cupos_service
+
+        self.assertTrue(cupos_service.cambiar_estado(self.inscripciones[0], 'confirmada'))
+        self.assertFalse(cupos_service.cambiar_estado(self.inscripciones[0], 'confirmada'))
+        cupos_service.cambiar_estado(self.inscripciones[0], 'cancelada')
+        cupos_service.cambiar_estado(self.inscripciones[0], 'cancelada')
+
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.cupos_disponibles, 2)
+
+    def test_lote_confirma_las_primeras_que_caben(self):
+        from .services.cupos_service import cupos_service
+
+        ids = [i.pk for i in self.inscripciones]
+        resultados = cupos_service.cambiar_lote(ids, estado='confirmada')
+
+        self.assertEqual([r['success'] for r in resultados], [True, True, False])
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.cupos_disponibles, 0)
+
+
+# SQLite serializa las escrituras y bloquea la tabla entre hilos
+@skipIf(connection.vendor == 'sqlite', 'Requiere PostgreSQL o MySQL')
+class CuposConcurrenciaTests(DatosPruebaMixin, TransactionTestCase):
+
+    def test_confirmaciones_simultaneas_no_sobrevenden(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        from .services.cupos_service import SinCuposDisponibles, cupos_service
+
+        evento = self.crear_evento(cupo_maximo=5, cupos_disponibles=5)
+        Usuario.objects.bulk_create([Usuario(username=f'c{i}') for i in range(30)])
+        Inscripcion.objects.bulk_create([Inscripcion(usuario=u, evento=evento) for u in Usuario.objects.all()])
+        arranque = threading.Event()
+
+        def confirmar(inscripcion):
+            arranque.wait()
+            try:
+                return cupos_service.cambiar_estado(inscripcion, 'confirmada')
+            except SinCuposDisponibles:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futuros = [executor.submit(confirmar, i) for i in Inscripcion.objects.filter(evento=evento)]
+            arranque.set()
+            confirmadas = sum(futuro.result() for futuro in futuros)
+
+        evento.refresh_from_db()
+        self.assertEqual(confirmadas, 5)
+        self.assertEqual(evento.cupos_disponibles, 0)
+        self.assertEqual(Inscripcion.objects.filter(evento=evento, estado='confirmada').count(), 5)
+
+
+class InscripcionLoteViewTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.crear_admin())
+        self.inscripcion = Inscripcion.objects.create(usuario=self.crear_usuario('ana'), evento=self.crear_evento())
+
+    def test_estado_que_no_es_texto_responde_400(self):
+        for estado in (['confirmada'], {'valor': 'confirmada'}, 1):
+            respuesta = self.cliente.post(
+                '/api/Inscripcion/lote/', {'ids': [self.inscripcion.pk], 'estado': estado}, format='json'
+            )
+            self.assertEqual(respuesta.status_code, 400, estado)
+
+    def test_cambia_estado_y_asistencia(self):
+        respuesta = self.cliente.post(
+            '/api/Inscripcion/lote/', {'ids': [self.inscripcion.pk], 'estado': 'confirmada', 'asistio': True},
+            format='json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['actualizadas'], 1)
+        self.inscripcion.refresh_from_db()
+        self.assertEqual((self.inscripcion.estado, self.inscripcion.asistio), ('confirmada', True))
+
+
+class EnviarCodigoVerificacionTests(TestCase):
+
+    def test_responde_que_el_correo_esta_en_cola(self):
+        from rest_framework.test import APIClient
+
+        # Dentro de TestCase on_commit no corre, asi que el worker no intenta el envio
+        respuesta = APIClient().post('/api/enviar-codigo/', {'email': 'nuevo@example.com'}, format='json')
+
+        self.assertEqual(respuesta.status_code, 202)
+        datos = respuesta.json()
+        self.assertIn('cola', datos['message'])
+        self.assertEqual(datos['estado_url'], f"/api/enviar-codigo/{datos['envio_id']}/")
+        self.assertEqual(APIClient().get(datos['estado_url']).json()['estado'], datos['estado'])
+
+
+@override_settings(PRESUPUESTO_CONSULTAS_ACTIVO=True, PRESUPUESTO_CONSULTAS_ESTRICTO=True)
+class PresupuestoConsultasTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.cliente = APIClient()
+        categorias = [CategEvento.objects.create(nombre=f'Categoria {i}') for i in range(3)]
+        for i in range(10):
+            usuario = self.crear_usuario(f'usuario{i}')
+            usuario.intereses.set(categorias)
+
+    def test_listado_de_usuarios_dentro_del_presupuesto(self):
+        self.autenticar(self.cliente, self.crear_admin())
+        respuesta = self.cliente.get('/api/User/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertLessEqual(int(respuesta['X-DB-Queries']), 5)
+
+        respuesta = self.cliente.get('/api/User/', {'page_size': 5})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertLessEqual(int(respuesta['X-DB-Queries']), 5)
+
+    def test_mis_inscripciones_dentro_del_presupuesto(self):
+        usuario = Usuario.objects.get(username='usuario0')
+        categoria = CategEvento.objects.first()
+        for i in range(5):
+            Inscripcion.objects.create(usuario=usuario, evento=self.crear_evento(categoria=categoria, nombre=f'E{i}'))
+        self.autenticar(self.cliente, usuario)
+
+        respuesta = self.cliente.get('/api/Inscripcion/mis-inscripciones/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()), 5)
+        self.assertLessEqual(int(respuesta['X-DB-Queries']), 2)
+
+        respuesta = self.cliente.get('/api/Inscripcion/mis-inscripciones/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_vista_que_se_pasa_del_presupuesto_falla(self):
+        from .middleware import PresupuestoConsultasExcedido
+        from .views import UserListCreateView
+
+        self.autenticar(self.cliente, self.crear_admin())
+        with mock.patch.object(UserListCreateView, 'presupuesto_consultas', 1), \
+                self.assertLogs('api.consultas', 'WARNING'), self.assertLogs('django.request', 'ERROR'):
+            with self.assertRaises(PresupuestoConsultasExcedido):
+                self.cliente.get('/api/User/')
+
+
+class LoginRolTests(DatosPruebaMixin, TestCase):
+
+    def test_con_varios_grupos_el_rol_es_admin(self):
+        from django.contrib.auth.models import Group
+        from rest_framework.test import APIClient
+
+        usuario = self.crear_admin('ana')
+        usuario.set_password('Clave-segura-123')
+        usuario.save()
+        usuario.groups.add(Group.objects.create(name='auditor'), Group.objects.get_or_create(name='cliente')[0])
+
+        respuesta = APIClient().post('/api/token/', {'username': 'ana', 'password': 'Clave-segura-123'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['role'], 'admin')
+
+    def test_rol_principal(self):
+        from .permissions import rol_principal
+
+        self.assertEqual(rol_principal({'cliente', 'auditor'}), 'cliente')
+        self.assertEqual(rol_principal({'b', 'a'}), 'a')
+        self.assertIsNone(rol_principal(frozenset()))
+
+
+class UsuarioTokenTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.cliente = APIClient()
+
+    def lecturas_de_usuario(self, consultas):
+        return [q['sql'] for q in consultas.captured_queries
+                if q['sql'].startswith('SELECT') and 'FROM "api_usuario"' in q['sql']]
+
+    def token(self, usuario):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from .authentication import UsuarioToken
+        from .serializers import CustomTokenObtainPairSerializer
+
+        acceso = CustomTokenObtainPairSerializer.get_token(usuario).access_token
+        return UsuarioToken(AccessToken(str(acceso)))
+
+    def test_peticion_autenticada_no_lee_el_usuario(self):
+        from django.test.utils import CaptureQueriesContext
+
+        from .cloudinary_utils import cloudinary_utils
+
+        evento = self.crear_evento()
+        ana = self.crear_usuario('ana')
+        self.autenticar(self.cliente, ana)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.cliente.post('/api/Inscripcion/', {'evento': evento.id}, format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertEqual(Inscripcion.objects.get().usuario_id, ana.id)  # El FK se asigna por id
+        self.assertEqual(self.lecturas_de_usuario(consultas), [])
+
+        # Permisos de admin/staff desde los claims de roles
+        self.autenticar(self.cliente, self.crear_admin())
+        with CaptureQueriesContext(connection) as consultas, \
+                mock.patch.object(cloudinary_utils, 'esta_configurado', return_value=True), \
+                mock.patch.object(cloudinary_utils, 'firmar_subida', return_value={'firma': 'x'}):
+            self.assertEqual(self.cliente.post('/api/Evento/imagen/firma/').status_code, 200)
+        self.assertEqual(consultas.captured_queries, [])
+
+    def test_atributos_fuera_del_token_se_leen_de_la_bd(self):
+        from rest_framework.exceptions import AuthenticationFailed
+
+        ana = self.crear_usuario('ana', telefono='8888-0000')
+        usuario = self.token(ana)
+        with self.assertNumQueries(0):
+            self.assertEqual((usuario.id, usuario.username, usuario.is_staff), (ana.id, 'ana', False))
+            self.assertFalse(usuario.debe_cambiar_password)
+            self.assertEqual(usuario, ana)
+        with self.assertNumQueries(1):
+            self.assertEqual(usuario.email, 'ana@example.com')
+            self.assertEqual(usuario.telefono, '8888-0000')  # El Usuario ya quedo cargado
+        with self.assertRaises(AttributeError):
+            usuario.no_existe
+
+        borrado = self.token(self.crear_usuario('beto'))
+        Usuario.objects.filter(username='beto').delete()
+        with self.assertRaises(AuthenticationFailed):
+            borrado.email
+
+    def test_usuario_token_no_sirve_como_fk(self):
+        # Por eso las vistas guardan `usuario_id=request.user.id` (ver api/authentication.py)
+        usuario = self.token(self.crear_usuario('ana'))
+        with self.assertRaises(ValueError):
+            Inscripcion(usuario=usuario)
+
+
+class CacheReferenciaTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        from .models import ConfiguracionPerfil
+
+        # La primera lectura de la configuracion crea la fila y su post_save invalida la cache
+        ConfiguracionPerfil.objects.get_or_create(id=1)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def escrituras(self):
+        """(url, tabla, escritura que debe invalidarla)"""
+        from .models import ConfiguracionPerfil
+
+        def configuracion():
+            config = ConfiguracionPerfil.objects.get(pk=1)
+            config.email_editable = not config.email_editable
+            config.save()
+
+        return [
+            ('/api/CategEvento/', 'categorias', lambda: CategEvento.objects.create(nombre='Ciclismo')),
+            ('/api/Ubicacion/', 'ubicaciones',
+             lambda: Ubicacion.objects.create(recinto='Gimnasio', direccion='https://maps.example.com/gimnasio')),
+            ('/api/configuracion/perfil/', 'configuracion_perfil', configuracion),
+        ]
+
+    def test_etag_304_y_cambio_de_version(self):
+        from .services.cache_referencia import cache_referencia
+
+        for url, tabla, escribir in self.escrituras():
+            with self.subTest(tabla=tabla):
+                primera = self.client.get(url)
+                self.assertEqual(primera.status_code, 200)
+                etag = primera['ETag']
+                self.assertIn('must-revalidate', primera['Cache-Control'])
+
+                # Desde la cache: 304 con el ETag vigente y 200 sin el, sin consultar la BD
+                with self.assertNumQueries(0):
+                    no_modificada = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(self.client.get(url).json(), primera.json())
+                self.assertEqual(no_modificada.status_code, 304)
+                self.assertEqual(no_modificada['ETag'], etag)
+
+                version = cache_referencia.version(tabla)
+                escribir()
+                self.assertEqual(cache_referencia.version(tabla), version + 1)
+
+                nueva = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(nueva.status_code, 200)
+                self.assertNotEqual(nueva['ETag'], etag)
+                self.assertNotEqual(nueva.json(), primera.json())
+
+    def test_con_parametros_no_usa_la_cache(self):
+        self.client.get('/api/CategEvento/')
+        CategEvento.objects.bulk_create([CategEvento(nombre='Sin señales')])  # No invalida
+        self.assertEqual(len(self.client.get('/api/CategEvento/').json()), 0)
+        self.assertEqual(len(self.client.get('/api/CategEvento/', {'page_size': 10}).json()['results']), 1)
+
+
+class CloudinaryFirmaTests(DatosPruebaMixin, TestCase):
+
+    def firmar(self, usuario):
+        from rest_framework.test import APIClient
+
+        from .cloudinary_utils import cloudinary_utils
+
+        cliente = APIClient()
+        self.autenticar(cliente, usuario)
+        with mock.patch.object(cloudinary_utils, 'esta_configurado', return_value=True), \
+                mock.patch.object(cloudinary_utils, 'firmar_subida', return_value={'firma': 'x'}):
+            return cliente.post('/api/Evento/imagen/firma/')
+
+    def test_staff_y_admin_pueden_firmar(self):
+        self.assertEqual(self.firmar(self.crear_usuario('staff', is_staff=True)).status_code, 200)
+        self.assertEqual(self.firmar(self.crear_admin()).status_code, 200)
+
+    def test_usuario_comun_no_puede_firmar(self):
+        self.assertEqual(self.firmar(self.crear_usuario('ana')).status_code, 403)
+
+
+@override_settings(ESTADISTICAS_REFRESCO_EN_PROCESO=False)
+class EstadisticasSnapshotTests(DatosPruebaMixin, TestCase):
+
+    def setUp(self):
+        from .services.estadisticas_service import estadisticas_service
+
+        self.servicio = estadisticas_service
+        self.servicio.refrescar()
+
+    def vencer_snapshot(self):
+        from .models import EstadisticasSnapshot
+
+        EstadisticasSnapshot.objects.filter(pk=1).update(
+            generado_en=timezone.now() - self.servicio.antiguedad_maxima - timedelta(seconds=1)
+        )
+
+    def test_snapshot_vencido_se_sirve_sin_recalcular(self):
+        self.vencer_snapshot()
+        with mock.patch.object(self.servicio, 'calcular') as calcular, \
+                mock.patch.object(self.servicio.trabajador, 'despertar') as despertar:
+            snapshot = self.servicio.obtener()
+        calcular.assert_not_called()
+        despertar.assert_called_once()
+        self.assertEqual(snapshot.version, 1)
+
+    def test_un_solo_recalculo_a_la_vez(self):
+        self.vencer_snapshot()
+        self.assertTrue(self.servicio._tomar_refresco())
+        self.assertIsNone(self.servicio.refrescar())
+        snapshot, recalculado = self.servicio.refrescar_si_necesario()
+        self.assertFalse(recalculado)
+        self.assertEqual(snapshot.version, 1)
+
+    def test_login_no_invalida_el_snapshot(self):
+        from .models import EstadisticasSnapshot
+
+        usuario = self.crear_usuario('ana')
+        self.servicio.refrescar()
+        usuario.last_login = timezone.now()
+        usuario.save(update_fields=['last_login'])
+        self.assertFalse(EstadisticasSnapshot.objects.get(pk=1).invalidado)
+
+        usuario.first_name = 'Ana'
+        usuario.save()
+        self.assertTrue(EstadisticasSnapshot.objects.get(pk=1).invalidado)
+
+
+class IndiceImagenesTests(TestCase):
+
+    def setUp(self):
+        from .services.indice_imagenes import indice_imagenes
+
+        self.indice = indice_imagenes
+        base = 'https://res.cloudinary.com/demo/image/upload/v1/eventos/'
+        self.indice.registrar('a' * 64, base + 'afiche.jpg')
+        self.indice.registrar('b' * 64, base + 'afiche-2.jpg')
+
+    def referencias(self):
+        from .models import ImagenIndice
+
+        return sorted(r.rsplit('/', 1)[1] for r in ImagenIndice.objects.values_list('referencia', flat=True))
+
+    def test_liberar_public_id_no_toca_prefijos(self):
+        self.assertTrue(self.indice.liberar_public_id('eventos/afiche'))
+        self.assertEqual(self.referencias(), ['afiche-2.jpg'])
+
+    def test_imagen_reutilizada_no_se_elimina_de_cloudinary(self):
+        from .cloudinary_utils import cloudinary_utils
+
+        self.indice.buscar('a' * 64)  # Segundo uso del mismo afiche
+        with mock.patch('cloudinary.uploader.destroy', return_value={'result': 'ok'}) as destroy:
+            cloudinary_utils.eliminar_archivo('eventos/afiche')
+            destroy.assert_not_called()
+            self.assertEqual(self.referencias(), ['afiche-2.jpg', 'afiche.jpg'])
+
+            cloudinary_utils.eliminar_archivo('eventos/afiche')
+            destroy.assert_called_once_with('eventos/afiche')
+            self.assertEqual(self.referencias(), ['afiche-2.jpg'])
+
+    def test_el_otro_evento_conserva_la_imagen_compartida(self):
+        from .cloudinary_utils import cloudinary_utils
+
+        url = 'https://res.cloudinary.com/demo/image/upload/v1/eventos/poster.png'
+        subir = mock.Mock(return_value=url)
+        # Dos eventos reciben el mismo afiche: se sube una sola vez
+        self.assertEqual(self.indice.obtener_o_subir(b'poster', subir), url)
+        self.assertEqual(self.indice.obtener_o_subir(b'poster', subir), url)
+        subir.assert_called_once()
+
+        with mock.patch('cloudinary.uploader.destroy') as destroy:
+            cloudinary_utils.eliminar_archivo('eventos/poster')  # El primer evento la quita
+        destroy.assert_not_called()
+        # El segundo evento sigue usando la misma URL y un reenvio no vuelve a subir
+        self.assertEqual(self.indice.obtener_o_subir(b'poster', subir), url)
+        subir.assert_called_once()
+
+
+class IndiceImagenesGridFSTests(TestCase):
+
+    def setUp(self):
+        from .services.indice_imagenes import indice_imagenes
+        from .services.mongo_cliente import mongo_cliente
+
+        self.indice = indice_imagenes
+        self.archivo_id = '64b7f0c2a1b2c3d4e5f60718'
+        self.indice.registrar('c' * 64, self.archivo_id, almacen='gridfs')
+        self.bucket = mock.Mock()
+        parche = mock.patch.object(mongo_cliente, 'bucket', return_value=self.bucket)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_borrar_de_gridfs_quita_la_referencia_del_indice(self):
+        from .services.mongo_service import mongo_service
+
+        self.assertTrue(mongo_service.delete_image(self.archivo_id))
+        self.bucket.delete.assert_called_once()
+        self.assertIsNone(self.indice.buscar('c' * 64, almacen='gridfs'))
+
+    def test_imagen_reutilizada_no_se_borra_de_gridfs(self):
+        from .models import ImagenIndice
+        from .services.mongo_service import mongo_service
+
+        self.indice.buscar('c' * 64, almacen='gridfs')  # Segundo uso
+        self.assertTrue(mongo_service.delete_image(self.archivo_id))
+        self.bucket.delete.assert_not_called()
+        self.assertEqual(
+            list(ImagenIndice.objects.values_list('referencia', 'usos')), [(self.archivo_id, 1)]
+        )
+
+        mongo_service.delete_image(self.archivo_id)
+        self.bucket.delete.assert_called_once()
+
+
+class FiltroDiasSemanaTests(DatosPruebaMixin, TestCase):
+
+    def test_filtra_por_cualquiera_de_los_dias(self):
+        from rest_framework.test import APIClient
+
+        categoria = CategEvento.objects.create(nombre='Natacion')
+        lunes = self.crear_evento(categoria, nombre='Lunes', dias_semana=['lunes', 'miércoles'])
+        sabado = self.crear_evento(categoria, lunes.ubicacion, nombre='Sabado', dias_semana=['sabado'])
+        self.crear_evento(categoria, lunes.ubicacion, nombre='Sabados', dias_semana=['sabados'])
+
+        respuesta = APIClient().get('/api/Evento/', {'dias_semana': 'Miércoles,sabado'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([e['id'] for e in respuesta.json()], [lunes.id, sabado.id])
+
+
+class ListadosTests(DatosPruebaMixin, TestCase):
+    """Paginacion por cursor, filtros de servidor, orden y sparse fieldsets."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.cliente = APIClient()
+        categoria = CategEvento.objects.create(nombre='Natacion')
+        primero = self.crear_evento(categoria, nombre='Evento 0')
+        self.eventos = [primero] + [
+            self.crear_evento(categoria, primero.ubicacion, nombre=f'Evento {i}') for i in range(1, 5)
+        ]
+
+    def recorrer(self, url, params):
+        """Ids de todas las paginas siguiendo el link 'next'."""
+        respuesta = self.cliente.get(url, params)
+        ids = []
+        for _ in range(50):  # Un cursor que no avanza repetiria paginas para siempre
+            self.assertEqual(respuesta.status_code, 200)
+            pagina = respuesta.json()
+            self.assertLessEqual(len(pagina['results']), params['page_size'])
+            ids += [fila['id'] for fila in pagina['results']]
+            if not pagina['next']:
+                return ids
+            respuesta = self.cliente.get(pagina['next'])
+        self.fail(f'El cursor no termina: {len(ids)} filas, {len(set(ids))} distintas')
+
+    def test_cursor_recorre_todos_los_eventos_sin_repetir(self):
+        ids = self.recorrer('/api/Evento/', {'page_size': 2})
+        self.assertEqual(ids, [e.id for e in self.eventos])
+
+    def test_sin_page_size_devuelve_la_lista_completa(self):
+        respuesta = self.cliente.get('/api/Evento/')
+        self.assertEqual(len(respuesta.json()), 5)
+
+    def test_orden_por_calificacion(self):
+        promedios = [3.0, 5.0, 0, 4.5, 5.0]
+        for evento, promedio in zip(self.eventos, promedios):
+            Evento.objects.filter(pk=evento.pk).update(
+                promedio_calificacion=promedio, total_resenas=2 if evento is self.eventos[4] else 1
+            )
+        ids = self.recorrer('/api/Evento/', {'page_size': 2, 'ordenar': 'calificacion'})
+        e = self.eventos
+        self.assertEqual(ids, [e[4].id, e[1].id, e[3].id, e[0].id, e[2].id])
+
+        self.assertEqual(self.cliente.get('/api/Evento/', {'ordenar': 'nombre'}).status_code, 400)
+
+    def test_cursor_por_calificacion_con_mas_de_1000_empates(self):
+        # CursorPagination de DRF solo guarda la primera columna y recorre los
+        # empates con OFFSET (tope 1000): con mas empates no terminaba nunca
+        base = self.eventos[0]
+        Evento.objects.bulk_create([
+            Evento(nombre=f'Sin reseñas {i}', categoria=base.categoria, ubicacion=base.ubicacion,
+                   fecha_inicio=base.fecha_inicio, fecha_fin=base.fecha_fin, hora_inicio=base.hora_inicio,
+                   hora_fin=base.hora_fin, cupo_maximo=10, cupos_disponibles=10)
+            for i in range(1225)
+        ])
+        Evento.objects.filter(pk=self.eventos[2].pk).update(promedio_calificacion=4.5, total_resenas=3)
+        esperados = list(Evento.objects.order_by('-promedio_calificacion', '-total_resenas', 'id')
+                         .values_list('id', flat=True))
+        self.assertEqual(len(esperados), 1230)
+
+        ids = self.recorrer('/api/Evento/', {'page_size': 100, 'ordenar': 'calificacion'})
+        self.assertEqual(ids, esperados)
+
+        # Hacia atras con 'previous' desde la ultima pagina
+        respuesta = self.cliente.get('/api/Evento/', {'page_size': 100, 'ordenar': 'calificacion'})
+        while respuesta.json()['next']:
+            ultima = respuesta.json()
+            respuesta = self.cliente.get(ultima['next'])
+        anteriores = self.cliente.get(respuesta.json()['previous']).json()
+        self.assertEqual([e['id'] for e in anteriores['results']], esperados[1100:1200])
+
+    def test_cursor_invalido(self):
+        respuesta = self.cliente.get('/api/Evento/', {'page_size': 2, 'cursor': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_filtros_de_eventos(self):
+        Evento.objects.filter(pk=self.eventos[0].pk).update(estado='finalizado')
+        respuesta = self.cliente.get('/api/Evento/', {'estado': 'finalizado'})
+        self.assertEqual([e['id'] for e in respuesta.json()], [self.eventos[0].id])
+
+        hoy = timezone.localdate()
+        Evento.objects.filter(pk=self.eventos[1].pk).update(fecha_inicio=hoy + timedelta(days=100),
+                                                            fecha_fin=hoy + timedelta(days=101))
+        respuesta = self.cliente.get('/api/Evento/', {'fecha_inicio': str(hoy + timedelta(days=90))})
+        self.assertEqual([e['id'] for e in respuesta.json()], [self.eventos[1].id])
+
+        self.assertEqual(self.cliente.get('/api/Evento/', {'estado': 'borrado'}).status_code, 400)
+        self.assertEqual(self.cliente.get('/api/Evento/', {'categoria': 'x'}).status_code, 400)
+        self.assertEqual(self.cliente.get('/api/Evento/', {
+            'fecha_inicio': str(hoy), 'fecha_fin': str(hoy - timedelta(days=1))
+        }).status_code, 400)
+
+    def test_filtros_y_cursor_de_inscripciones(self):
+        admin = self.crear_admin()
+        ana = self.crear_usuario('ana')
+        for evento in self.eventos:
+            Inscripcion.objects.create(usuario=ana, evento=evento, estado='pendiente')
+        Inscripcion.objects.create(usuario=admin, evento=self.eventos[0], estado='confirmada')
+        self.autenticar(self.cliente, admin)
+
+        ids = self.recorrer('/api/Inscripcion/', {'page_size': 2, 'usuario': ana.id, 'estado': 'pendiente'})
+        esperados = Inscripcion.objects.filter(usuario=ana).order_by('-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(esperados))
+
+        respuesta = self.cliente.get('/api/Inscripcion/', {'asistio': 'quizas'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_sparse_fieldsets(self):
+        admin = self.crear_admin()
+        self.autenticar(self.cliente, admin)
+
+        respuesta = self.cliente.get('/api/User/', {'campos': 'id,username'})
+        self.assertEqual(respuesta.json(), [{'id': admin.id, 'username': 'admin'}])
+
+        respuesta = self.cliente.get('/api/User/', {'campos': 'id,password'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_crear_evento_sin_imagen(self):
+        self.autenticar(self.cliente, self.crear_admin())
+        evento = self.eventos[0]
+        respuesta = self.cliente.post('/api/Evento/', {
+            'nombre': 'Nuevo', 'categoria': evento.categoria_id, 'ubicacion': evento.ubicacion_id,
+            'fecha_inicio': str(evento.fecha_inicio), 'fecha_fin': str(evento.fecha_fin),
+            'hora_inicio': '08:00', 'hora_fin': '10:00', 'cupo_maximo': 5, 'cupos_disponibles': 5,
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertEqual(respuesta.json()['nombre'], 'Nuevo')
@@ -1,17 +1,18 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     RegisterView, CustomTokenObtainPairView, UserGroupView,
     UserListCreateView, UserDetailView,
     CategEventoListCreateView, CategEventoDetailView, CategEventoPopularesView,
     UbicacionListCreateView, UbicacionDetailView,
-    InscripcionListCreateView, InscripcionDetailView, MisInscripcionesView,
-    EventoListCreateView, EventoDetailView,
+    InscripcionListCreateView, InscripcionDetailView, MisInscripcionesView, InscripcionLoteView,
+    EventoListCreateView, EventoDetailView, CloudinaryFirmaView, EventoImagenView,
     ResenaListCreateView, ResenaDetailView,
     ContactoListCreateView,
     ConfiguracionPerfilView,
-    ValidarCedulaTSEView,
+    ValidarCedulaTSEView, ValidarCedulaTSELoteView,
     EstadisticasView,
-    EnviarCodigoVerificacionView, VerificarCodigoView,
+    EnviarCodigoVerificacionView, EstadoEnvioCorreoView, VerificarCodigoView,
     GenerarCodigoWhatsAppView, ValidarCodigoWhatsAppView, VerificarAutorizacionView,
     # CrearSuperUsuarioView, SeedDataView
 )
@@ -22,6 +23,7 @@ urlpatterns = [
     # auth y roles
     path('register/', RegisterView.as_view(), name="registro de usuarios"),
     path('token/', CustomTokenObtainPairView.as_view(), name="login token"),
+    path('token/refresh/', TokenRefreshView.as_view(), name="refrescar token"),
     path('usergroup/', UserGroupView.as_view(), name="asignar roles"),
 
     # user (autenticacion)
@@ -46,20 +48,25 @@ urlpatterns = [
     path('Inscripcion/', InscripcionListCreateView.as_view(), name="crear y listar inscripciones"),
     path('Inscripcion/<int:pk>/', InscripcionDetailView.as_view(), name="actualizar y eliminar inscripcion"),
     path('Inscripcion/mis-inscripciones/', MisInscripcionesView.as_view(), name="mis inscripciones"),
+    path('Inscripcion/lote/', InscripcionLoteView.as_view(), name="cambio masivo de inscripciones"),
 
     # Eventos
     path('Evento/', EventoListCreateView.as_view(), name="crear y listar eventos"),
     path('Evento/<int:pk>/', EventoDetailView.as_view(), name="detalle evento"),
-    # Nota: El endpoint de imagen ya no es necesario con Cloudinary, las imágenes se sirven directamente desde Cloudinary
+    path('Evento/imagen/firma/', CloudinaryFirmaView.as_view(), name="firma subida imagen evento"),
+    # Las imágenes nuevas se sirven directo desde Cloudinary; este endpoint es para las antiguas en GridFS
+    path('Evento/imagen/<str:imagen_id>/', EventoImagenView.as_view(), name="imagen evento gridfs"),
 
     # Configuracion Global
     path('configuracion/perfil/', ConfiguracionPerfilView.as_view(), name="configuracion perfil"),
     # Validación TSE
     path('validar-cedula/', ValidarCedulaTSEView.as_view(), name="validar cedula TSE"),
+    path('validar-cedula/lote/', ValidarCedulaTSELoteView.as_view(), name="validar cedulas TSE por lote"),
     # Estadísticas para el admin
     path('estadisticas/', EstadisticasView.as_view(), name="estadisticas dashboard"),
     # Validación del Email
     path('enviar-codigo/', EnviarCodigoVerificacionView.as_view(), name="enviar codigo verificacion"),
+    path('enviar-codigo/<uuid:token>/', EstadoEnvioCorreoView.as_view(), name="estado envio codigo verificacion"),
     path('verificar-codigo/', VerificarCodigoView.as_view(), name="verificar codigo"),
     # Endpoint para n8n (automatizaciones)
     path('n8n/crear-evento/', N8NCrearEventoView.as_view(), name="n8n crear evento"),
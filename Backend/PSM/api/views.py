@@ -9,33 +9,109 @@ from .serializers import *
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
-from .permissions import IsAdminUser, IsAdminOrReadOnly, IsAdminOrSelf, IsOwnerOrAdmin # chequeo 
+from .permissions import IsAdminUser, IsAdminOrReadOnly, IsAdminOrSelf, IsAdminOrStaff, IsOwnerOrAdmin, es_admin # chequeo 
+# paginacion por cursor y filtros de servidor
+from .pagination import EventoCursorPaginacion, MisInscripcionesCursorPaginacion
+from .filters import (
+    filtrar_contactos, filtrar_eventos, filtrar_inscripciones, filtrar_resenas, filtrar_usuarios, orden_eventos
+)
 Usuario = get_user_model()
+# Servicios con dependencias pesadas: se importan en el primer uso (ver services/registro.py)
+from .services.registro import (
+    brevo_service, cloudinary_utils, imagenes_service, outbox_service, tse_service, utilidades_mongo
+)
 # importes necesarios para evento
-from .cloudinary_utils import cloudinary_utils
-from django.http import HttpResponse
-from django.db.models import Count, Avg, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
-# TSE Service para validación de cédulas
-from .services.tse_service import tse_service
-# Brevo Service para emails
-from .services.brevo_service import brevo_service
+import json
+import logging
+import time
+from django.conf import settings
+# Snapshot de estadisticas del dashboard
+from .services.estadisticas_service import estadisticas_service
+# Reserva atomica de cupos
+from .services.cupos_service import cupos_service, SinCuposDisponibles
+from .services.mis_inscripciones_service import mis_inscripciones_service
+from .services.cache_referencia import cache_referencia
+from .services.mongo_cliente import PYMONGO_AVAILABLE
+from .etags import RangoInvalido, cabeceras_cache, cabeceras_privadas, cabeceras_publicas, etag_archivo, parsear_rango, rango_vigente, timestamp
+from django.utils.cache import get_conditional_response
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Listados grandes (usuarios, inscripciones, reseñas, contactos):
+# - filtros de servidor de api/filters.py (`filtro`)
+# - paginacion por cursor opcional (DEFAULT_PAGINATION_CLASS): ?page_size=50 y seguir 'next'
+# - sparse fieldsets: ?campos=id,estado solo lee y envia esas columnas
+class ListadoFiltradoMixin:
+    filtro = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        queryset = self.filtro(queryset, self.request.query_params)
+        campos = self.get_serializer_class().campos_pedidos(self.request)
+        if campos:
+            columnas = {campo.name for campo in queryset.model._meta.concrete_fields}
+            queryset = queryset.only('id', *(campos & columnas))
+        return queryset
 
 
 # Vistas User (autenticacion)
-class UserListCreateView(generics.ListCreateAPIView):
-    queryset = Usuario.objects.all()
+class UserListCreateView(ListadoFiltradoMixin, generics.ListCreateAPIView):
+    # Los intereses en una sola consulta (antes una por usuario)
+    queryset = Usuario.objects.prefetch_related('intereses')
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]  # Solo admin puede ver/crear usuarios
+    presupuesto_consultas = 5  # Ver api/middleware.py
+    filtro = staticmethod(filtrar_usuarios)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        campos = UserSerializer.campos_pedidos(self.request)
+        if campos and 'intereses' not in campos:
+            queryset = queryset.prefetch_related(None)  # No se piden: sin la consulta de intereses
+        return queryset
 
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Usuario.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminOrSelf]  # Admin o el propio usuario
 
+# Datos de referencia (categorias, ubicaciones, configuracion) desde la cache
+def respuesta_referencia(request, datos, etag):
+    """200 con los datos cacheados, o 304 si el cliente ya tiene esa version."""
+    respuesta = get_conditional_response(request, etag=etag) or Response(datos)
+    return cabeceras_publicas(respuesta, etag, settings.CACHE_REFERENCIA_MAX_AGE)
+
+
+class CacheReferenciaMixin:
+    """
+    El listado sin parametros se sirve desde services/cache_referencia.py
+    (sin consultas mientras la tabla no cambie). Con parametros de consulta
+    (filtros, paginacion) se arma como siempre.
+    """
+    tabla_cache = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        datos, etag = cache_referencia.obtener(
+            self.tabla_cache,
+            lambda: list(self.get_serializer(self.filter_queryset(self.get_queryset()), many=True).data)
+        )
+        return respuesta_referencia(request, datos, etag)
+
+
 # Vistas CategEvento 
-class CategEventoListCreateView(generics.ListCreateAPIView):
+class CategEventoListCreateView(CacheReferenciaMixin, generics.ListCreateAPIView):
+    tabla_cache = 'categorias'
     queryset = CategEvento.objects.all()
     serializer_class = CategEventoSerializer
     permission_classes = [IsAdminOrReadOnly]  # Publico lectura, admin escritura
@@ -47,7 +123,8 @@ class CategEventoDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Vistas Ubicacion
-class UbicacionListCreateView(generics.ListCreateAPIView):
+class UbicacionListCreateView(CacheReferenciaMixin, generics.ListCreateAPIView):
+    tabla_cache = 'ubicaciones'
     queryset = Ubicacion.objects.all()
     serializer_class = UbicacionSerializer
     permission_classes = [IsAdminOrReadOnly]  # Publico lectura, admin escritura
@@ -63,14 +140,19 @@ class UbicacionDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response({'success': True, 'message': 'Ubicacion eliminada'}, status=200)
 
 # Vistas Inscripcion
-class InscripcionListCreateView(generics.ListCreateAPIView):
+class InscripcionListCreateView(ListadoFiltradoMixin, generics.ListCreateAPIView):
     queryset = Inscripcion.objects.all()
     serializer_class = InscripcionSerializer
     permission_classes = [IsAuthenticated]  # Solo usuarios autenticados pueden inscribirse
+    filtro = staticmethod(filtrar_inscripciones)
     
     def perform_create(self, serializer):
         # Asignar el usuario autenticado automaticamente
-        serializer.save(usuario=self.request.user)
+        with transaction.atomic():
+            inscripcion = serializer.save(usuario_id=self.request.user.id)
+            # Si se crea ya confirmada, tambien ocupa un cupo
+            if inscripcion.estado == 'confirmada' and not cupos_service.reservar(inscripcion.evento_id):
+                raise ValidationError({"error": "No hay cupos disponibles. No se puede confirmar la inscripción."})
 
 class InscripcionDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Inscripcion.objects.all()
@@ -79,97 +161,132 @@ class InscripcionDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     # METODO PARA ACTUALIZAR INSCRIPCION (Logica de Cupos)
     def perform_update(self, serializer):
-        # 1. Obtener la instancia actual antes de guardar cambios
-        instance = self.get_object()
-        # 2. Obtener el nuevo estado que se intenta guardar
+        instance = serializer.instance
         nuevo_estado = serializer.validated_data.get('estado', instance.estado)
-        evento = instance.evento
-        
-        print(f"--- PROCESANDO ACTUALIZACION CUPOS ---")
-        print(f"Estado anterior: {instance.estado}")
-        print(f"Nuevo estado: {nuevo_estado}")
-        print(f"Cupos actuales: {evento.cupos_disponibles}")
-
-        # 3. Logica para reducir cupos (Pendiente/Cancelada -> Confirmada)
-        if instance.estado != 'confirmada' and nuevo_estado == 'confirmada':
-            # Verificar si hay cupos
-            if evento.cupos_disponibles > 0:
-                evento.cupos_disponibles -= 1
-                evento.save()
-                print("Cupo reducido -1")
-            else:
-                # Si no hay cupos, lanzar error de validación
-                from rest_framework.exceptions import ValidationError
+
+        # Los cupos se ajustan con un UPDATE condicional en la BD (ver CuposService),
+        # sin leer ni guardar el evento completo
+        with transaction.atomic():
+            try:
+                cupos_service.cambiar_estado(instance, nuevo_estado)
+            except SinCuposDisponibles:
                 raise ValidationError({"error": "No hay cupos disponibles. No se puede confirmar la inscripción."})
-        
-        # 4. Lógica para liberar cupos (Confirmada -> Cancelada/Pendiente)
-        elif instance.estado == 'confirmada' and nuevo_estado != 'confirmada':
-            # Solo sumar si no excede el maximo (opcional, pero buena practica por integridad)
-            if evento.cupos_disponibles < evento.cupo_maximo:
-                evento.cupos_disponibles += 1
-                evento.save()
-                print("Cupo incrementado +1")
-            else:
-                 print("Intento de sumar cupo pero ya esta lleno (consistencia de datos)")
 
-        # 5. Guardar el cambio de estado
-        serializer.save()
+            # Guardar el resto de cambios de la inscripcion
+            serializer.save()
 
     # METODO PARA ELIMINAR INSCRIPCION (Lógica de Cupos)
     def perform_destroy(self, instance):
-        # Si se borra una inscripción que estaba confirmada, liberar el cupo
-        if instance.estado == 'confirmada':
-            evento = instance.evento
-            if evento.cupos_disponibles < evento.cupo_maximo:
-                evento.cupos_disponibles += 1
-                evento.save()
-                print("Inscripcion borrada. Cupo incrementado +1")
-        
-        # Ejecutar borrado
-        instance.delete()
+        with transaction.atomic():
+            # Si se borra una inscripción que estaba confirmada, liberar el cupo
+            cupos_service.cambiar_estado(instance, 'cancelada')
+            # Ejecutar borrado
+            instance.delete()
+
+# Vista para cambiar el estado o la asistencia de muchas inscripciones en una sola llamada
+class InscripcionLoteView(APIView):
+    """
+    Cambio masivo de inscripciones (solo admin).
+    POST: { "ids": [1, 2, 3], "estado": "confirmada" }
+          { "ids": [1, 2, 3], "asistio": true }
+    Devuelve el resultado de cada id; las que no tienen cupo se rechazan individualmente.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        estado = request.data.get('estado')
+        asistio = request.data.get('asistio')
+
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'El campo ids debe ser una lista de ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > cupos_service.LOTE_MAXIMO:
+            return Response(
+                {'error': f'Máximo {cupos_service.LOTE_MAXIMO} inscripciones por solicitud'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'Todos los ids deben ser números'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if estado is None and asistio is None:
+            return Response({'error': 'Debe enviar estado o asistio'}, status=status.HTTP_400_BAD_REQUEST)
+        if estado is not None and (not isinstance(estado, str) or estado not in dict(Inscripcion.ESTADO_CHOICES)):
+            return Response({'error': f'Estado inválido: {estado}'}, status=status.HTTP_400_BAD_REQUEST)
+        if asistio is not None and not isinstance(asistio, bool):
+            return Response({'error': 'asistio debe ser true o false'}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultados = cupos_service.cambiar_lote(ids, estado=estado, asistio=asistio)
+        # bulk_update no dispara señales: invalidar el snapshot de estadisticas a mano
+        estadisticas_service.invalidar()
+
+        actualizadas = sum(1 for r in resultados if r['success'])
+        return Response({
+            'success': True,
+            'actualizadas': actualizadas,
+            'rechazadas': len(resultados) - actualizadas,
+            'resultados': resultados
+        })
 
 # Vista para obtener inscripciones del usuario actual
 class MisInscripcionesView(APIView):
     permission_classes = [IsAuthenticated]
+    presupuesto_consultas = 2  # Version + listado (un 304 solo lee la version)
 
     def get(self, request):
-        # Obtener inscripciones del usuario autenticado
-        inscripciones = Inscripcion.objects.filter(usuario=request.user).select_related('evento')
-        
-        # Serializar con información del evento
-        data = []
-        for inscripcion in inscripciones:
-            data.append({
-                'id': inscripcion.id,
-                'evento_id': inscripcion.evento.id,
-                'evento_nombre': inscripcion.evento.nombre,
-                'evento_fecha_inicio': inscripcion.evento.fecha_inicio,
-                'evento_fecha_fin': inscripcion.evento.fecha_fin,
-                'evento_hora_inicio': str(inscripcion.evento.hora_inicio) if inscripcion.evento.hora_inicio else None,
-                'evento_hora_fin': str(inscripcion.evento.hora_fin) if inscripcion.evento.hora_fin else None,
-                'fecha_inscripcion': inscripcion.fecha_inscripcion,
-                'estado': inscripcion.estado,
-                'comentarios': inscripcion.comentarios
-            })
-        
-        return Response(data)
+        # La version se lee ANTES del listado: si cambia en el medio, el ETag
+        # queda viejo y la proxima peticion trae el listado otra vez.
+        version = mis_inscripciones_service.version(request.user.id)
+        etag = mis_inscripciones_service.etag(request.user.id, version)
+        no_modificada = get_conditional_response(request, etag=etag)
+        if no_modificada is not None:
+            return cabeceras_privadas(no_modificada, etag)
+
+        # Inscripciones del usuario autenticado con los datos del evento (una consulta)
+        inscripciones = mis_inscripciones_service.listar(request.user.id)
+
+        # Paginacion por cursor opcional: ?page_size=20 y luego seguir el link 'next'
+        paginador = MisInscripcionesCursorPaginacion()
+        pagina = paginador.paginate_queryset(inscripciones, request, view=self)
+        if pagina is not None:
+            respuesta = paginador.get_paginated_response(pagina)
+        else:
+            respuesta = Response(list(inscripciones.order_by('id')))
+        return cabeceras_privadas(respuesta, etag)
 
 # Vista de reseña
-class ResenaListCreateView(generics.ListCreateAPIView):
+# La reseña y la calificacion del evento (total, suma y promedio, ver
+# services/contadores_service.py) se guardan en la misma transaccion
+class ResenaListCreateView(ListadoFiltradoMixin, generics.ListCreateAPIView):
     queryset = Resena.objects.all()
     serializer_class = ResenaSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]  # Lectura publica, escritura autenticada
+    filtro = staticmethod(filtrar_resenas)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
 
 class ResenaDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Resena.objects.all()
     serializer_class = ResenaSerializer
     permission_classes = [IsOwnerOrAdmin]  # Dueño o Admin
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
 # Vista de Contacto
-class ContactoListCreateView(generics.ListCreateAPIView):
+class ContactoListCreateView(ListadoFiltradoMixin, generics.ListCreateAPIView):
     queryset = Contacto.objects.all()
     serializer_class = ContactoSerializer
     permission_classes = [AllowAny]  # Cualquiera puede enviar mensaje de contacto
+    filtro = staticmethod(filtrar_contactos)
 
 # Las vistas para el auth y los roles
 
@@ -193,18 +310,54 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]  # Cualquiera se puede registrar
 
-class EventoListCreateView(APIView):
+# Campos de una imagen subida directo a Cloudinary desde el navegador
+CAMPOS_IMAGEN_DIRECTA = ['imagen_public_id', 'imagen_version', 'imagen_firma']
+
+class ImagenDirectaMixin:
+    """Lee la imagen subida directo a Cloudinary (ver CloudinaryFirmaView)."""
+
+    def imagen_subida_directa(self, request):
+        """
+        Devuelve (url, error_response). Ambos son None si la peticion no trae
+        una subida directa.
+        """
+        public_id = request.data.get('imagen_public_id')
+        if not public_id:
+            return None, None
+        url = cloudinary_utils.verificar_subida(
+            public_id,
+            request.data.get('imagen_version'),
+            request.data.get('imagen_firma')
+        )
+        if not url:
+            return None, Response({'error': 'La firma de la imagen no es válida'}, status=400)
+        return url, None
+
+class EventoListCreateView(ImagenDirectaMixin, APIView):
     permission_classes = [IsAuthenticatedOrReadOnly] # Lectura publica, escritura autenticada
 
     def get(self, request):
-        eventos = Evento.objects.all()
-        serializer = EventoSerializer(eventos, many=True)
+        # Filtros: ?estado=&categoria=&ubicacion=&fecha_inicio=&fecha_fin=&dias_semana=
+        eventos = filtrar_eventos(Evento.objects.all(), request.query_params)
+        # Orden: ?ordenar=calificacion (mejor calificados primero); por defecto por id
+        orden = orden_eventos(request.query_params)
+
+        # Paginacion por cursor: ?page_size=20 y luego seguir el link 'next'
+        paginador = EventoCursorPaginacion()
+        paginador.ordering = orden
+        pagina = paginador.paginate_queryset(eventos, request, view=self)
+        if pagina is not None:
+            serializer = EventoSerializer(pagina, many=True)
+            return paginador.get_paginated_response(serializer.data)
+
+        # Sin page_size ni cursor se devuelve la lista completa (compatibilidad con el frontend)
+        serializer = EventoSerializer(eventos.order_by(*orden), many=True)
         return Response(serializer.data)
 
     def post(self, request):
         try:
             # Verificar permisos (solo admin puede crear)
-            if not request.user.is_staff and not request.user.groups.filter(name='admin').exists():
+            if not es_admin(request, incluir_staff=True):
                  return Response({'error': 'No tienes permisos para crear eventos'}, status=403)
 
             # Extraer imagen ANTES de copiar data
@@ -214,47 +367,34 @@ class EventoListCreateView(APIView):
             # Copiar datos SIN la imagen (que ya esta en FILES)
             data = {}
             for key in request.data:
-                if key not in ['imagen', 'imagen_url']:
+                if key not in ['imagen', 'imagen_url', *CAMPOS_IMAGEN_DIRECTA]:
                     data[key] = request.data[key]
             
-            print(f"=== PROCESANDO IMAGEN ===")
-            print(f"Tiene imagen (FILES): {imagen is not None}")
-            print(f"Tiene imagen_url: {imagen_url}")
+            # Imagen ya subida por el navegador: solo se verifica la firma
+            imagen_directa, error = self.imagen_subida_directa(request)
+            if error:
+                return error
             
             # Guardar imagen en Cloudinary si existe
-            if imagen or imagen_url:
-                if imagen:
-                    print(f"Guardando imagen en Cloudinary...")
-                    imagen_url_result = cloudinary_utils.guardar_archivo(imagen)
-                    print(f"Imagen guardada con URL: {imagen_url_result}")
-                    data['imagen_id'] = imagen_url_result
-                elif imagen_url:
-                    print(f"Descargando imagen desde URL...")
-                    imagen_url_result = cloudinary_utils.guardar_desde_url(imagen_url)
-                    print(f"Imagen descargada con URL: {imagen_url_result}")
-                    data['imagen_id'] = imagen_url_result
-                
-            print(f"===SERIALIZANDO EVENTO ===")
-            print(f"Data keys: {data.keys()}")
+            if imagen_directa:
+                data['imagen_id'] = imagen_directa
+            elif imagen:
+                data['imagen_id'] = cloudinary_utils.guardar_archivo(imagen)
             
             serializer = EventoSerializer(data=data)
             if serializer.is_valid():
-                print(f"Serializer válido, guardando...")
                 evento = serializer.save()
-                print(f"Evento guardado con ID: {evento.id}")
+                # La imagen por URL se descarga en segundo plano (imagen_estado='pendiente')
+                if imagen_url and not imagen_directa and not imagen:
+                    imagenes_service.encolar(evento, url=imagen_url)
                 return Response(serializer.data, status=201)
             else:
-                print(f"=== ERRORES DE VALIDACIÓN ===")
-                print(f"Errors: {serializer.errors}")
                 return Response(serializer.errors, status=400)
         except Exception as e:
-            import traceback
-            print(f"=== ERROR INTERNO ===")
-            print(f"Error: {str(e)}")
-            traceback.print_exc()
+            logger.exception('Error al crear evento')
             return Response({'error': f'Error interno: {str(e)}'}, status=500)
 
-class EventoDetailView(APIView):
+class EventoDetailView(ImagenDirectaMixin, APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_object(self, pk):
@@ -272,7 +412,7 @@ class EventoDetailView(APIView):
 
     def put(self, request, pk):
         # Verificar permisos
-        if not request.user.is_staff and not request.user.groups.filter(name='admin').exists():
+        if not es_admin(request, incluir_staff=True):
              return Response({'error': 'No tienes permisos para editar eventos'}, status=403)
              
         evento = self.get_object(pk)
@@ -286,27 +426,33 @@ class EventoDetailView(APIView):
         # Copiar datos SIN la imagen
         data = {}
         for key in request.data:
-            if key not in ['imagen', 'imagen_url']:
+            if key not in ['imagen', 'imagen_url', *CAMPOS_IMAGEN_DIRECTA]:
                 data[key] = request.data[key]
         
+        # Imagen ya subida por el navegador: solo se verifica la firma
+        imagen_directa, error = self.imagen_subida_directa(request)
+        if error:
+            return error
+        
         # Guardar imagen en Cloudinary si existe
-        if imagen or imagen_url:
-            if imagen:
-                imagen_url_result = cloudinary_utils.guardar_archivo(imagen)
-                data['imagen_id'] = imagen_url_result
-            elif imagen_url:
-                imagen_url_result = cloudinary_utils.guardar_desde_url(imagen_url)
-                data['imagen_id'] = imagen_url_result
+        if imagen_directa:
+            data['imagen_id'] = imagen_directa
+        elif imagen:
+            imagen_url_result = cloudinary_utils.guardar_archivo(imagen)
+            data['imagen_id'] = imagen_url_result
                 
         serializer = EventoSerializer(evento, data=data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            evento = serializer.save()
+            # La imagen por URL se descarga en segundo plano (imagen_estado='pendiente')
+            if imagen_url and not imagen_directa and not imagen:
+                imagenes_service.encolar(evento, url=imagen_url)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
     def delete(self, request, pk):
         # Verificar permisos
-        if not request.user.is_staff and not request.user.groups.filter(name='admin').exists():
+        if not es_admin(request, incluir_staff=True):
              return Response({'error': 'No tienes permisos para eliminar eventos'}, status=403)
              
         evento = self.get_object(pk)
@@ -315,41 +461,84 @@ class EventoDetailView(APIView):
         evento.delete()
         return Response({'success': True, 'message': 'Evento eliminado'}, status=200)
 
-# NOTA: EventoImagenView ya NO es necesaria porque Cloudinary sirve las imágenes directamente por URL
-# class EventoImagenView(APIView):
-    # permission_classes = [AllowAny]
-    #
-    # def get(self, request, imagen_id):
-    #     archivo = cloudinary_utils.obtener_archivo(imagen_id)
-    #
-    #     if archivo:
-    #         response = HttpResponse(archivo.read(), content_type=archivo.content_type)
-    #         return response
-    #     return Response({'error': 'Imagen no encontrada'}, status=404)
+# Vista para firmar subidas directas del navegador a Cloudinary
+class CloudinaryFirmaView(APIView):
+    """
+    Devuelve una firma para que el frontend suba la imagen del evento directo
+    a Cloudinary (POST a upload_url con 'file' y todos los 'parametros').
+    Luego se crea/edita el evento con imagen_public_id, imagen_version e
+    imagen_firma (public_id, version y signature de la respuesta de Cloudinary).
+    Pueden firmar los mismos que crean y editan eventos (admin o staff).
+    """
+    permission_classes = [IsAdminOrStaff]
+
+    def post(self, request):
+        if not cloudinary_utils.esta_configurado():
+            return Response({'error': 'Cloudinary no está configurado'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(cloudinary_utils.firmar_subida())
+
+# Imagenes antiguas guardadas en GridFS (las nuevas se sirven directo desde Cloudinary)
+class EventoImagenView(APIView):
+    """
+    Sirve una imagen de GridFS por chunks (StreamingHttpResponse): el archivo
+    nunca se carga entero en memoria. Responde 304 si el navegador ya tiene la
+    version (If-None-Match / If-Modified-Since) y 206 a peticiones Range.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []  # Publica: no hace falta leer el JWT
+
+    def get(self, request, imagen_id):
+        if not PYMONGO_AVAILABLE:
+            return Response({'error': 'GridFS no está disponible'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        archivo = utilidades_mongo.obtener_archivo(imagen_id)
+        if archivo is None:
+            return Response({'error': 'Imagen no encontrada'}, status=404)
+
+        etag = etag_archivo(archivo)
+        ultima_modificacion = timestamp(archivo.upload_date)
+        max_age = settings.GRIDFS_CACHE_MAX_AGE
+
+        no_modificada = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+        if no_modificada is not None:
+            archivo.close()
+            return cabeceras_cache(no_modificada, etag, ultima_modificacion, max_age)
+
+        rango = None
+        if rango_vigente(request, etag, ultima_modificacion):
+            try:
+                rango = parsear_rango(request.headers.get('Range'), archivo.length)
+            except RangoInvalido:
+                archivo.close()
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{archivo.length}'
+                return response
+
+        inicio, fin = rango or (0, archivo.length - 1)
+        response = StreamingHttpResponse(
+            utilidades_mongo.leer_por_bloques(archivo, inicio, fin),
+            status=206 if rango else 200,
+            content_type=utilidades_mongo.tipo_contenido(archivo)
+        )
+        response['Content-Length'] = str(fin - inicio + 1) if archivo.length else '0'
+        response['Accept-Ranges'] = 'bytes'
+        if rango:
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{archivo.length}'
+        return cabeceras_cache(response, etag, ultima_modificacion, max_age)
 
 # Vista para obtener las categorías mas populares (o sea con mas eventos)
 class CategEventoPopularesView(APIView):
     permission_classes = [AllowAny]  # Acceso publico para mostrar en el home
 
     def get(self, request):
-        # Obtener las categorias con conteo de eventos, ordenadas por la cantidad de eventos de mayor a menor
-        categorias = CategEvento.objects.annotate(
-            cantidad_eventos=Count('eventos')
-        ).filter(
+        # Categorias con mas eventos, leyendo el contador (indice estado, -total_eventos)
+        # en vez de contar los eventos de todas las categorias en cada peticion
+        data = list(CategEvento.objects.filter(
             estado=True,
-            cantidad_eventos__gt=0
-        ).order_by('-cantidad_eventos')[:5]
-        
-        # Serializar manualmente para incluir cantidad_eventos
-        data = []
-        for categoria in categorias:
-            data.append({
-                'id': categoria.id,
-                'nombre': categoria.nombre,
-                'descripcion': categoria.descripcion,
-                'estado': categoria.estado,
-                'cantidad_eventos': categoria.cantidad_eventos
-            })
+            total_eventos__gt=0
+        ).order_by('-total_eventos', 'id').values(
+            'id', 'nombre', 'descripcion', 'estado', cantidad_eventos=F('total_eventos')
+        )[:5])
         return Response(data)
 
 # Vista para la Configuración Global del Perfil
@@ -368,9 +557,12 @@ class ConfiguracionPerfilView(APIView):
         return config
 
     def get(self, request):
-        config = self.get_object()
-        serializer = ConfiguracionPerfilSerializer(config)
-        return Response(serializer.data)
+        # Antes un get_or_create en cada lectura; ahora solo cuando cambia la configuracion
+        datos, etag = cache_referencia.obtener(
+            'configuracion_perfil',
+            lambda: dict(ConfiguracionPerfilSerializer(self.get_object()).data)
+        )
+        return respuesta_referencia(request, datos, etag)
 
     def put(self, request):
         config = self.get_object()
@@ -405,126 +597,101 @@ class ValidarCedulaTSEView(APIView):
         else:
             return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
 
+# Vista para validar muchas cedulas a la vez (importaciones masivas)
+class ValidarCedulaTSELoteView(APIView):
+    """
+    Endpoint para validar una lista de cedulas contra el TSE (solo admin).
+    POST: { "cedulas": ["101110111", ...] } o un archivo CSV en el campo 'archivo'
+    (columna 'cedula' o la primera columna).
+
+    La respuesta es NDJSON (una linea JSON por cedula) que se va enviando a
+    medida que terminan las consultas; cada linea trae el progreso y la ultima
+    el resumen. Tiene que caber en el timeout del worker, asi que se aceptan a
+    lo sumo TSE_LOTE_MAXIMO_SIN_CACHE cedulas que no esten ya en cache; para
+    listas mas grandes usar `python manage.py validar_cedulas`.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        archivo = request.FILES.get('archivo')
+        if archivo:
+            try:
+                cedulas = tse_service.leer_cedulas_csv(archivo.read().decode('utf-8-sig'))
+            except UnicodeDecodeError:
+                return Response({'error': 'El archivo debe ser un CSV en UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            cedulas = request.data.get('cedulas')
+            if not isinstance(cedulas, list) or not all(isinstance(c, (str, int)) for c in cedulas):
+                return Response(
+                    {'error': "Envíe 'cedulas' como una lista o un archivo CSV en 'archivo'"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            cedulas = [str(c) for c in cedulas]
+
+        if not cedulas:
+            return Response({'error': 'No se recibió ninguna cédula'}, status=status.HTTP_400_BAD_REQUEST)
+
+        maximo = getattr(settings, 'TSE_LOTE_MAXIMO', 2000)
+        if len(cedulas) > maximo:
+            return Response(
+                {'error': f'Máximo {maximo} cédulas por solicitud. Use el comando validar_cedulas para más.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        maximo_sin_cache = getattr(settings, 'TSE_LOTE_MAXIMO_SIN_CACHE', 60)
+        sin_cache = len(tse_service.sin_cache(cedulas))
+        if sin_cache > maximo_sin_cache:
+            return Response(
+                {'error': (
+                    f'{sin_cache} cédulas no están en cache y hay que consultarlas al TSE; '
+                    f'el máximo por solicitud es {maximo_sin_cache}. '
+                    'Envíelas en partes o use el comando validar_cedulas.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def lineas():
+            total = len(cedulas)
+            resumen = {'total': total, 'validas': 0, 'invalidas': 0}
+            inicio = time.monotonic()
+            for completadas, (indice, cedula, resultado) in enumerate(tse_service.consultar_lote(cedulas), start=1):
+                resumen['validas' if resultado.get('valida') else 'invalidas'] += 1
+                yield json.dumps({
+                    'indice': indice,
+                    'cedula_enviada': cedula,
+                    **resultado,
+                    'progreso': {'completadas': completadas, 'total': total}
+                }, ensure_ascii=False) + '\n'
+            resumen['segundos'] = round(time.monotonic() - inicio, 1)
+            yield json.dumps({'resumen': resumen}, ensure_ascii=False) + '\n'
+
+        response = StreamingHttpResponse(lineas(), content_type='application/x-ndjson; charset=utf-8')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Que el proxy no acumule la respuesta
+        return response
+
 # Vista para obtener estadísticas del dashboard de administración
 class EstadisticasView(APIView):
     """
     Endpoint que devuelve estadísticas agregadas para el dashboard de admin.
     Solo accesible por administradores.
+    Los datos vienen del snapshot de EstadisticasService; 'snapshot.generado_en'
+    indica la fecha al corte de los numeros.
     """
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        ahora = timezone.now()
-        hace_7_dias = ahora - timedelta(days=7)
-        hace_30_dias = ahora - timedelta(days=30)
-
-        # ======== ESTADÍSTICAS DE USUARIOS ========
-        total_usuarios = Usuario.objects.count()
-        usuarios_nuevos_7d = Usuario.objects.filter(date_joined__gte=hace_7_dias).count()
-        usuarios_nuevos_30d = Usuario.objects.filter(date_joined__gte=hace_30_dias).count()
-        usuarios_activos = Usuario.objects.filter(last_login__gte=hace_30_dias).count()
-        usuarios_inactivos = Usuario.objects.filter(last_login__lt=hace_30_dias).count() + Usuario.objects.filter(last_login__isnull=True).count()
-
-        # ======== ESTADÍSTICAS DE EVENTOS ========
-        total_eventos = Evento.objects.count()
-        eventos_activos = Evento.objects.filter(estado='activo').count()
-        eventos_inactivos = Evento.objects.filter(estado='inactivo').count()
-        eventos_finalizados = Evento.objects.filter(estado='finalizado').count()
-        
-        # Eventos con cupo lleno
-        eventos_llenos = Evento.objects.filter(cupos_disponibles=0).count()
-        
-        # Eventos más populares (por inscripciones)
-        eventos_populares = Evento.objects.annotate(
-            total_inscripciones=Count('inscripciones')
-        ).order_by('-total_inscripciones')[:5].values('id', 'nombre', 'total_inscripciones')
-
-        # ======== ESTADÍSTICAS DE INSCRIPCIONES ========
-        total_inscripciones = Inscripcion.objects.count()
-        inscripciones_pendientes = Inscripcion.objects.filter(estado='pendiente').count()
-        inscripciones_confirmadas = Inscripcion.objects.filter(estado='confirmada').count()
-        inscripciones_canceladas = Inscripcion.objects.filter(estado='cancelada').count()
-        
-        # Tasa de asistencia
-        total_con_asistencia = Inscripcion.objects.filter(estado='confirmada').count()
-        asistieron = Inscripcion.objects.filter(asistio=True).count()
-        tasa_asistencia = round((asistieron / total_con_asistencia * 100), 1) if total_con_asistencia > 0 else 0
-
-        # Inscripciones por mes (últimos 6 meses)
-        inscripciones_por_mes = []
-        for i in range(5, -1, -1):
-            fecha_inicio = (ahora - timedelta(days=30*i)).replace(day=1)
-            if i > 0:
-                fecha_fin = (ahora - timedelta(days=30*(i-1))).replace(day=1)
-            else:
-                fecha_fin = ahora
-            
-            count = Inscripcion.objects.filter(
-                fecha_inscripcion__gte=fecha_inicio,
-                fecha_inscripcion__lt=fecha_fin
-            ).count()
-            
-            inscripciones_por_mes.append({
-                'mes': fecha_inicio.strftime('%b'),
-                'cantidad': count
-            })
-
-        # Categorías más demandadas
-        categorias_demandadas = CategEvento.objects.annotate(
-            total_inscripciones=Count('eventos__inscripciones')
-        ).order_by('-total_inscripciones')[:5].values('id', 'nombre', 'total_inscripciones')
-
-        # ======== ESTADÍSTICAS DE RESEÑAS ========
-        total_resenas = Resena.objects.count()
-        promedio_calificacion = Resena.objects.aggregate(promedio=Avg('calificacion'))['promedio'] or 0
-
-        # Eventos mejor calificados
-        eventos_mejor_calificados = Evento.objects.annotate(
-            promedio=Avg('resenas__calificacion'),
-            total_resenas=Count('resenas')
-        ).filter(total_resenas__gt=0).order_by('-promedio')[:5].values('id', 'nombre', 'promedio', 'total_resenas')
-
-        # ======== ESTADÍSTICAS DE CONTACTOS ========
-        total_contactos = Contacto.objects.count()
-        contactos_7d = Contacto.objects.filter(fecha_envio__gte=hace_7_dias).count()
-        contactos_30d = Contacto.objects.filter(fecha_envio__gte=hace_30_dias).count()
-
-        return Response({
-            'usuarios': {
-                'total': total_usuarios,
-                'nuevos_7d': usuarios_nuevos_7d,
-                'nuevos_30d': usuarios_nuevos_30d,
-                'activos': usuarios_activos,
-                'inactivos': usuarios_inactivos
-            },
-            'eventos': {
-                'total': total_eventos,
-                'activos': eventos_activos,
-                'inactivos': eventos_inactivos,
-                'finalizados': eventos_finalizados,
-                'llenos': eventos_llenos,
-                'populares': list(eventos_populares)
-            },
-            'inscripciones': {
-                'total': total_inscripciones,
-                'pendientes': inscripciones_pendientes,
-                'confirmadas': inscripciones_confirmadas,
-                'canceladas': inscripciones_canceladas,
-                'tasa_asistencia': tasa_asistencia,
-                'por_mes': inscripciones_por_mes,
-                'categorias_demandadas': list(categorias_demandadas)
-            },
-            'resenas': {
-                'total': total_resenas,
-                'promedio_calificacion': round(promedio_calificacion, 1) if promedio_calificacion else 0,
-                'mejor_calificados': list(eventos_mejor_calificados)
-            },
-            'contactos': {
-                'total': total_contactos,
-                'ultimos_7d': contactos_7d,
-                'ultimos_30d': contactos_30d
-            }
-        })
+        # Se sirve el snapshot precalculado (1 consulta) aunque este vencido;
+        # el recalculo corre en segundo plano y 'invalidado' avisa al dashboard
+        snapshot = estadisticas_service.obtener()
+        
+        data = dict(snapshot.datos)
+        data['snapshot'] = {
+            'version': snapshot.version,
+            'generado_en': snapshot.generado_en.isoformat(),
+            'invalidado': snapshot.invalidado
+        }
+        return Response(data)
 
 # Vista para enviar el código de verificación del email
 class EnviarCodigoVerificacionView(APIView):
@@ -564,23 +731,45 @@ class EnviarCodigoVerificacionView(APIView):
         # Invalidar códigos anteriores para este email
         CodigoVerificacion.objects.filter(email=email, usado=False).update(usado=True)
         
-        # Crear nuevo código
-        CodigoVerificacion.objects.create(email=email, codigo=codigo)
-        
-        # Enviar email con el código
-        resultado = brevo_service.enviar_codigo_verificacion(email, codigo)
-        print(f"[INFO] Resultado envío email a {email}: {resultado}")
-        
-        if not resultado.get('success'):
-             return Response({
-                'success': False,
-                'error': f"Error enviando email: {resultado.get('error')}"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Crear nuevo código y encolar el email: lo entrega el worker de la
+        # bandeja de salida, así la respuesta no espera a Brevo
+        with transaction.atomic():
+            CodigoVerificacion.objects.create(email=email, codigo=codigo)
+            correo = outbox_service.encolar('verificacion', email, {'codigo': codigo})
 
         return Response({
             'success': True,
-            'message': 'Código de verificación enviado correctamente a tu correo.'
-        })
+            'message': (
+                'Tu código de verificación está en cola y se enviará a tu correo en unos momentos. '
+                'Consulta el estado del envío en enviar-codigo/<envio_id>/.'
+            ),
+            'envio_id': str(correo.token),
+            'estado_url': reverse('estado envio codigo verificacion', args=[correo.token]),
+            'estado': correo.estado
+        }, status=status.HTTP_202_ACCEPTED)
+
+# Vista para consultar el estado de un envío encolado
+class EstadoEnvioCorreoView(APIView):
+    """
+    Endpoint para consultar si un email encolado ya se entregó.
+    GET: /enviar-codigo/<envio_id>/ -> { estado: pendiente|enviando|enviado|fallido, ... }
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, token):
+        envio = outbox_service.estado(token)
+        if not envio:
+            return Response({'error': 'Envío no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        data = {
+            'envio_id': str(envio['token']),
+            'estado': envio['estado'],
+            'intentos': envio['intentos'],
+            'enviado_en': envio['enviado_en'].isoformat() if envio['enviado_en'] else None
+        }
+        if envio['estado'] == 'fallido':
+            data['error'] = f"Error enviando email: {envio['error']}"
+        return Response(data)
 
 # Vista para verificar código
 class VerificarCodigoView(APIView):
@@ -646,11 +835,11 @@ class GenerarCodigoWhatsAppView(APIView):
         import secrets
         
         # Verificar que es admin
-        if not request.user.is_staff and not request.user.groups.filter(name='admin').exists():
+        if not es_admin(request, incluir_staff=True):
             return Response({'error': 'Solo administradores pueden generar códigos'}, status=403)
         
         # Desactivar códigos anteriores del mismo usuario
-        CodigoWhatsApp.objects.filter(usuario=request.user, activo=True).update(activo=False)
+        CodigoWhatsApp.objects.filter(usuario_id=request.user.id, activo=True).update(activo=False)
         
         # Generar código alfanumérico de 8 caracteres (fácil de leer/copiar)
         codigo = secrets.token_urlsafe(6)[:8].upper()  # Ej: "AB12CD34"
@@ -664,7 +853,7 @@ class GenerarCodigoWhatsAppView(APIView):
         # Crear código
         codigo_whatsapp = CodigoWhatsApp.objects.create(
             codigo=codigo,
-            usuario=request.user,
+            usuario_id=request.user.id,
             expira_en=expira_en,
             telefono_autorizado=telefono
         )
@@ -679,12 +868,12 @@ class GenerarCodigoWhatsAppView(APIView):
     
     def get(self, request):
         """Obtener el código activo del admin."""
-        if not request.user.is_staff and not request.user.groups.filter(name='admin').exists():
+        if not es_admin(request, incluir_staff=True):
             return Response({'error': 'Solo administradores'}, status=403)
         
         try:
             codigo = CodigoWhatsApp.objects.filter(
-                usuario=request.user,
+                usuario_id=request.user.id,
                 activo=True
             ).latest('creado_en')
             
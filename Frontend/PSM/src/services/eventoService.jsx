@@ -52,7 +52,46 @@ async function getEventoById(id) {
     return await response.json();
 }
 
+/*
+ * Sube la imagen del FormData directo a Cloudinary con una firma del backend,
+ * así los bytes no pasan por el servidor. Reemplaza 'imagen' por
+ * imagen_public_id, imagen_version e imagen_firma.
+ * Si algo falla se deja el FormData como está (el backend sube la imagen).
+ */
+async function subirImagenDirecta(eventoData) {
+    if (!(eventoData instanceof FormData)) return eventoData;
+    const archivo = eventoData.get('imagen');
+    if (!(archivo instanceof File)) return eventoData;
+
+    try {
+        const token = localStorage.getItem('token');
+        const firmaResponse = await fetch(`${API_URL}Evento/imagen/firma/`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
+        if (!firmaResponse.ok) return eventoData;
+        const { upload_url, parametros } = await firmaResponse.json();
+
+        const subida = new FormData();
+        subida.append('file', archivo);
+        Object.entries(parametros).forEach(([clave, valor]) => subida.append(clave, valor));
+
+        const cloudinaryResponse = await fetch(upload_url, { method: 'POST', body: subida });
+        if (!cloudinaryResponse.ok) return eventoData;
+        const resultado = await cloudinaryResponse.json();
+
+        eventoData.delete('imagen');
+        eventoData.append('imagen_public_id', resultado.public_id);
+        eventoData.append('imagen_version', resultado.version);
+        eventoData.append('imagen_firma', resultado.signature);
+    } catch (error) {
+        console.error('Subida directa a Cloudinary falló, se envía la imagen al servidor:', error);
+    }
+    return eventoData;
+}
+
 async function createEvento(eventoData) {
+    eventoData = await subirImagenDirecta(eventoData);
     const token = localStorage.getItem('token');
     const headers = {
         'Authorization': `Bearer ${token}`
@@ -80,6 +119,7 @@ async function createEvento(eventoData) {
 }
 
 async function updateEvento(id, eventoData) {
+    eventoData = await subirImagenDirecta(eventoData);
     const token = localStorage.getItem('token');
     const headers = {
         'Authorization': `Bearer ${token}`
@@ -126,6 +166,8 @@ function getEventoImagenUrl(imagenId) {
     if (!imagenId) return null;
     // Si ya es una URL completa (Cloudinary), retornarla
     if (imagenId.startsWith('http')) return imagenId;
+    // Si es un ID de GridFS (imagenes antiguas), lo sirve el backend
+    if (/^[a-f0-9]{24}$/i.test(imagenId)) return `${API_URL}Evento/imagen/${imagenId}/`;
     // Si es un ID de seed o placeholder, retornar un placeholder válido
     return `https://via.placeholder.com/800x400?text=${imagenId}`;
 }
@@ -3,7 +3,9 @@ import { API_BASE_URL } from '../config';
 /*
  * Envía un código de verificación al email proporcionado
  * @param {string} email - Email para verificar
- * @returns {Promise<Object>} - { success, message } o { success: false, error }
+ * El backend encola el email y responde de inmediato con un envio_id
+ * que se puede consultar con estadoEnvio()
+ * @returns {Promise<Object>} - { success, message, envio_id } o { success: false, error }
  */
 async function enviarCodigo(email) {
     try {
@@ -20,7 +22,8 @@ async function enviarCodigo(email) {
         if (response.ok && data.success) {
             return {
                 success: true,
-                message: data.message || 'Código enviado correctamente'
+                message: data.message || 'Código enviado correctamente',
+                envio_id: data.envio_id
             };
         } else {
             return {
@@ -76,9 +79,41 @@ async function verificarCodigo(email, codigo) {
     }
 }
 
+/*
+ * Consulta el estado de entrega de un código encolado
+ * @param {string} envioId - envio_id devuelto por enviarCodigo
+ * @returns {Promise<Object>} - { success, estado } o { success: false, error }
+ */
+async function estadoEnvio(envioId) {
+    try {
+        const response = await fetch(`${API_BASE_URL}/enviar-codigo/${envioId}/`);
+        const data = await response.json();
+
+        if (response.ok) {
+            return {
+                success: data.estado !== 'fallido',
+                estado: data.estado,
+                error: data.error
+            };
+        } else {
+            return {
+                success: false,
+                error: data.error || 'Envío no encontrado'
+            };
+        }
+    } catch (error) {
+        console.error('Error consultando envío:', error);
+        return {
+            success: false,
+            error: 'Error de conexión. Intente de nuevo.'
+        };
+    }
+}
+
 const verificacionService = {
     enviarCodigo,
-    verificarCodigo
+    verificarCodigo,
+    estadoEnvio
 };
 
 export default verificacionService;
\ No newline at end of file